@@ -0,0 +1,158 @@
+"""bwdistbench.py
+"""
+
+
+__license__ = "Apache License, Version 2.0"
+__author__  = "Roland Kwitt, Kitware Inc., 2013"
+__email__   = "E-Mail: roland.kwitt@kitware.com"
+__status__  = "Development"
+
+
+import os
+import sys
+import json
+import time
+import resource
+import numpy as np
+import SimpleITK as sitk
+import multiprocessing as mp
+from optparse import OptionParser
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir))
+from core import dmaputils
+
+
+def usage():
+    """Print usage information"""
+    print("""
+Benchmark the distance map backends of bwdist.py (core.dmaputils) on
+synthetic 3D vessel volumes (random tubes). The skeleton is computed once per
+volume; then, for each backend, the distance map + inversion is run in a
+separate process and the wall time, the peak RSS (above the RSS at process
+start) and the max. deviation from the exact (scipy) result are written as
+JSON.
+
+    USAGE:
+        {0} [OPTIONS]
+        {0} -h
+
+    OPTIONS (Overview):
+
+        -s NUM[,NUM,...]
+        -n NUM
+        -b NAME[,NAME,...]
+        -o FILE
+
+    OPTIONS (Detailed):
+
+        -s NUM[,NUM,...] (default: 64,128)
+
+        NUM is the volume size (NUM x NUM x NUM voxels). A list of values runs
+        one benchmark per size.
+
+        -n NUM (default: 20)
+
+        NUM is the number of vessels (tubes) per volume.
+
+        -b NAME[,NAME,...] (default: danielsson,maurer,scipy)
+
+        Backends to benchmark (see bwdist.py -b).
+
+        -o FILE (optional)
+
+        Write the results to FILE (otherwise to stdout).
+
+AUTHOR: Roland Kwitt, Kitware Inc., 2013
+        roland.kwitt@kitware.com
+""".format(sys.argv[0]))
+
+
+def vesselVolume(size, nVessels, radius=2.0, seed=0):
+    """Binary volume with nVessels random (curved) tubes."""
+    rng = np.random.RandomState(seed)
+    vol = np.zeros((size,)*3, dtype=np.uint8)
+    grid = np.indices((size,)*3, dtype=np.float32)
+    t = np.linspace(0, 1, 4*size)
+    for v in range(nVessels):
+        # quadratic Bezier curve between two random points
+        P = rng.uniform(0, size-1, (3, 3))
+        C = (np.outer((1-t)**2, P[0]) + np.outer(2*(1-t)*t, P[1]) +
+             np.outer(t**2, P[2]))
+        for c in np.unique(np.round(C).astype(int), axis=0):
+            lo = np.maximum(c - int(np.ceil(radius)), 0)
+            hi = np.minimum(c + int(np.ceil(radius)) + 1, size)
+            sl = tuple([slice(l, h) for l, h in zip(lo, hi)])
+            d2 = sum([(grid[k][sl] - c[k])**2 for k in range(3)])
+            vol[sl][d2 <= radius**2] = 1
+    return sitk.GetImageFromArray(vol)
+
+
+def _run(skelImg, backend, resQ):
+    """Density map with one backend (in a separate process)."""
+    rss0 = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    t0 = time.time()
+    dmap = dmaputils.distanceMap(skelImg, backend)
+    shift = np.amax(dmap) + np.amin(dmap)
+    np.negative(dmap, out=dmap)
+    dmap += shift
+    wall = time.time() - t0
+    rss1 = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    resQ.put((wall, (rss1-rss0)*1024, dmap))
+
+
+def benchVolume(size, nVessels, backends):
+    img = vesselVolume(size, nVessels)
+    t0 = time.time()
+    skelImg = dmaputils.skeleton(img)
+    res = {"size" : size,
+           "vessels" : nVessels,
+           "skeleton" : time.time() - t0,
+           "backends" : []}
+
+    dmaps = dict()
+    for backend in backends:
+        resQ = mp.Queue()
+        proc = mp.Process(target=_run, args=(skelImg, backend, resQ))
+        proc.start()
+        wall, rss, dmaps[backend] = resQ.get()
+        proc.join()
+        res["backends"].append({"backend" : backend,
+                                "wall" : wall,
+                                "peakRSS" : rss})
+
+    if "scipy" in dmaps:
+        for b in res["backends"]:
+            b["maxErr"] = float(np.amax(np.abs(dmaps[b["backend"]] -
+                                               dmaps["scipy"])))
+    return res
+
+
+def main(argv=None):
+    if argv is None:
+        argv=sys.argv
+
+    parser = OptionParser(add_help_option=False)
+    parser.add_option("-s", dest="sizes", default="64,128")
+    parser.add_option("-n", dest="nVessels", type="int", default=20)
+    parser.add_option("-b", dest="backends", default="danielsson,maurer,scipy")
+    parser.add_option("-o", dest="outFile")
+    parser.add_option("-h", dest="doHelp", action="store_true", default=False)
+    options, _ = parser.parse_args(argv[1:])
+
+    if options.doHelp:
+        usage()
+        sys.exit(-1)
+
+    res = [benchVolume(int(s), options.nVessels, options.backends.split(','))
+           for s in options.sizes.split(',')]
+
+    if options.outFile is None:
+        print(json.dumps(res, indent=2))
+    else:
+        with open(options.outFile, 'w') as fid:
+            json.dump(res, fid, indent=2)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,172 @@
+"""ksvdbench.py
+"""
+
+
+__license__ = "Apache License, Version 2.0"
+__author__  = "Roland Kwitt, Kitware Inc., 2013"
+__email__   = "E-Mail: roland.kwitt@kitware.com"
+__status__  = "Development"
+
+
+import os
+import sys
+import json
+import time
+import numpy as np
+from optparse import OptionParser
+from sklearn.decomposition import MiniBatchDictionaryLearning
+from sklearn.decomposition import sparse_encode
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir))
+from core import ksvd
+
+
+def usage():
+    """Print usage information"""
+    print("""
+Benchmark core.ksvd (K-SVD with Batch-OMP) against sklearn's
+MiniBatchDictionaryLearning (the learner used by pbm.py). Both learners are
+run on synthetic data (T-sparse combinations of a random dictionary + noise)
+until the RMS reconstruction error (with T-sparse OMP codes) falls below a
+target value. The time to reach the target is written as JSON.
+
+    USAGE:
+        {0} [OPTIONS]
+        {0} -h
+
+    OPTIONS (Overview):
+
+        -N NUM
+        -M NUM
+        -D NUM
+        -T NUM
+        -e NUM
+        -n NUM
+        -j NUM
+        -o FILE
+
+    OPTIONS (Detailed):
+
+        -N NUM (default: 1024)
+
+        NUM is the signal dimension (i.e., number of voxels).
+
+        -M NUM (default: 2000)
+
+        NUM is the number of signals (i.e., number of difference images).
+
+        -D NUM (default: 32)
+
+        NUM is the dictionary size.
+
+        -T NUM (default: 3)
+
+        NUM is the sparsity.
+
+        -e NUM (default: 0.02)
+
+        NUM is the target RMS reconstruction error (the noise level is
+        0.01).
+
+        -n NUM (default: 50)
+
+        NUM is the max. number of iterations (K-SVD) or passes over the data
+        (sklearn).
+
+        -j NUM (default: 1)
+
+        NUM is the number of threads for the K-SVD atom updates.
+
+        -o FILE (optional)
+
+        Write the results to FILE (otherwise to stdout).
+
+AUTHOR: Roland Kwitt, Kitware Inc., 2013
+        roland.kwitt@kitware.com
+""".format(sys.argv[0]))
+
+
+def synthData(N, M, D, T, noise=0.01, seed=0):
+    """Generate T-sparse combinations of a random dictionary (+ noise)."""
+    rng = np.random.RandomState(seed)
+    Dict = rng.randn(N, D)
+    Dict /= np.sqrt(np.sum(Dict**2, axis=0))
+    Gamma = np.zeros((D, M))
+    for m in range(M):
+        Gamma[rng.permutation(D)[0:T], m] = rng.randn(T)
+    return np.dot(Dict, Gamma) + noise*rng.randn(N, M)
+
+
+def rmse(X, Dict, T):
+    """RMS reconstruction error using T-sparse OMP codes."""
+    G = sparse_encode(X.T, Dict.T, algorithm='omp', n_nonzero_coefs=T)
+    return np.sqrt(np.mean((X - np.dot(Dict, G.T))**2))
+
+
+def benchKSVD(X, D, T, errTarget, nIter, nJobs):
+    t0 = time.time()
+    Dict, _ = ksvd.ksvd(X, D, T, nIter, nJobs=nJobs, errTarget=errTarget)
+    elapsed = time.time() - t0
+    return {"time" : elapsed, "rmse" : rmse(X, Dict, T)}
+
+
+def benchSklearn(X, D, T, errTarget, nPasses, batchSiz=256):
+    lrnObj = MiniBatchDictionaryLearning(n_components=D, alpha=1)
+    err = None
+    elapsed = 0
+    for p in range(nPasses):
+        t0 = time.time()
+        perm = np.random.permutation(X.shape[1])
+        for beg in range(0, X.shape[1], batchSiz):
+            lrnObj.partial_fit(X[:,perm[beg:beg+batchSiz]].T)
+        elapsed += time.time() - t0
+        # error evaluation is not timed
+        err = rmse(X, lrnObj.components_.T, T)
+        if err <= errTarget:
+            break
+    return {"time" : elapsed, "rmse" : err, "passes" : p+1}
+
+
+def main(argv=None):
+    if argv is None:
+        argv=sys.argv
+
+    parser = OptionParser(add_help_option=False)
+    parser.add_option("-N", dest="dim", type="int", default=1024)
+    parser.add_option("-M", dest="num", type="int", default=2000)
+    parser.add_option("-D", dest="dictSiz", type="int", default=32)
+    parser.add_option("-T", dest="sparsity", type="int", default=3)
+    parser.add_option("-e", dest="errTarget", type="float", default=0.02)
+    parser.add_option("-n", dest="numIter", type="int", default=50)
+    parser.add_option("-j", dest="numJobs", type="int", default=1)
+    parser.add_option("-o", dest="outFile")
+    parser.add_option("-h", dest="doHelp", action="store_true", default=False)
+    options, _ = parser.parse_args(argv[1:])
+
+    if options.doHelp:
+        usage()
+        sys.exit(-1)
+
+    X = synthData(options.dim, options.num, options.dictSiz, options.sparsity)
+
+    res = {"N" : options.dim,
+           "M" : options.num,
+           "D" : options.dictSiz,
+           "T" : options.sparsity,
+           "errTarget" : options.errTarget,
+           "ksvd" : benchKSVD(X, options.dictSiz, options.sparsity,
+                              options.errTarget, options.numIter,
+                              options.numJobs),
+           "sklearn" : benchSklearn(X, options.dictSiz, options.sparsity,
+                                    options.errTarget, options.numIter)}
+
+    if options.outFile is None:
+        print(json.dumps(res, indent=2))
+    else:
+        with open(options.outFile, 'w') as fid:
+            json.dump(res, fid, indent=2)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
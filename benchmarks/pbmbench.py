@@ -0,0 +1,248 @@
+"""pbmbench.py
+"""
+
+
+__license__ = "Apache License, Version 2.0"
+__author__  = "Roland Kwitt, Kitware Inc., 2013"
+__email__   = "E-Mail: roland.kwitt@kitware.com"
+__status__  = "Development"
+
+
+import os
+import sys
+import json
+import shutil
+import tempfile
+import numpy as np
+import SimpleITK as sitk
+import cv2 as cv
+from optparse import OptionParser
+from scipy.ndimage import zoom
+from scipy.ndimage import map_coordinates
+from sklearn.decomposition import MiniBatchDictionaryLearning
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir))
+from core import pbmutils
+from core import pbmio
+from core import pbmprof
+
+
+def usage():
+    """Print usage information"""
+    print("""
+End-to-end benchmark of the PBM pipeline (as run by pbm.py) on synthetic
+cohorts. The two populations are generated by randomly (and smoothly)
+warping the templates testdata/variant-A.png and testdata/variant-C.png; 3D
+cohorts stack the template along z (with a Gaussian profile) before warping.
+Each pipeline stage (load/resize, nearest neighbors incl. the distance
+computation, difference images, dictionary learning and output writing) is
+timed separately and the wall time, CPU time, peak traced memory
+(tracemalloc), peak RSS and disk I/O per stage (see core.pbmprof) are
+written as JSON. The stages use the same calls as pbm.py (and a seeded
+dictionary learner, i.e., repeatable atoms).
+
+    USAGE:
+        {0} [OPTIONS]
+        {0} -h
+
+    OPTIONS (Overview):
+
+        -n NUM[,NUM,...]
+        -s NUM[,NUM,...]
+        -z NUM
+        -r NUM
+        -k NUM
+        -D NUM
+        -w DIR
+        -o FILE
+
+    OPTIONS (Detailed):
+
+        -n NUM[,NUM,...] (default: 10)
+
+        NUM is the number of subjects per population. A list of values runs
+        one benchmark per cohort size.
+
+        -s NUM[,NUM,...] (default: 128)
+
+        NUM is the in-plane image size (NUM x NUM pixels). A list of values
+        runs one benchmark per image size.
+
+        -z NUM (default: 0)
+
+        NUM is the number of slices. If NUM > 0, 3D cohorts are generated
+        (NUM x NUM x NUM voxels for NUM = -1, i.e., isotropic).
+
+        -r NUM (optional)
+
+        Rescale the images by NUM when loading (same as pbm.py -r).
+
+        -k NUM (default: 3)
+
+        NUM is the number of nearest neighbors.
+
+        -D NUM (default: 5)
+
+        NUM is the dictionary size.
+
+        -w DIR (optional)
+
+        Generate the cohorts in DIR and keep them (a temporary directory is
+        used and removed otherwise).
+
+        -o FILE (optional)
+
+        Write the results to FILE (otherwise to stdout).
+
+AUTHOR: Roland Kwitt, Kitware Inc., 2013
+        roland.kwitt@kitware.com
+""".format(sys.argv[0]))
+
+
+def loadTemplate(name, size):
+    """Load a testdata template as float32 image (vessels = foreground)."""
+    baseDir = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                           os.pardir, "testdata")
+    im = cv.imread(os.path.join(baseDir, name), cv.IMREAD_GRAYSCALE)
+    im = cv.resize(im, (size, size), interpolation=cv.INTER_AREA)
+    return 1.0 - im.astype(np.float32)/255.0
+
+
+def warp(im, rng, amplitude=4.0, grid=5):
+    """Random smooth warp (2D or 3D) of an image.
+
+    Displacements are drawn on a coarse grid (grid^dim control points),
+    upsampled to the image size and scaled to +/- amplitude pixels.
+    """
+    coords = np.indices(im.shape, dtype=np.float32)
+    for d in range(im.ndim):
+        disp = rng.uniform(-1, 1, (grid,)*im.ndim)
+        disp = zoom(disp, [float(s)/grid for s in im.shape], order=3)
+        coords[d] += amplitude*disp[tuple([slice(0, s) for s in im.shape])]
+    return map_coordinates(im, coords, order=1, mode='nearest')
+
+
+def makeCohort(outDir, nSubj, size, depth=0, seed=0):
+    """Generate a synthetic two-population cohort.
+
+    Returns
+    -------
+
+    imgJSON : string
+        Image JSON file (same format as pbm.py -i).
+    """
+    rng = np.random.RandomState(seed)
+    data = []
+    for group, name in [("A", "variant-A.png"), ("C", "variant-C.png")]:
+        tpl = loadTemplate(name, size)
+        if depth != 0:
+            if depth < 0:
+                depth = size
+            z = np.linspace(-1, 1, depth).reshape((depth, 1, 1))
+            tpl = tpl[np.newaxis,:,:]*np.exp(-z**2/0.25)
+        for i in range(nSubj):
+            imFile = os.path.join(outDir, "%s-%.4d.mha" % (group, i))
+            im = warp(tpl, rng).astype(np.float32)
+            sitk.WriteImage(sitk.GetImageFromArray(im), imFile)
+            data.append({"Source" : imFile, "Group" : group})
+
+    imgJSON = os.path.join(outDir, "images.json")
+    with open(imgJSON, 'w') as fid:
+        json.dump({"Data" : data}, fid, indent=2)
+    return imgJSON
+
+
+def benchPipeline(imgJSON, K, D, imScale=None, outDir=None):
+    """Run (and time) the PBM pipeline stages on a cohort."""
+    with open(imgJSON) as fid:
+        imData = json.load(fid)["Data"]
+    groups = sorted(set([e["Group"] for e in imData]))
+    labels = [groups.index(e["Group"]) for e in imData]
+
+    prof = pbmprof.profiler(traceMem=True)
+
+    prof.begin("load")
+    dataList = [pbmutils.imLoad(e["Source"], imScale).ravel()
+                for e in imData]
+    X = np.asmatrix(dataList).T
+
+    # same calls (and seeded learner) as pbm.py
+    prof.begin("neighbors")
+    S, Z = pbmutils.groupNeighbors(X, labels, K)
+
+    prof.begin("groupDiff")
+    diffIm = np.vstack(list(pbmutils.groupDiffBatches(X, S, Z))).T
+
+    prof.begin("learning")
+    lrnObj = MiniBatchDictionaryLearning(n_components=D, alpha=1,
+                                         random_state=0)
+    atoms = lrnObj.fit(np.asarray(diffIm).T).components_
+
+    prof.begin("output")
+    pbmio.writeArray(os.path.join(outDir, "diff"), np.asarray(diffIm).T,
+                     "differences")
+    pbmio.writeArray(os.path.join(outDir, "atoms"), atoms, "atoms")
+    prof.end()
+
+    return {"images" : len(imData),
+            "voxels" : X.shape[0],
+            "differences" : diffIm.shape[1],
+            "stages" : prof.stages}
+
+
+def main(argv=None):
+    if argv is None:
+        argv=sys.argv
+
+    parser = OptionParser(add_help_option=False)
+    parser.add_option("-n", dest="numSubj", default="10")
+    parser.add_option("-s", dest="imSize", default="128")
+    parser.add_option("-z", dest="depth", type="int", default=0)
+    parser.add_option("-r", dest="imScale", type="float")
+    parser.add_option("-k", dest="nearest", type="int", default=3)
+    parser.add_option("-D", dest="dictSiz", type="int", default=5)
+    parser.add_option("-w", dest="workDir")
+    parser.add_option("-o", dest="outFile")
+    parser.add_option("-h", dest="doHelp", action="store_true", default=False)
+    options, _ = parser.parse_args(argv[1:])
+
+    if options.doHelp:
+        usage()
+        sys.exit(-1)
+
+    workDir = options.workDir
+    if workDir is None:
+        workDir = tempfile.mkdtemp(prefix="pbmbench-")
+
+    res = []
+    try:
+        for nSubj in [int(x) for x in options.numSubj.split(',')]:
+            for imSize in [int(x) for x in options.imSize.split(',')]:
+                runDir = os.path.join(workDir, "n%d-s%d-z%d" %
+                                      (nSubj, imSize, options.depth))
+                if not os.path.exists(runDir):
+                    os.makedirs(runDir)
+                imgJSON = makeCohort(runDir, nSubj, imSize, options.depth)
+                run = benchPipeline(imgJSON, options.nearest,
+                                    options.dictSiz, options.imScale, runDir)
+                run.update({"subjects" : nSubj,
+                            "size" : imSize,
+                            "depth" : options.depth,
+                            "scale" : options.imScale,
+                            "K" : options.nearest,
+                            "D" : options.dictSiz})
+                res.append(run)
+    finally:
+        if options.workDir is None:
+            shutil.rmtree(workDir)
+
+    if options.outFile is None:
+        print(json.dumps(res, indent=2))
+    else:
+        with open(options.outFile, 'w') as fid:
+            json.dump(res, fid, indent=2)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,177 @@
+"""startupbench.py
+"""
+
+
+__license__ = "Apache License, Version 2.0"
+__author__  = "Roland Kwitt, Kitware Inc., 2013"
+__email__   = "E-Mail: roland.kwitt@kitware.com"
+__status__  = "Development"
+
+
+import os
+import sys
+import json
+import time
+import shutil
+import tempfile
+import subprocess
+import numpy as np
+from optparse import OptionParser
+
+
+BASEDIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+
+
+def usage():
+    """Print usage information"""
+    print("""
+Benchmark the start-up time of the pypbm command-line tools. For each command,
+the time of '<command>.py -h' and 'pypbm.py <command> -h' (i.e., interpreter
+start-up + imports + option parsing) is measured (median over -r runs), as
+well as the heavy modules (numpy, SimpleITK, sklearn, ...) that are imported
+by '-h'; these should only be imported after argument parsing. For reference,
+the bare interpreter start-up and the import time of the heavy modules are
+measured as well. Then,
+-n invocations of controlpoints.py (as run by scripts/genpop.sh) are timed,
+once as separate processes and once in batch mode (pypbm.py batch). The
+results are written as JSON.
+
+    USAGE:
+        {0} [OPTIONS]
+        {0} -h
+
+    OPTIONS (Overview):
+
+        -c CMD[,CMD,...]
+        -r NUM
+        -n NUM
+        -o FILE
+
+    OPTIONS (Detailed):
+
+        -c CMD[,CMD,...] (default: pbm,dlearn,imgavg,controlpoints,chstr)
+
+        Commands to benchmark.
+
+        -r NUM (default: 5)
+
+        NUM is the number of runs per command.
+
+        -n NUM (default: 100)
+
+        NUM is the number of controlpoints.py invocations.
+
+        -o FILE (optional)
+
+        Write the results to FILE (otherwise to stdout).
+
+AUTHOR: Roland Kwitt, Kitware Inc., 2013
+        roland.kwitt@kitware.com
+""".format(sys.argv[0]))
+
+
+# modules that should not be imported before argument parsing
+HEAVY = ["numpy", "scipy", "SimpleITK", "sklearn", "cv2", "matplotlib"]
+
+
+def timeCall(args, stdin=None):
+    """Wall time of a subprocess (output is discarded)."""
+    with open(os.devnull, 'w') as null:
+        t0 = time.time()
+        proc = subprocess.Popen(args, cwd=BASEDIR, stdin=subprocess.PIPE,
+                                stdout=null, stderr=null)
+        proc.communicate(stdin)
+        return time.time() - t0
+
+
+def benchCommand(command, nRuns):
+    """Median start-up time of a command (script vs. pypbm.py)."""
+    script = [sys.executable, command + ".py", "-h"]
+    pypbm = [sys.executable, "pypbm.py", command, "-h"]
+    return {"command" : command,
+            "script" : float(np.median([timeCall(script)
+                                        for i in range(nRuns)])),
+            "pypbm" : float(np.median([timeCall(pypbm)
+                                       for i in range(nRuns)])),
+            "heavyImports" : helpImports(command)}
+
+
+def helpImports(command):
+    """Heavy modules (see HEAVY) imported by 'pypbm.py <command> -h'."""
+    code = ("import os, sys, json, pypbm\n"
+            "out = sys.stdout\n"
+            "sys.stdout = open(os.devnull, 'w')\n"
+            "pypbm.run(%r, ['-h'])\n"
+            "sys.stdout = out\n"
+            "print(json.dumps([m for m in %r if m in sys.modules]))\n" %
+            (command, HEAVY))
+    proc = subprocess.Popen([sys.executable, "-c", code], cwd=BASEDIR,
+                            stdout=subprocess.PIPE)
+    out, _ = proc.communicate()
+    return json.loads(out.decode().strip().splitlines()[-1])
+
+
+def benchBaseline(nRuns):
+    """Median interpreter start-up time, without and with the heavy modules."""
+    bare = [sys.executable, "-c", "pass"]
+    heavy = [sys.executable, "-c", "import numpy, scipy, SimpleITK, "
+             "sklearn.decomposition, cv2"]
+    return {"interpreter" : float(np.median([timeCall(bare)
+                                             for i in range(nRuns)])),
+            "heavyImports" : float(np.median([timeCall(heavy)
+                                              for i in range(nRuns)]))}
+
+
+def benchLoop(nCalls, outDir):
+    """N controlpoints invocations: separate processes vs. batch mode."""
+    calls = [["controlpoints", "-W", "256", "-H", "256", "-r", "5", "-n", "10",
+              "-o", os.path.join(outDir, "Image-%.4d.cp" % i)]
+             for i in range(nCalls)]
+
+    t0 = time.time()
+    for c in calls:
+        timeCall([sys.executable, c[0] + ".py"] + c[1:])
+    procTime = time.time() - t0
+
+    batch = "\n".join([" ".join(c) for c in calls]) + "\n"
+    batchTime = timeCall([sys.executable, "pypbm.py", "batch", "-"],
+                         batch.encode())
+    return {"calls" : nCalls, "processes" : procTime, "batch" : batchTime}
+
+
+def main(argv=None):
+    if argv is None:
+        argv=sys.argv
+
+    parser = OptionParser(add_help_option=False)
+    parser.add_option("-c", dest="commands",
+                      default="pbm,dlearn,imgavg,controlpoints,chstr")
+    parser.add_option("-r", dest="numRuns", type="int", default=5)
+    parser.add_option("-n", dest="numCalls", type="int", default=100)
+    parser.add_option("-o", dest="outFile")
+    parser.add_option("-h", dest="doHelp", action="store_true", default=False)
+    options, _ = parser.parse_args(argv[1:])
+
+    if options.doHelp:
+        usage()
+        sys.exit(-1)
+
+    outDir = tempfile.mkdtemp(prefix="startupbench-")
+    try:
+        res = {"python" : sys.version.split()[0],
+               "baseline" : benchBaseline(options.numRuns),
+               "startup" : [benchCommand(c, options.numRuns)
+                            for c in options.commands.split(',')],
+               "loop" : benchLoop(options.numCalls, outDir)}
+    finally:
+        shutil.rmtree(outDir)
+
+    if options.outFile is None:
+        print(json.dumps(res, indent=2))
+    else:
+        with open(options.outFile, 'w') as fid:
+            json.dump(res, fid, indent=2)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
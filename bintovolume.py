@@ -9,16 +9,19 @@ __status__  = "Development"
 
 
 from optparse import OptionParser
-import SimpleITK as sitk
-import numpy as np
 import sys
 
+# numpy, SimpleITK and the core modules using them are imported in main() after
+# argument parsing, i.e., 'bintovolume.py -h' does not pay for them
+
 
 def usage():
     """Print usage information"""
     print("""
 Take a binary file with float values and reshape the data into a 3D image that
-is readable by Slicer for instance.
+is readable by Slicer for instance. If the input file is an array file written
+by pbm.py (.npy + JSON sidecar), one item (image, difference image or atom) is
+converted and the shape and image geometry are taken from the sidecar.
 
     USAGE:
         {0} [OPTIONS]
@@ -29,12 +32,14 @@ is readable by Slicer for instance.
         -i FILE
         -o FILE
         -s NUM NUM NUM
+        -n NUM
 
     OPTIONS (Detailed):
 
         -i FILE
 
-        FILE is the filename of the input file (in binary format, float32).
+        FILE is the filename of the input file (in binary format, float32, or
+        an array file written by pbm.py).
 
         -o FILE
 
@@ -42,33 +47,65 @@ is readable by Slicer for instance.
 
         -s NUM NUM NUM
 
-        Specifies the x,y,z dimensions to reshape the binary data (int).
+        Specifies the x,y,z dimensions to reshape the binary data (int); not
+        required for array files.
+
+        -n NUM (default: 0)
+
+        NUM is the index of the item to convert (array files only).
 
 AUTHOR: Roland Kwitt, Kitware Inc., 2013
         roland.kwitt@kitware.com
 """.format(sys.argv[0]))
 
 
-parser = OptionParser(add_help_option=False)
-parser.add_option("-i", dest="binFile")
-parser.add_option("-o", dest="outFile")
-parser.add_option("-s", dest="reshape", nargs=3)
-parser.add_option("-h", dest="useHelp", action="store_true", default=False)
-options, _ = parser.parse_args()
-
-if options.useHelp:
-    usage()
-    sys.exit(-1)
-
-if (options.outFile is None or
-    options.binFile is None or
-    options.reshape is None):
-    usage()
-    sys.exit(-1)
-
-dstShape = [int(x) for x in options.reshape]
-data = np.fromfile(options.binFile,dtype=np.float32)
-data = data.reshape(dstShape)
-
-im = sitk.GetImageFromArray(data)
-sitk.WriteImage(im, options.outFile)
+def main(argv=None):
+    if argv is None:
+        argv=sys.argv
+
+    parser = OptionParser(add_help_option=False)
+    parser.add_option("-i", dest="binFile")
+    parser.add_option("-o", dest="outFile")
+    parser.add_option("-s", dest="reshape", nargs=3)
+    parser.add_option("-n", dest="item", type="int", default=0)
+    parser.add_option("-h", dest="useHelp", action="store_true", default=False)
+    options, _ = parser.parse_args(argv[1:])
+
+    if options.useHelp:
+        usage()
+        sys.exit(-1)
+
+    from core import pbmio
+    import SimpleITK as sitk
+    import numpy as np
+
+    if options.outFile is None or options.binFile is None:
+        usage()
+        sys.exit(-1)
+
+    geometry = None
+    if pbmio.isArrayFile(options.binFile):
+        data, meta = pbmio.readItem(options.binFile, options.item)
+        geometry = meta.get("geometry")
+        if (not geometry is None and
+            list(geometry["size"][::-1]) != list(data.shape)):
+            # e.g., a slice or slabs of a volume
+            geometry = None
+    else:
+        if options.reshape is None:
+            usage()
+            sys.exit(-1)
+        dstShape = [int(x) for x in options.reshape]
+        data = np.fromfile(options.binFile,dtype=np.float32)
+        data = data.reshape(dstShape)
+
+    im = sitk.GetImageFromArray(data)
+    if not geometry is None:
+        im.SetSpacing(geometry["spacing"])
+        im.SetOrigin(geometry["origin"])
+        im.SetDirection(geometry["direction"])
+    sitk.WriteImage(im, options.outFile)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
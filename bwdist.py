@@ -9,39 +9,22 @@ __status__  = "Development"
 
 
 from optparse import OptionParser
-import SimpleITK as sitk
-import numpy as np
+import multiprocessing as mp
 import sys
-import os
 
-
-def invert(orgImg):
-    """Compute image inverse.
-
-    Paramters
-    ---------
-    orgImg : sitk.Image
-        Input image.
-
-    Returns
-    -------
-    invImg : sitk.Image
-        Inverse of input image.
-    """
-
-    orgMat = sitk.GetArrayFromImage(orgImg)
-    minVal = np.amin(orgMat)
-    maxVal = np.amax(orgMat)
-    invMat = (maxVal + minVal) - orgMat
-    invImg = sitk.GetImageFromArray(invMat)
-    imgImg.CopyInformation(orgImg)
+# numpy, SimpleITK and the core modules using them are imported in main() after
+# argument parsing, i.e., 'bwdist.py -h' does not pay for them
 
 
 def usage():
     """Print usage information"""
     print("""
 Take a binary image, apply skeletonization and output an inverted Euclidean
-distance transform image.
+distance transform image. With -l, all images of a list are processed (in a
+pool of worker processes) and the output is written next to each input image,
+i.e., /tmp/img1.png is mapped to /tmp/img1-Den.tiff (same as
+scripts/runbwdist.sh). Outputs that are newer than their input are skipped.
+2D and 3D images are supported (3D skeletonization requires scikit-image).
 
     USAGE:
         {0} [OPTIONS]
@@ -49,9 +32,13 @@ distance transform image.
 
     OPTIONS (Overview):
 
-        -i NUM
-        -o NUM
+        -i FILE
+        -o FILE
+        -l FILE
+        -j NUM
+        -f
         -s
+        -b NAME
 
     OPTIONS (Detailed):
 
@@ -63,10 +50,31 @@ distance transform image.
 
         FILE is the filename of the output distance image.
 
+        -l FILE
+
+        FILE contains a list of input image files (one per line). Used
+        instead of -i/-o.
+
+        -j NUM (default: 1)
+
+        NUM is the number of worker processes (only used with -l).
+
+        -f
+
+        If -f is specified, up-to-date outputs are recomputed (only used
+        with -l).
+
         -s
 
         If -s is specified, use the squared Euclidean distance.
 
+        -b NAME (default: danielsson)
+
+        NAME is the distance map backend: 'danielsson' (SimpleITK's
+        Danielsson filter), 'maurer' (SimpleITK's Maurer filter, exact and
+        multithreaded) or 'scipy' (SciPy's exact EDT). Use maurer or scipy
+        for large 3D volumes (see benchmarks/bwdistbench.py).
+
 AUTHOR: Roland Kwitt, Kitware Inc., 2013
         roland.kwitt@kitware.com
 """.format(sys.argv[0]))
@@ -77,38 +85,56 @@ def main(argv=None):
         argv=sys.argv
 
     parser = OptionParser(add_help_option=False)
-    parser.add_option("-l", dest="binFile")
+    parser.add_option("-i", dest="binFile")
     parser.add_option("-o", dest="denFile")
+    parser.add_option("-l", dest="binList")
+    parser.add_option("-j", dest="numJobs", type="int", default=1)
+    parser.add_option("-f", dest="force", action="store_true", default=False)
     parser.add_option("-s", dest="square", action="store_true", default=False)
+    parser.add_option("-b", dest="backend", default="danielsson")
     parser.add_option("-h", dest="doHelp", action="store_true", default=False)
-    options, _ = parser.parse_args()
+    options, _ = parser.parse_args(argv[1:])
 
     if options.doHelp:
         usage()
         sys.exit(-1)
 
+    from core import dmaputils
+
     binFile = options.binFile
     denFile = options.denFile
+    binList = options.binList
     useSquaredDistance = options.square
-
-    if not os.path.exists(binFile):
-        raise Exception("File %s does not exist!" % imgFile)
-
-    # read the image from disk
-    img = sitk.ReadImage(imgFile)
-
-    # generate skeleton
-    thinFilter = sitk.BinaryThinningImageFilter()
-    thinnedImg = thinFilter.Execute(img)
-
-    # compute the distance map
-    dmapFilter = sitk.DanielssonDistanceMapImageFilter()
-    dmapFilter.SetSquaredDistance(useSquaredDistance)
-    dmap = dmapFilter.Execute(thinnedImg)
-    pmap = invert(dmap)
-
-    # ... and write the image back to disk
-    sitk.WriteImage(pmap, denFile)
+    backend = options.backend
+
+    if binList is None:
+        if binFile is None or denFile is None:
+            usage()
+            sys.exit(-1)
+        dmaputils.densityFile((binFile, denFile, useSquaredDistance, backend))
+        return
+
+    with open(binList) as fid:
+        binFiles = [l.strip() for l in fid if l.strip()]
+
+    tasks = []
+    for f in binFiles:
+        denFile = dmaputils.denFileName(f)
+        if not options.force and dmaputils.isUpToDate(f, denFile):
+            print("%s is up to date" % denFile)
+            continue
+        tasks.append((f, denFile, useSquaredDistance, backend))
+
+    if options.numJobs > 1:
+        pool = mp.Pool(options.numJobs)
+        res = pool.imap_unordered(dmaputils.densityFile, tasks)
+    else:
+        res = (dmaputils.densityFile(t) for t in tasks)
+    for denFile in res:
+        print("wrote %s" % denFile)
+    if options.numJobs > 1:
+        pool.close()
+        pool.join()
 
 
 if __name__ == '__main__':
@@ -51,11 +51,11 @@ def main(argv=None):
         argv=sys.argv
 
     parser = OptionParser(add_help_option=False)
-    parser.add_option("-i", dest="inList")
-    parser.add_option("-c", dest="sStr")
-    parser.add_option("-a", dest="rStr")
+    parser.add_option("-i", dest="inFile")
+    parser.add_option("-s", dest="sStr")
+    parser.add_option("-r", dest="rStr")
     parser.add_option("-h", dest="doHelp", action="store_true", default=False)
-    options, _ = parser.parse_args()
+    options, _ = parser.parse_args(argv[1:])
 
     if options.doHelp:
         usage()
@@ -65,10 +65,16 @@ def main(argv=None):
     sStr = options.sStr
     rStr = options.rStr
 
-    data = pickle.load(open(inFile))
+    if inFile is None or sStr is None or rStr is None:
+        usage()
+        sys.exit(-1)
+
+    with open(inFile, "rb") as fid:
+        data = pickle.load(fid)
     for i, p in enumerate(data):
         data[i] = p.replace(sStr, rStr)
-    pickle.dump(data, open(inFile, "w"))
+    with open(inFile, "wb") as fid:
+        pickle.dump(data, fid)
 
 
 if __name__ == "__main__":
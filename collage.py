@@ -8,11 +8,12 @@ __status__  = "Development"
 
 
 from optparse import OptionParser
-import matplotlib.pylab as lab
-import numpy as np
 import sys
 import os
 
+# matplotlib, numpy and the core modules using them are imported in main()
+# after argument parsing, i.e., 'collage.py -h' does not pay for them
+
 
 def usage():
     """Print usage information"""
@@ -20,7 +21,9 @@ def usage():
 Take a file with a list of 2D images that have been written out as a vector
 in binary format and build a collage of those images (horizontally). A JET
 colormap is used and the color axis is chosen such that all images have the
-same scale.
+same scale. Array files written by pbm.py (.npy + JSON sidecar) can be listed
+as well, either as FILE (all items) or FILE:NUM (item NUM only); their image
+shape is taken from the sidecar.
 
     USAGE:
         {0} [OPTIONS]
@@ -31,6 +34,7 @@ same scale.
         -l FILE
         -o FILE
         -b DIR
+        -s NUM NUM
 
     OPTIONS (Detailed):
 
@@ -46,6 +50,11 @@ same scale.
 
         DIR is the base directory of the images.
 
+        -s NUM NUM (default: 256 256)
+
+        Width and height of the images in binary format (column-major, as
+        written by MATLAB).
+
     EXAMPLE:
 
         Asssume in MATLAB you processed an image and wrote the image out as
@@ -82,13 +91,19 @@ def main(argv=None):
     parser.add_option("-l", dest="inList")
     parser.add_option("-b", dest="inBase")
     parser.add_option("-o", dest="outImg")
+    parser.add_option("-s", dest="imSize", type="int", nargs=2,
+                      default=(256,256))
     parser.add_option("-h", dest="doHelp", action="store_true", default=False)
-    options, _ = parser.parse_args()
+    options, _ = parser.parse_args(argv[1:])
 
     if options.doHelp:
         usage()
         sys.exit(-1)
 
+    from core import pbmio
+    import matplotlib.pylab as lab
+    import numpy as np
+
     inBase = options.inBase
     inList = options.inList
     outImg = options.outImg
@@ -99,9 +114,19 @@ def main(argv=None):
     data = []
     for l in lines:
         imgName = os.path.join(inBase, l.rstrip())
-        basName, ext = os.path.splitext(l.rstrip())
-        img = np.fromfile(imgName, dtype=np.float32)
-        data.append(img)
+        item = None
+        if not os.path.exists(imgName) and ':' in imgName:
+            imgName, item = imgName.rsplit(':', 1)
+        if pbmio.isArrayFile(imgName):
+            items, _ = pbmio.readArray(imgName)
+            if item is None:
+                data.extend([np.array(x) for x in items])
+            else:
+                data.append(np.array(items[int(item)]))
+        else:
+            # column-major, i.e., transposed
+            img = np.fromfile(imgName, dtype=np.float32)
+            data.append(img.reshape(options.imSize).T)
 
 
     maxVals = [np.amax(x.ravel()) for x in data]
@@ -112,7 +137,7 @@ def main(argv=None):
     for cnt, x in enumerate(data):
         subplotId = "1" + str(len(data)) + str(cnt+1)
         lab.subplot(subplotId)
-        lab.imshow(x.reshape((256,256)).T, cmap=lab.cm.jet)
+        lab.imshow(x, cmap=lab.cm.jet)
         lab.clim(amin, amax)
         lab.axis('Off')
 
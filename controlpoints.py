@@ -9,10 +9,12 @@ __status__  = "Development"
 
 
 from optparse import OptionParser
-import numpy as np
 import sys
 import os
 
+# numpy is imported in main() after argument parsing, i.e.,
+# 'controlpoints.py -h' does not pay for it
+
 
 def usage():
     """Print usage information"""
@@ -85,12 +87,14 @@ def main(argv=None):
     parser.add_option("-n", dest="maxN", type="int", default=5)
     parser.add_option("-r", dest="maxR", type="int", default=1)
     parser.add_option("-h", dest="doHelp", action="store_true", default=False)
-    options, _ = parser.parse_args()
+    options, _ = parser.parse_args(argv[1:])
 
     if options.doHelp:
         usage()
         sys.exit(-1)
 
+    import numpy as np
+
     w = options.imW
     h = options.imH
     N = options.maxN
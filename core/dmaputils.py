@@ -0,0 +1,191 @@
+"""dmaputils.py
+
+Distance map (vessel density) utilities.
+"""
+
+
+__license__ = "Apache License, Version 2.0"
+__author__  = "Roland Kwitt, Kitware Inc., 2013"
+__email__   = "E-Mail: roland.kwitt@kitware.com"
+__status__  = "Development"
+
+
+import os
+import numpy as np
+import SimpleITK as sitk
+
+
+def skeleton(img):
+    """Skeleton of a binary (2D or 3D) image.
+
+    2D images are thinned with SimpleITK's BinaryThinningImageFilter. This
+    filter is only suitable for 2D images, hence 3D images are skeletonized
+    with scikit-image (imported on demand, i.e., only required for 3D data).
+
+    Parameters
+    ----------
+
+    img : sitk.Image
+        Binary input image.
+
+    Returns
+    -------
+
+    skelImg : sitk.Image (uint8)
+        Skeleton (1 = skeleton, 0 = background).
+    """
+
+    if img.GetDimension() == 2:
+        thinFilter = sitk.BinaryThinningImageFilter()
+        return thinFilter.Execute(sitk.Cast(img, sitk.sitkUInt8))
+
+    from skimage.morphology import skeletonize
+    skel = skeletonize(sitk.GetArrayFromImage(img) > 0, method='lee')
+    skelImg = sitk.GetImageFromArray((skel > 0).astype(np.uint8))
+    skelImg.CopyInformation(img)
+    return skelImg
+
+
+def distanceMap(skelImg, backend="danielsson", squared=False):
+    """Euclidean distance (in pixels) to the closest skeleton pixel.
+
+    Parameters
+    ----------
+
+    skelImg : sitk.Image
+        Skeleton (see skeleton), 2D or 3D.
+
+    backend : string (default : 'danielsson')
+        One of 'danielsson' (DanielssonDistanceMapImageFilter), 'maurer'
+        (SignedMaurerDistanceMapImageFilter, exact and multithreaded) or
+        'scipy' (scipy.ndimage.distance_transform_edt, exact).
+
+    squared : boolean (default : False)
+        Use the squared Euclidean distance.
+
+    Returns
+    -------
+
+    dmap : numpy array (float32)
+        Distance map.
+    """
+
+    if backend == "danielsson":
+        dmapFilter = sitk.DanielssonDistanceMapImageFilter()
+        dmapFilter.SetSquaredDistance(squared)
+        dmap = sitk.GetArrayFromImage(dmapFilter.Execute(skelImg))
+    elif backend == "maurer":
+        dmapFilter = sitk.SignedMaurerDistanceMapImageFilter()
+        dmapFilter.SetSquaredDistance(squared)
+        dmapFilter.SetUseImageSpacing(False)
+        dmapFilter.SetInsideIsPositive(False)
+        dmap = sitk.GetArrayFromImage(dmapFilter.Execute(skelImg))
+        # skeleton pixels (inside) are <= 0
+        np.maximum(dmap, 0, out=dmap)
+    elif backend == "scipy":
+        from scipy.ndimage import distance_transform_edt
+        dmap = distance_transform_edt(sitk.GetArrayFromImage(skelImg) == 0)
+        if squared:
+            dmap **= 2
+    else:
+        raise Exception("unknown distance map backend %s!" % backend)
+    return dmap.astype(np.float32, copy=False)
+
+
+def densityMap(img, squared=False, backend="danielsson"):
+    """Inverted distance map of the skeleton of a binary image.
+
+    The inversion, i.e., (max + min) - distance, is done in place on the
+    float32 distance map.
+
+    Parameters
+    ----------
+
+    img : sitk.Image
+        Binary input image (2D or 3D).
+
+    squared : boolean (default : False)
+        Use the squared Euclidean distance.
+
+    backend : string (default : 'danielsson')
+        Distance map backend (see distanceMap).
+
+    Returns
+    -------
+
+    denImg : sitk.Image (float32)
+        Inverted distance map.
+    """
+
+    dmap = distanceMap(skeleton(img), backend, squared)
+    shift = np.amax(dmap) + np.amin(dmap)
+    np.negative(dmap, out=dmap)
+    dmap += shift
+    denImg = sitk.GetImageFromArray(dmap)
+    denImg.CopyInformation(img)
+    return denImg
+
+
+def denFileName(imgFile, ext=".tiff"):
+    """Output filename of the density map of an image.
+
+    Same naming as scripts/runbwdist.sh, i.e., /tmp/img1.png is mapped to
+    /tmp/img1-Den.tiff.
+    """
+    base, _ = os.path.splitext(imgFile)
+    return base + "-Den" + ext
+
+
+def isUpToDate(srcFile, dstFile):
+    """Check if dstFile exists and is newer than srcFile."""
+    if not os.path.exists(dstFile):
+        return False
+    return os.path.getmtime(dstFile) >= os.path.getmtime(srcFile)
+
+
+def densityFile(task):
+    """Compute (and write) the density map of an image file.
+
+    Parameters
+    ----------
+
+    task : tuple
+        (imgFile, denFile, squared, backend), see densityMap.
+
+    Returns
+    -------
+
+    denFile : string
+        Output filename.
+    """
+    imgFile, denFile, squared, backend = task
+    if not os.path.exists(imgFile):
+        raise Exception("File %s does not exist!" % imgFile)
+    sitk.WriteImage(densityMap(sitk.ReadImage(imgFile), squared, backend),
+                    denFile)
+    return denFile
+
+
+def densityArray(task):
+    """Compute the density map of an image file (as numpy array).
+
+    Parameters
+    ----------
+
+    task : tuple
+        (imgFile, denFile, squared, backend), see densityMap. If denFile is
+        not None, the density map is written to denFile as well.
+
+    Returns
+    -------
+
+    data : numpy array (float32)
+        Density map.
+    """
+    imgFile, denFile, squared, backend = task
+    if not os.path.exists(imgFile):
+        raise Exception("File %s does not exist!" % imgFile)
+    denImg = densityMap(sitk.ReadImage(imgFile), squared, backend)
+    if not denFile is None:
+        sitk.WriteImage(denImg, denFile)
+    return sitk.GetArrayFromImage(denImg)
@@ -0,0 +1,157 @@
+"""imcache.py
+
+Persistent on-disk cache for preprocessed image data.
+"""
+
+
+__license__ = "Apache License, Version 2.0"
+__author__  = "Roland Kwitt, Kitware Inc., 2013"
+__email__   = "E-Mail: roland.kwitt@kitware.com"
+__status__  = "Development"
+
+
+import os
+import json
+import hashlib
+import numpy as np
+
+
+class imcache:
+    """Image cache.
+
+    Preprocessed (e.g., resized and sliced) image data is stored as float32
+    .npy files in a cache directory, keyed on the source file (absolute path,
+    modification time and size) and the preprocessing parameters. Cached data
+    is returned as a read-only memory map. The cache is limited in size; the
+    least recently used entries are evicted first.
+    """
+
+    def __init__(self, cacheDir, maxSize=None):
+        """Initialization.
+
+        Parameters
+        ----------
+
+        cacheDir : string
+            Cache directory (created if it does not exist).
+
+        maxSize : int (default : None)
+            Max. cache size in bytes (unlimited if None).
+        """
+        self.cacheDir = cacheDir
+        self.maxSize = maxSize
+        if not os.path.exists(cacheDir):
+            os.makedirs(cacheDir)
+
+
+    def key(self, srcFile, **params):
+        """Compute the cache key for a source file and parameters.
+
+        Parameters
+        ----------
+
+        srcFile : string
+            Source image file.
+
+        params : keyword arguments
+            Preprocessing parameters (e.g., scale=0.5, slice=10).
+
+        Returns
+        -------
+
+        key : string
+            Cache key (hex digest).
+        """
+        st = os.stat(srcFile)
+        desc = {"src" : os.path.abspath(srcFile),
+                "mtime" : st.st_mtime,
+                "size" : st.st_size,
+                "params" : params}
+        desc = json.dumps(desc, sort_keys=True).encode()
+        return hashlib.sha1(desc).hexdigest()
+
+
+    def get(self, key):
+        """Get cached data (None if not cached).
+        """
+        fileName = self.__fileName(key)
+        if not os.path.exists(fileName):
+            return None
+        try:
+            data = np.load(fileName, mmap_mode='r')
+        except (IOError, ValueError):
+            # broken entry (e.g., interrupted write)
+            os.remove(fileName)
+            return None
+        # touch the entry, so that its mtime reflects the last access (LRU)
+        os.utime(fileName, None)
+        return data
+
+
+    def put(self, key, data):
+        """Store data in the cache and evict old entries if necessary.
+
+        Returns
+        -------
+
+        data : numpy array
+            The cached data (as float32).
+        """
+        data = np.asarray(data, dtype=np.float32)
+        fileName = self.__fileName(key)
+        tmpFile = fileName + ".tmp.npy"
+        np.save(tmpFile, data)
+        os.rename(tmpFile, fileName)
+        self.evict()
+        return data
+
+
+    def load(self, srcFile, loadFun, **params):
+        """Get data from the cache or compute (and cache) it.
+
+        Parameters
+        ----------
+
+        srcFile : string
+            Source image file.
+
+        loadFun : callable
+            loadFun() computes the data if not cached.
+
+        params : keyword arguments
+            Preprocessing parameters (see key).
+
+        Returns
+        -------
+
+        data : numpy array
+            Preprocessed image data.
+        """
+        key = self.key(srcFile, **params)
+        data = self.get(key)
+        if data is None:
+            data = self.put(key, loadFun())
+        return data
+
+
+    def evict(self):
+        """Remove least recently used entries until the size limit is met.
+        """
+        if self.maxSize is None:
+            return
+        entries = []
+        for f in os.listdir(self.cacheDir):
+            if not f.endswith(".npy") or f.endswith(".tmp.npy"):
+                continue
+            st = os.stat(os.path.join(self.cacheDir, f))
+            entries.append((st.st_mtime, st.st_size, f))
+        total = sum([e[1] for e in entries])
+        for mtime, size, f in sorted(entries):
+            if total <= self.maxSize:
+                break
+            os.remove(os.path.join(self.cacheDir, f))
+            total -= size
+
+
+    def __fileName(self, key):
+        return os.path.join(self.cacheDir, key + ".npy")
@@ -0,0 +1,230 @@
+"""imstream.py
+
+Image reading and writing, including slab-wise (streamed) reading and writing
+of images that do not fit into memory as a whole.
+"""
+
+
+__license__ = "Apache License, Version 2.0"
+__author__  = "Roland Kwitt, Kitware Inc., 2013"
+__email__   = "E-Mail: roland.kwitt@kitware.com"
+__status__  = "Development"
+
+
+import os
+import sys
+import numpy as np
+import SimpleITK as sitk
+
+
+def imInfo(imgFile):
+    """Read the header (size, spacing, ...) of an image, but not the data.
+
+    Returns
+    -------
+
+    reader : SimpleITK ImageFileReader
+        Reader with the image information (GetSize(), GetSpacing(),
+        GetOrigin(), GetDirection(), ...).
+    """
+    reader = sitk.ImageFileReader()
+    reader.SetFileName(imgFile)
+    reader.ReadImageInformation()
+    return reader
+
+
+def writeImage(data, refImg, outFile):
+    """Write data (as float32) with the geometry of a reference image.
+
+    Parameters
+    ----------
+
+    data : numpy array
+        Image data (numpy axis order, i.e., z first).
+
+    refImg : SimpleITK image or ImageFileReader
+        Reference image (e.g., see imInfo), i.e., spacing, origin and
+        direction of the output.
+
+    outFile : string
+        Output filename.
+    """
+    img = sitk.GetImageFromArray(data.astype('float32'))
+    img.SetSpacing(refImg.GetSpacing())
+    img.SetOrigin(refImg.GetOrigin())
+    img.SetDirection(refImg.GetDirection())
+    sitk.WriteImage(img, outFile)
+
+
+def slabRanges(depth, slabSize):
+    """Split [0, depth) into slabs of (at most) slabSize slices.
+
+    Returns
+    -------
+
+    slabs : list of tuples
+        (begin, end) index pairs (end exclusive).
+    """
+    slabSize = max(1, int(slabSize))
+    return [(z, min(z+slabSize, depth)) for z in range(0, depth, slabSize)]
+
+
+def slabSize(imgSize, budget, bytesPerVoxel):
+    """Number of slices per slab (along the last axis) for a memory budget.
+
+    Parameters
+    ----------
+
+    imgSize : list
+        Image size (as returned by GetSize(), i.e., x first).
+
+    budget : int
+        Memory budget (in bytes).
+
+    bytesPerVoxel : int
+        Memory required per voxel of a slab (e.g., for all accumulators).
+
+    Returns
+    -------
+
+    N : int
+        Slab size (at least 1, at most the image depth).
+    """
+    sliceBytes = int(np.prod(imgSize[:-1])) * bytesPerVoxel
+    return int(min(max(1, budget // sliceBytes), imgSize[-1]))
+
+
+def readSlab(imgFile, slab):
+    """Read a slab (along the last axis) of an image.
+
+    Only the slab is read from disk if the image IO supports streaming
+    (e.g., uncompressed MetaImage or NRRD files); otherwise, the image is
+    read and the slab is extracted.
+
+    Parameters
+    ----------
+
+    imgFile : string
+        Image filename.
+
+    slab : tuple
+        (begin, end) index pair along the last axis (end exclusive).
+
+    Returns
+    -------
+
+    data : numpy array, shape (end-begin, ...)
+        Slab data (numpy axis order, i.e., z first).
+    """
+    reader = imInfo(imgFile)
+    imgSize = list(reader.GetSize())
+    beg, end = slab
+    if beg < 0 or end > imgSize[-1] or end <= beg:
+        raise Exception('slab (%d,%d) is outside the image!' % slab)
+    reader.SetExtractIndex([0]*(len(imgSize)-1) + [beg])
+    reader.SetExtractSize(imgSize[:-1] + [end-beg])
+    return sitk.GetArrayFromImage(reader.Execute())
+
+
+class metaImageWriter:
+    """Incremental writer for (uncompressed, float32) MetaImage files.
+
+    The header is written on construction; the image data is then appended
+    slab by slab (along the last axis, in order), i.e., the image does not
+    need to be in memory as a whole. Outputs with extension .mha contain the
+    header and the data; for .mhd, the data is written to a .raw file next
+    to the header.
+
+    Example
+    -------
+
+        writer = metaImageWriter("/tmp/mean.mhd", imgSize)
+        for slab in slabRanges(imgSize[-1], 16):
+            writer.write(slabData)
+        writer.close()
+    """
+
+    def __init__(self, outFile, imgSize, spacing=None, origin=None,
+                 direction=None):
+        """Initialization.
+
+        Parameters
+        ----------
+
+        outFile : string
+            Output filename (.mha or .mhd).
+
+        imgSize : list
+            Image size (x first, see GetSize()).
+
+        spacing, origin, direction : lists (default : None)
+            Image geometry (see GetSpacing(), ...), e.g., of a reference
+            image. The default is unit spacing, zero origin and identity
+            direction.
+        """
+        ext = os.path.splitext(outFile)[1].lower()
+        if not ext in ('.mha', '.mhd'):
+            raise Exception('%s is not a MetaImage (.mha/.mhd) file!' %
+                            outFile)
+
+        dim = len(imgSize)
+        if spacing is None:
+            spacing = [1.0]*dim
+        if origin is None:
+            origin = [0.0]*dim
+        if direction is None:
+            direction = np.eye(dim).ravel()
+        # MetaImage stores the direction matrix column by column
+        transform = np.asarray(direction, dtype=np.float64).reshape(
+            (dim, dim)).T.ravel()
+
+        if ext == '.mha':
+            dataFile = 'LOCAL'
+        else:
+            dataFile = os.path.splitext(os.path.basename(outFile))[0] + '.raw'
+
+        fmt = lambda v: " ".join(["%.17g" % x for x in v])
+        header = ["ObjectType = Image",
+                  "NDims = %d" % dim,
+                  "BinaryData = True",
+                  "BinaryDataByteOrderMSB = %s" % (sys.byteorder == 'big'),
+                  "CompressedData = False",
+                  "TransformMatrix = %s" % fmt(transform),
+                  "Offset = %s" % fmt(origin),
+                  "CenterOfRotation = %s" % fmt([0]*dim),
+                  "ElementSpacing = %s" % fmt(spacing),
+                  "DimSize = %s" % " ".join(["%d" % x for x in imgSize]),
+                  "ElementType = MET_FLOAT",
+                  "ElementDataFile = %s" % dataFile]
+
+        with open(outFile, 'w') as fid:
+            fid.write("\n".join(header) + "\n")
+        if ext == '.mha':
+            self.fid = open(outFile, 'ab')
+        else:
+            self.fid = open(os.path.join(os.path.dirname(outFile),
+                                         dataFile), 'wb')
+
+        self.sliceShape = tuple(imgSize[:-1][::-1])
+        self.depth = imgSize[-1]
+        self.written = 0
+
+
+    def write(self, data):
+        """Append a slab (numpy array, shape (N, ...), z first)."""
+        data = np.asarray(data, dtype=np.float32)
+        if data.shape[1:] != self.sliceShape:
+            raise Exception('slab shape %s does not match image!' %
+                            str(data.shape))
+        if self.written + data.shape[0] > self.depth:
+            raise Exception('slab is outside the image!')
+        self.fid.write(np.ascontiguousarray(data).tobytes())
+        self.written += data.shape[0]
+
+
+    def close(self):
+        """Close the writer (all slabs must have been written)."""
+        self.fid.close()
+        if self.written != self.depth:
+            raise Exception('incomplete image (%d of %d slices written)!' %
+                            (self.written, self.depth))
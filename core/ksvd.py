@@ -0,0 +1,267 @@
+"""ksvd.py
+
+K-SVD dictionary learning with Batch-OMP sparse coding, see
+
+    M. Aharon, M. Elad and A. Bruckstein, "K-SVD: An Algorithm for Designing
+    Overcomplete Dictionaries for Sparse Representation", IEEE TSP, 2006.
+
+    R. Rubinstein, M. Zibulevsky and M. Elad, "Efficient Implementation of
+    the K-SVD Algorithm using Batch Orthogonal Matching Pursuit", Technical
+    Report CS-2008-08, Technion, 2008.
+"""
+
+
+__license__ = "Apache License, Version 2.0"
+__author__  = "Roland Kwitt, Kitware Inc., 2013"
+__email__   = "E-Mail: roland.kwitt@kitware.com"
+__status__  = "Development"
+
+
+import os
+import numpy as np
+import scipy.sparse as sps
+from scipy.linalg import cho_solve
+from scipy.linalg import solve_triangular
+from multiprocessing.pool import ThreadPool
+
+
+def omp(G, DtX, T, eps=1e-10):
+    """Batch orthogonal matching pursuit.
+
+    Sparse coding of a batch of signals with T non-zero coefficients per
+    signal, using only the precomputed Gram matrix of the dictionary and the
+    projections of the signals onto the dictionary atoms (i.e., the signals
+    themselves are never touched). The dictionary atoms are assumed to have
+    unit norm.
+
+    Parameters
+    ----------
+
+    G : numpy array, shape (D, D)
+        Gram matrix of the dictionary, i.e., Dict^T Dict.
+
+    DtX : numpy array, shape (D, M)
+        Projections of the M signals onto the D atoms, i.e., Dict^T X.
+
+    T : int
+        Sparsity, i.e., max. number of non-zero coefficients per signal.
+
+    eps : float (default : 1e-10)
+        Selection stops early once the selected atoms become (numerically)
+        linearly dependent.
+
+    Returns
+    -------
+
+    Gamma : scipy sparse matrix (CSC), shape (D, M)
+        Sparse representation of the signals.
+    """
+
+    nAtoms, nSig = DtX.shape
+    T = min(T, nAtoms)
+
+    rows, cols, vals = [], [], []
+    for m in range(nSig):
+        alpha0 = DtX[:,m]
+        alpha = alpha0
+        L = np.ones((1,1))
+        I = []
+        for k in range(T):
+            kHat = np.argmax(np.abs(alpha))
+            if k > 0:
+                # update Cholesky factorization of G[I,I]
+                w = solve_triangular(L, G[I,kHat], lower=True)
+                nrm = 1.0 - np.dot(w, w)
+                if nrm <= eps:
+                    break
+                L = np.vstack((np.hstack((L, np.zeros((k,1)))),
+                               np.hstack((w, np.sqrt(nrm)))))
+            I.append(kHat)
+            gI = cho_solve((L, True), alpha0[I])
+            alpha = alpha0 - np.dot(G[:,I], gI)
+        rows.extend(I)
+        cols.extend([m]*len(I))
+        vals.extend(gI)
+    return sps.csc_matrix((vals, (rows, cols)), shape=(nAtoms, nSig))
+
+
+def ksvd(X, D, T, nIter=50, dictInit=None, nJobs=1, exact=False,
+         errTarget=None, msgFun=None):
+    """K-SVD dictionary learning.
+
+    Same parameters as the KSVD MATLAB toolbox (see matlab/dlearn.m), i.e.,
+    the dictionary size D and the sparsity T. Sparse coding uses Batch-OMP.
+    In the dictionary update stage, all atoms are updated w.r.t. the same
+    sparse representation (i.e., in a Jacobi-like manner instead of the
+    sequential Gauss-Seidel sweep of the original algorithm) which allows
+    to distribute the atom updates over nJobs threads.
+
+    Parameters
+    ----------
+
+    X : numpy array, shape (N, M)
+        Data matrix. Signals (e.g., difference images) are columns.
+
+    D : int
+        Dictionary size (i.e., number of atoms).
+
+    T : int
+        Sparsity (i.e., number of non-zero coefficients per signal).
+
+    nIter : int (default : 50)
+        Number of K-SVD iterations.
+
+    dictInit : numpy array, shape (N, D) (default : None)
+        Initial dictionary. If None, the dictionary is initialized with
+        D randomly selected (normalized) signals.
+
+    nJobs : int (default : 1)
+        Number of threads used in the dictionary update stage.
+
+    exact : boolean (default : False)
+        If True, each atom is updated with a rank-1 SVD of its residual
+        matrix. Otherwise, the approximate K-SVD update (a single power
+        iteration) is used - this is also the default of the MATLAB toolbox.
+
+    errTarget : float (default : None)
+        If given, iterations stop once the RMS reconstruction error falls
+        below errTarget.
+
+    msgFun : callable (default : None)
+        Function that takes a string argument for status messages, e.g.,
+        regtools.infoMsg.
+
+    Returns
+    -------
+
+    Dict : numpy array, shape (N, D)
+        Dictionary atoms (as columns).
+
+    Gamma : scipy sparse matrix (CSC), shape (D, M)
+        Sparse representation of the signals.
+    """
+
+    X = np.asarray(X, dtype=np.float64)
+    nDim, nSig = X.shape
+
+    if dictInit is None:
+        sel = np.random.permutation(nSig)[0:D]
+        Dict = X[:,sel].copy()
+        if Dict.shape[1] < D:
+            Dict = np.hstack((Dict, np.random.randn(nDim, D-Dict.shape[1])))
+    else:
+        Dict = np.array(dictInit, dtype=np.float64)
+    Dict = _normalize(Dict)
+
+    pool = None
+    if nJobs > 1:
+        pool = ThreadPool(nJobs)
+
+    for it in range(nIter):
+        # sparse coding stage
+        Gamma = omp(np.dot(Dict.T, Dict), np.dot(Dict.T, X), T)
+        GammaR = Gamma.tocsr()
+
+        # dictionary update stage
+        upd = lambda j: _updateAtom(X, Dict, GammaR, j, exact)
+        if pool is None:
+            res = [upd(j) for j in range(D)]
+        else:
+            res = pool.map(upd, range(D))
+
+        unused = []
+        for j, (atom, coef, omega) in enumerate(res):
+            if atom is None:
+                unused.append(j)
+                continue
+            Dict[:,j] = atom
+            GammaR.data[GammaR.indptr[j]:GammaR.indptr[j+1]] = coef
+        Gamma = GammaR.tocsc()
+
+        E = X - Gamma.T.dot(Dict.T).T
+        err = np.sqrt(np.mean(E**2))
+
+        # replace unused atoms by the worst represented signals
+        if len(unused):
+            worst = np.argsort(np.sum(E**2, axis=0))[::-1]
+            Dict[:,unused] = _normalize(X[:,worst[0:len(unused)]].copy())
+
+        if not msgFun is None:
+            msgFun("K-SVD iteration %d, RMSE=%.6f, %d unused atoms" %
+                   (it+1, err, len(unused)))
+        if not errTarget is None and err <= errTarget:
+            break
+
+    if not pool is None:
+        pool.close()
+    return Dict, Gamma
+
+
+def writeAtoms(Dict, outDir, N=None):
+    """Write dictionary atoms to disk.
+
+    Same output as matlab/dlearn.m, i.e., atom-0001.bin, atom-0002.bin, ...
+    (as float32) plus a file 'list' with all the atom filenames.
+
+    Parameters
+    ----------
+
+    Dict : numpy array, shape (N, D)
+        Dictionary atoms (as columns).
+
+    outDir : string
+        Output directory.
+
+    N : int (default : None)
+        Write the first N atoms only (all atoms if None).
+    """
+
+    if N is None:
+        N = Dict.shape[1]
+    if N > Dict.shape[1]:
+        raise Exception('Oops: N > D')
+
+    with open(os.path.join(outDir, 'list'), 'w') as lstFid:
+        for i in range(N):
+            atomFileName = 'atom-%.4d.bin' % (i+1)
+            with open(os.path.join(outDir, atomFileName), 'wb') as fid:
+                Dict[:,i].astype('float32').tofile(fid)
+            lstFid.write(atomFileName + '\n')
+
+
+def _normalize(Dict):
+    """Normalize columns to unit norm (random atoms for zero columns)."""
+    nrm = np.sqrt(np.sum(Dict**2, axis=0))
+    zero = np.where(nrm < 1e-12)[0]
+    if len(zero):
+        Dict[:,zero] = np.random.randn(Dict.shape[0], len(zero))
+        nrm[zero] = np.sqrt(np.sum(Dict[:,zero]**2, axis=0))
+    return Dict / nrm
+
+
+def _updateAtom(X, Dict, GammaR, j, exact=False):
+    """K-SVD update of a single atom (and its coefficients).
+
+    Returns None for the atom if it is not used by any signal.
+    """
+    beg, end = GammaR.indptr[j], GammaR.indptr[j+1]
+    if beg == end:
+        return None, None, None
+
+    omega = GammaR.indices[beg:end]
+    g = GammaR.data[beg:end]
+
+    # residual (without the contribution of atom j) on the support of j
+    E = (X[:,omega] - GammaR[:,omega].T.dot(Dict.T).T +
+         np.outer(Dict[:,j], g))
+
+    if exact:
+        U, s, Vt = np.linalg.svd(E, full_matrices=False)
+        return U[:,0], s[0]*Vt[0,:], omega
+
+    d = np.dot(E, g)
+    nrm = np.linalg.norm(d)
+    if nrm < 1e-12:
+        return None, None, None
+    d /= nrm
+    return d, np.dot(E.T, d), omega
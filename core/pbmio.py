@@ -0,0 +1,191 @@
+"""pbmio.py
+
+Self-describing array files for PBM data (images, difference images, atoms).
+
+An array file consists of a .npy file, with one item (e.g., an image or an
+atom) per row, i.e., shape (count, ...) in C order, and a JSON sidecar file
+(same name, extension .json) that describes the content, e.g.,
+
+    {
+        "layout"    : "item-major",
+        "items"     : "atoms",
+        "count"     : 5,
+        "itemShape" : [64, 256, 256],
+        "dtype"     : "float32",
+        "geometry"  : {"size" : [256, 256, 64], "spacing" : [...], ...},
+        ...
+    }
+
+Additional entries (e.g., group labels, neighbor indices, atom ranking) can
+be stored in the sidecar as well. Since every item is contiguous on disk,
+a single item can be read through a memory map without touching the rest
+of the file.
+"""
+
+
+__license__ = "Apache License, Version 2.0"
+__author__  = "Roland Kwitt, Kitware Inc., 2013"
+__email__   = "E-Mail: roland.kwitt@kitware.com"
+__status__  = "Development"
+
+
+import os
+import json
+import numpy as np
+
+
+def arrayFiles(fileName):
+    """Names of the .npy and the sidecar file for a given filename (the
+    .npy file, the sidecar file or the name without extension).
+    """
+    base, ext = os.path.splitext(fileName)
+    if not ext in (".npy", ".json"):
+        base = fileName
+    return base + ".npy", base + ".json"
+
+
+def isArrayFile(fileName):
+    """Check if a file is an array file (i.e., has a sidecar).
+    """
+    npyFile, jsonFile = arrayFiles(fileName)
+    return os.path.exists(npyFile) and os.path.exists(jsonFile)
+
+
+def createArray(fileName, count, itemShape, items, dtype=np.float32, **meta):
+    """Create an (empty) array file for writing.
+
+    Parameters
+    ----------
+
+    fileName : string
+        Output filename (the extension .npy is added if missing).
+
+    count : int
+        Number of items.
+
+    itemShape : tuple
+        Shape of a single item (e.g., image shape in numpy order).
+
+    items : string
+        Description of the items, e.g., 'images', 'differences', 'atoms'.
+
+    dtype : numpy dtype (default : np.float32)
+        Data type.
+
+    meta : keyword arguments
+        Additional (JSON serializable) information for the sidecar, e.g.,
+        geometry=..., groups=..., neighbors=...
+
+    Returns
+    -------
+
+    data : numpy memmap, shape (count,) + itemShape
+        Writable memory map of the array.
+    """
+
+    npyFile, jsonFile = arrayFiles(fileName)
+    shape = (int(count),) + tuple([int(x) for x in itemShape])
+    data = np.lib.format.open_memmap(npyFile, mode='w+', dtype=dtype,
+                                     shape=shape)
+
+    info = dict(meta)
+    info.update({"layout" : "item-major",
+                 "items" : items,
+                 "count" : shape[0],
+                 "itemShape" : list(shape[1:]),
+                 "dtype" : np.dtype(dtype).name})
+    with open(jsonFile, 'w') as fid:
+        json.dump(_toJSON(info), fid, indent=2)
+    return data
+
+
+def writeArray(fileName, data, items, itemShape=None, **meta):
+    """Write an array file.
+
+    Parameters
+    ----------
+
+    fileName : string
+        Output filename (the extension .npy is added if missing).
+
+    data : numpy array, shape (count, ...)
+        Data, one item per row.
+
+    items : string
+        Description of the items (see createArray).
+
+    itemShape : tuple (default : None)
+        Shape of a single item (data.shape[1:] if None). Rows of data are
+        reshaped accordingly.
+
+    meta : keyword arguments
+        Additional information for the sidecar (see createArray).
+    """
+
+    data = np.asarray(data)
+    if itemShape is None:
+        itemShape = data.shape[1:]
+    out = createArray(fileName, data.shape[0], itemShape, items,
+                      np.float32, **meta)
+    out[:] = data.reshape(out.shape)
+    out.flush()
+    del out
+
+
+def readArray(fileName, mode='r'):
+    """Open an array file.
+
+    Parameters
+    ----------
+
+    fileName : string
+        Filename of the .npy or the sidecar file.
+
+    mode : string (default : 'r')
+        Memory map mode ('r' or 'r+').
+
+    Returns
+    -------
+
+    data : numpy memmap, shape (count,) + itemShape
+        Memory map of the array data.
+
+    meta : dict
+        Sidecar information.
+    """
+
+    npyFile, jsonFile = arrayFiles(fileName)
+    with open(jsonFile) as fid:
+        meta = json.load(fid)
+    data = np.load(npyFile, mmap_mode=mode)
+    return data, meta
+
+
+def readItem(fileName, i):
+    """Read a single item of an array file.
+
+    Returns
+    -------
+
+    item : numpy array, shape itemShape
+        The i-th item (only this item is read from disk).
+
+    meta : dict
+        Sidecar information.
+    """
+
+    data, meta = readArray(fileName)
+    return np.array(data[i]), meta
+
+
+def _toJSON(obj):
+    """Convert numpy types (recursively) to JSON serializable types."""
+    if isinstance(obj, dict):
+        return dict([(k, _toJSON(v)) for k, v in obj.items()])
+    if isinstance(obj, (list, tuple)):
+        return [_toJSON(x) for x in obj]
+    if isinstance(obj, np.ndarray):
+        return _toJSON(obj.tolist())
+    if isinstance(obj, np.generic):
+        return obj.item()
+    return obj
@@ -0,0 +1,587 @@
+"""pbmlearn.py
+"""
+
+
+__license__ = "Apache License, Version 2.0"
+__author__  = "Roland Kwitt, Kitware Inc., 2013"
+__email__   = "E-Mail: roland.kwitt@kitware.com"
+__status__  = "Development"
+
+
+import os
+import pickle
+import numpy as np
+import multiprocessing as mp
+import scipy.sparse as sps
+from core import pbmutils
+from sklearn.decomposition import PCA
+from sklearn.decomposition import MiniBatchDictionaryLearning
+from sklearn.decomposition import sparse_encode
+
+
+def streamLearn(lrnObj, batchFun, nPasses=1, chkFile=None, msgFun=None):
+    """Out-of-core dictionary learning.
+
+    Feeds batches of difference images into the learner's partial_fit method
+    (e.g., sklearn's MiniBatchDictionaryLearning) for a given number of passes
+    over the data. After each pass, the learner is checkpointed (pickled) so
+    that an interrupted run can be resumed.
+
+    Parameters
+    ----------
+
+    lrnObj : learner object
+        Dictionary learner that implements partial_fit.
+
+    batchFun : callable
+        Calling batchFun() returns an iterable of batches (numpy arrays of
+        shape (B, N), one difference image per row) for one pass over the
+        data, e.g., a generator from pbmutils.groupDiffBatches.
+
+    nPasses : int (default : 1)
+        Number of passes over the data.
+
+    chkFile : string (default : None)
+        Checkpoint file. If the file exists, learning resumes with the learner
+        and pass counter stored in that file.
+
+    msgFun : callable (default : None)
+        Function that takes a string argument for status messages, e.g.,
+        regtools.infoMsg.
+
+    Returns
+    -------
+
+    lrnObj : learner object
+        The learner after nPasses passes over the data.
+    """
+
+    passCnt = 0
+    if not chkFile is None and os.path.exists(chkFile):
+        with open(chkFile, 'rb') as fid:
+            chkData = pickle.load(fid)
+        lrnObj = chkData["learner"]
+        passCnt = chkData["passes"]
+        if not msgFun is None:
+            msgFun("Resuming from %s after pass %d" % (chkFile, passCnt))
+
+    while passCnt < nPasses:
+        cnt = -1
+        for cnt, batch in enumerate(batchFun()):
+            lrnObj.partial_fit(batch)
+        passCnt += 1
+
+        if not msgFun is None:
+            msgFun("Done with pass %d (%d batches)!" % (passCnt, cnt+1))
+
+        # write checkpoint (first to a temp. file, so we never end up
+        # with a broken checkpoint)
+        if not chkFile is None:
+            tmpFile = chkFile + ".tmp"
+            with open(tmpFile, 'wb') as fid:
+                pickle.dump({"learner" : lrnObj, "passes" : passCnt}, fid,
+                            pickle.HIGHEST_PROTOCOL)
+            os.rename(tmpFile, chkFile)
+    return lrnObj
+
+
+def pcaReduce(X, nComp):
+    """Randomized PCA projection of the observations.
+
+    Parameters
+    ----------
+
+    X : numpy matrix, shape (N, S)
+        Input data matrix. Observations (e.g., images) are columns.
+
+    nComp : int
+        Number of principal components (at most S).
+
+    Returns
+    -------
+
+    Y : numpy array, shape (nComp, S)
+        Projections of the (centered) observations onto the principal
+        components. Differences between columns of Y are the projections
+        of the differences between the original observations.
+
+    basis : numpy array, shape (N, nComp)
+        Principal components as columns, i.e., np.dot(basis, Y[:,i]) maps
+        a (difference) vector back to the original space.
+
+    expVar : float
+        Fraction of the variance explained by the principal components.
+    """
+
+    X = np.asarray(X, dtype=np.float32).T
+    pca = PCA(n_components=min(nComp, X.shape[0]), svd_solver='randomized')
+    Y = pca.fit_transform(X)
+    return Y.T, pca.components_.T, np.sum(pca.explained_variance_ratio_)
+
+
+def sweepLearn(D, K, Ks, Ds, nJobs=1, seed=0):
+    """Dictionary learning for multiple neighborhood and dictionary sizes.
+
+    The difference matrix is computed once (for the largest number of
+    neighbors) and the difference images for smaller neighborhoods are
+    obtained by selecting the corresponding columns. All (K, D) combinations
+    are learned in a pool of worker processes.
+
+    Parameters
+    ----------
+
+    D : numpy array, shape (N, n1*K)
+        Difference matrix as returned by pbmutils.groupDiff with K
+        neighbors, i.e., column i*K+j holds the difference between the i-th
+        observation in group 1 and its j-th closest neighbor in group 2.
+
+    K : int
+        Number of neighbors used to build D.
+
+    Ks : list of int
+        Numbers of neighbors (each <= K).
+
+    Ds : list of int
+        Dictionary sizes.
+
+    nJobs : int (default : 1)
+        Number of worker processes.
+
+    seed : int (default : 0)
+        Seed for the dictionary learning (same for all combinations).
+
+    Returns
+    -------
+
+    atoms : dict
+        atoms[(k,d)] is a numpy array of shape (d, N) that contains the atoms
+        (as rows) learned with k neighbors and dictionary size d.
+    """
+
+    if max(Ks) > K:
+        raise Exception('number of neighbors in sweep > K!')
+
+    data = {"diff" : D, "K" : K, "seed" : seed}
+    jobs = [(k, d) for k in Ks for d in Ds]
+    if nJobs > 1:
+        pool = mp.Pool(nJobs, _initShared, (data,))
+        res = pool.map(_sweepJob, jobs)
+        pool.close()
+        pool.join()
+    else:
+        _initShared(data)
+        res = [_sweepJob(job) for job in jobs]
+        _shared.clear()
+    return dict(zip(jobs, res))
+
+
+def permTest(X, labels, K, atoms, nPerm, dist=None, nJobs=1, batchSiz=256,
+             seed=0):
+    """Label permutation test for learned atoms.
+
+    For the true and for nPerm randomly permuted group labels, the nearest
+    neighbors are searched, the difference images are built and encoded
+    w.r.t. the given (fixed) atoms, e.g., the atoms learned on the true
+    labels. The test statistic of each atom is its coefficient energy (see
+    rankAtoms), i.e., observed and null statistics refer to the same atoms.
+    The distance matrix is computed only once and shared by all
+    permutations, which are run in a pool of worker processes.
+
+    Parameters
+    ----------
+
+    X : numpy matrix, shape (N, S)
+        Input data matrix. Observations are columns.
+
+    labels : list
+        List of S numeric (binary) labels.
+
+    K : int
+        Number of nearest neighbors.
+
+    atoms : numpy array, shape (D, N)
+        Dictionary atoms as rows (see sparseCodes).
+
+    nPerm : int
+        Number of permutations.
+
+    dist : numpy array, shape (S, S) (default : None)
+        Precomputed distance matrix (Euclidean distances if None).
+
+    nJobs : int (default : 1)
+        Number of worker processes.
+
+    batchSiz : int (default : 256)
+        Number of difference images per batch.
+
+    seed : int (default : 0)
+        Seed for the label permutations, i.e., the same seed gives the same
+        null distribution and p-values.
+
+    Returns
+    -------
+
+    obs : numpy array, shape (D,)
+        Observed statistic of each atom (same order as atoms).
+
+    null : numpy array, shape (nPerm, D)
+        Null distribution of each atom.
+
+    pval : numpy array, shape (D,)
+        Permutation p-values.
+    """
+
+    if dist is None:
+        dist = pbmutils.distMatrix(X)
+
+    data = {"X" : X, "labels" : np.asarray(labels), "dist" : dist,
+            "K" : K, "atoms" : atoms, "batchSiz" : batchSiz, "seed" : seed}
+    jobs = range(-1, nPerm)
+    if nJobs > 1:
+        pool = mp.Pool(nJobs, _initShared, (data,))
+        res = pool.map(_permJob, jobs)
+        pool.close()
+        pool.join()
+    else:
+        _initShared(data)
+        res = [_permJob(job) for job in jobs]
+        _shared.clear()
+
+    obs = res[0]
+    null = np.asarray(res[1:]).reshape((nPerm, len(obs)))
+    pval = (1.0 + np.sum(null >= obs, axis=0)) / (nPerm + 1.0)
+    return obs, null, pval
+
+
+def slabLearn(V, slabs, labels, K, D, mask=None, nJobs=1, seed=0):
+    """Slab-wise dictionary learning.
+
+    For each slab, the nearest neighbors are searched and a dictionary is
+    learned on the difference images of that slab only. Slabs are processed
+    in a pool of worker processes and the per-slab atoms are assembled into
+    volumes.
+
+    Parameters
+    ----------
+
+    V : numpy array, shape (S, Z, Y, X)
+        Stack of S volumes.
+
+    slabs : list of tuples
+        (begin, end) index pairs along the Z axis (see pbmutils.parseSlabs).
+
+    labels : list
+        List of S numeric (binary) labels.
+
+    K : int
+        Number of nearest neighbors.
+
+    D : int
+        Dictionary size.
+
+    mask : numpy array, shape (Z, Y, X) (default : None)
+        Only voxels within the mask (non-zero) are used.
+
+    nJobs : int (default : 1)
+        Number of worker processes.
+
+    seed : int (default : 0)
+        Seed for the dictionary learning (same for all slabs).
+
+    Returns
+    -------
+
+    atoms : numpy array, shape (D, Z, Y, X)
+        Atom volumes (zero outside the slabs). Atoms of different slabs are
+        learned independently, i.e., the k-th atom of one slab does not
+        correspond to the k-th atom of another slab.
+    """
+
+    data = {"V" : V, "labels" : labels, "K" : K, "D" : D, "mask" : mask,
+            "seed" : seed}
+    if nJobs > 1:
+        pool = mp.Pool(nJobs, _initShared, (data,))
+        res = pool.map(_slabJob, slabs)
+        pool.close()
+        pool.join()
+    else:
+        _initShared(data)
+        res = [_slabJob(slab) for slab in slabs]
+        _shared.clear()
+
+    atoms = np.zeros((D,) + V.shape[1:], dtype=np.float32)
+    for (beg, end), slabAtoms in zip(slabs, res):
+        atoms[:,beg:end] = slabAtoms.reshape((D, end-beg) + V.shape[2:])
+    return atoms
+
+
+def pairLearn(X, labels, K, D, dist=None, pairs=None, nJobs=1, seed=0):
+    """Multi-group dictionary learning.
+
+    The (subject x subject) distance matrix is computed once for the whole
+    cohort. For each ordered pair (a, b) of groups, the observations of
+    group a are subtracted from their K nearest neighbors in group b (see
+    pbmutils.pairNeighbors) and a dictionary is learned on these difference
+    images. Pairs are processed in a pool of worker processes.
+
+    Parameters
+    ----------
+
+    X : numpy matrix, shape (N, S)
+        Input data matrix. Observations are columns.
+
+    labels : list
+        List of S numeric labels (any number of groups).
+
+    K : int
+        Number of nearest neighbors.
+
+    D : int
+        Dictionary size.
+
+    dist : numpy array, shape (S, S) (default : None)
+        Precomputed distance matrix (Euclidean distances if None).
+
+    pairs : list of tuples (default : None)
+        (a, b) label pairs (all ordered pairs if None, see
+        pbmutils.groupPairs).
+
+    nJobs : int (default : 1)
+        Number of worker processes.
+
+    seed : int (default : 0)
+        Seed for the dictionary learning (same for all pairs).
+
+    Returns
+    -------
+
+    atoms : dict
+        atoms[(a, b)] holds the dictionary atoms (numpy array, shape (D, N))
+        of the pair (a, b).
+
+    neighbors : dict
+        neighbors[(a, b)] holds the (S, Z) neighbor indices of the pair
+        (a, b), see pbmutils.pairNeighbors.
+    """
+
+    if dist is None:
+        dist = pbmutils.distMatrix(X)
+    if pairs is None:
+        pairs = pbmutils.groupPairs(labels)
+
+    neighbors = dict()
+    for a, b in pairs:
+        neighbors[(a, b)] = pbmutils.pairNeighbors(dist, labels, a, b, K)
+
+    data = {"X" : X, "D" : D, "seed" : seed}
+    jobs = [neighbors[p] for p in pairs]
+    if nJobs > 1:
+        pool = mp.Pool(nJobs, _initShared, (data,))
+        res = pool.map(_pairJob, jobs)
+        pool.close()
+        pool.join()
+    else:
+        _initShared(data)
+        res = [_pairJob(job) for job in jobs]
+        _shared.clear()
+    return dict(zip(pairs, res)), neighbors
+
+
+def rankAtoms(Gamma):
+    """Rank dictionary atoms by dominance.
+
+    Atoms are ranked by the norm of their coefficient rows (same as in
+    matlab/klearn.m), i.e., the most dominant atom comes first.
+
+    Parameters
+    ----------
+
+    Gamma : numpy array or scipy sparse matrix, shape (D, M)
+        Sparse representation of M signals w.r.t. D atoms.
+
+    Returns
+    -------
+
+    rank : numpy array, shape (D,)
+        Atom indices, sorted by decreasing coefficient energy.
+
+    energy : numpy array, shape (D,)
+        Norm of the coefficient row of each atom (unsorted).
+    """
+
+    if sps.issparse(Gamma):
+        energy = np.sqrt(np.asarray(Gamma.multiply(Gamma).sum(axis=1)).ravel())
+    else:
+        energy = np.sqrt(np.sum(np.asarray(Gamma)**2, axis=1))
+    return np.argsort(energy)[::-1], energy
+
+
+def sparseCodes(batches, atoms, alpha=1, nJobs=1):
+    """Sparse codes for batches of signals.
+
+    The batches are encoded (using sparse_encode with the LARS-Lasso
+    algorithm, i.e., the same objective as in the dictionary learning
+    stage) in nJobs worker processes and the codes are collected in a
+    sparse matrix.
+
+    Parameters
+    ----------
+
+    batches : iterable
+        Batches of signals, i.e., numpy arrays of shape (B, N) with one
+        signal (e.g., difference image) per row.
+
+    atoms : numpy array, shape (D, N)
+        Dictionary atoms as rows (e.g., components_ of a sklearn learner).
+
+    alpha : float (default : 1)
+        Sparsity controlling parameter.
+
+    nJobs : int (default : 1)
+        Number of worker processes.
+
+    Returns
+    -------
+
+    Gamma : scipy sparse matrix (CSR), shape (D, M)
+        Sparse representation of all M signals.
+    """
+
+    tasks = ((batch, atoms, alpha) for batch in batches)
+    if nJobs > 1:
+        pool = mp.Pool(nJobs)
+        codes = list(pool.imap(_encodeBatch, tasks))
+        pool.close()
+        pool.join()
+    else:
+        codes = [_encodeBatch(t) for t in tasks]
+    return sps.vstack(codes).T.tocsr()
+
+
+def writeBundle(outFile, atoms, Gamma, rank=None, energy=None):
+    """Write atoms, atom ranking and sparse codes to a single file.
+
+    Parameters
+    ----------
+
+    outFile : string
+        Output file (numpy .npz format).
+
+    atoms : numpy array, shape (D, N)
+        Dictionary atoms as rows (in the original order).
+
+    Gamma : scipy sparse matrix, shape (D, M)
+        Sparse codes (see sparseCodes).
+
+    rank, energy : numpy arrays (default : None)
+        Output of rankAtoms (computed if not given).
+
+    The file contains the arrays 'atoms' (D, N) sorted by dominance, 'rank'
+    and 'energy' (as returned by rankAtoms, i.e., w.r.t. the original atom
+    order) and the CSR representation of the codes, sorted by dominance, as
+    'codes_data', 'codes_indices', 'codes_indptr' and 'codes_shape'.
+    """
+
+    if rank is None:
+        rank, energy = rankAtoms(Gamma)
+    codes = sps.csr_matrix(Gamma)[rank,:]
+    np.savez(outFile,
+             atoms=np.asarray(atoms, dtype=np.float32)[rank,:],
+             rank=rank,
+             energy=energy,
+             codes_data=codes.data.astype(np.float32),
+             codes_indices=codes.indices,
+             codes_indptr=codes.indptr,
+             codes_shape=np.asarray(codes.shape))
+
+
+def readBundle(inFile):
+    """Read a file written by writeBundle.
+
+    Returns
+    -------
+
+    atoms : numpy array, shape (D, N)
+        Atoms as rows, sorted by dominance.
+
+    rank, energy : numpy arrays, shape (D,)
+        see rankAtoms.
+
+    Gamma : scipy sparse matrix (CSR), shape (D, M)
+        Sparse codes, rows sorted by dominance.
+    """
+
+    dat = np.load(inFile)
+    Gamma = sps.csr_matrix((dat["codes_data"],
+                            dat["codes_indices"],
+                            dat["codes_indptr"]),
+                           shape=tuple(dat["codes_shape"]))
+    return dat["atoms"], dat["rank"], dat["energy"], Gamma
+
+
+def _encodeBatch(task):
+    """Encode a single batch (worker function of sparseCodes)."""
+    batch, atoms, alpha = task
+    return sps.csr_matrix(sparse_encode(np.asarray(batch),
+                                        atoms,
+                                        algorithm='lasso_lars',
+                                        alpha=alpha))
+
+
+# data shared with the worker processes (see _initShared)
+_shared = dict()
+
+
+def _initShared(data):
+    """Make (large) data available to the worker processes."""
+    _shared.update(data)
+
+
+def _sweepJob(job):
+    """Learn a dictionary for one (K, D) combination (see sweepLearn)."""
+    k, d = job
+    D, K = _shared["diff"], _shared["K"]
+    sel = (np.arange(D.shape[1]) % K) < k
+    lrnObj = MiniBatchDictionaryLearning(d, alpha=1,
+                                         random_state=_shared["seed"])
+    return lrnObj.fit(np.asarray(D[:,sel]).T).components_
+
+
+def _permJob(job):
+    """Run one permutation (job = -1 for the true labels), see permTest."""
+    labels = _shared["labels"]
+    if job >= 0:
+        labels = np.random.RandomState(_shared["seed"]+job).permutation(labels)
+
+    X, K = _shared["X"], _shared["K"]
+    S, Z = pbmutils.groupNeighbors(X, labels, K, _shared["dist"])
+    batches = pbmutils.groupDiffBatches(X, S, Z, _shared["batchSiz"])
+    _, energy = rankAtoms(sparseCodes(batches, _shared["atoms"]))
+    return energy
+
+
+def _slabJob(slab):
+    """Learn a dictionary for one slab (see slabLearn)."""
+    X = pbmutils.slabView(_shared["V"], slab)
+    numVox = X.shape[1]
+    idx = None
+    if not _shared["mask"] is None:
+        idx = pbmutils.maskIndex(_shared["mask"][slab[0]:slab[1]])
+        X = X[:,idx]
+
+    diffIm = pbmutils.groupDiff(X.T, _shared["labels"], _shared["K"])
+    lrnObj = MiniBatchDictionaryLearning(_shared["D"], alpha=1,
+                                         random_state=_shared["seed"])
+    atoms = lrnObj.fit(np.asarray(diffIm).T).components_
+    if not idx is None:
+        atoms = pbmutils.scatter(atoms.T, idx, numVox).T
+    return atoms
+
+
+def _pairJob(job):
+    """Learn a dictionary for one pair of groups (see pairLearn)."""
+    S, Z = job
+    diffIm = np.vstack(list(pbmutils.groupDiffBatches(_shared["X"], S, Z)))
+    lrnObj = MiniBatchDictionaryLearning(_shared["D"], alpha=1,
+                                         random_state=_shared["seed"])
+    return lrnObj.fit(diffIm).components_
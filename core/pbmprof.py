@@ -0,0 +1,171 @@
+"""pbmprof.py
+
+Stage-level profiling of the PBM pipeline.
+"""
+
+
+__license__ = "Apache License, Version 2.0"
+__author__  = "Roland Kwitt, Kitware Inc., 2013"
+__email__   = "E-Mail: roland.kwitt@kitware.com"
+__status__  = "Development"
+
+
+import os
+import sys
+import json
+import time
+import resource
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+
+class profiler:
+    """Profiler for sequential pipeline stages.
+
+    A stage starts with begin(name) and ends with the next call to begin (or
+    end). For each stage, the wall time, CPU time (incl. terminated child
+    processes, e.g., of a worker pool), the peak RSS so far and the number of
+    bytes read from and written to storage (Linux only, this process only)
+    are recorded. Optionally, the peak memory traced by tracemalloc is
+    recorded as well, and single calls (e.g., the dictionary learning) can
+    be run under cProfile.
+
+    Example
+    -------
+
+        prof = profiler("/tmp/report.json")
+        prof.begin("load")
+        ...
+        prof.begin("learning")
+        res = prof.call(lrnObj.fit, X)
+        prof.write()
+    """
+
+    def __init__(self, outFile=None, cprofFile=None, traceMem=False):
+        """Initialization.
+
+        Parameters
+        ----------
+
+        outFile : string (default : None)
+            JSON report file (see write).
+
+        cprofFile : string (default : None)
+            If given, calls run via call() are profiled with cProfile and
+            the statistics are written to cprofFile (see pstats).
+
+        traceMem : boolean (default : False)
+            Record the peak memory allocated (per stage) using tracemalloc.
+        """
+        self.outFile = outFile
+        self.cprofFile = cprofFile
+        self.traceMem = traceMem and not tracemalloc is None
+        self.stages = []
+        self.__start = time.time()
+        self.__stage = None
+
+
+    def begin(self, name):
+        """End the current stage (if any) and begin a new one.
+        """
+        self.end()
+        if self.traceMem:
+            tracemalloc.start()
+        self.__stage = (name, time.time(), _cpuTime(), _ioBytes())
+
+
+    def end(self):
+        """End the current stage (if any).
+
+        Returns
+        -------
+
+        stage : dict
+            Statistics of the stage (None if no stage was active).
+        """
+        if self.__stage is None:
+            return None
+        name, wall, cpu, io = self.__stage
+        self.__stage = None
+
+        stage = {"stage" : name,
+                 "wall" : time.time() - wall,
+                 "cpu" : _cpuTime() - cpu,
+                 "peakRSS" : _peakRSS()}
+        ioNow = _ioBytes()
+        if not io is None and not ioNow is None:
+            stage["readBytes"] = ioNow[0] - io[0]
+            stage["writeBytes"] = ioNow[1] - io[1]
+        if self.traceMem:
+            stage["peakTraced"] = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        self.stages.append(stage)
+        return stage
+
+
+    def call(self, fun, *args, **kwargs):
+        """Call fun(*args, **kwargs), under cProfile if requested.
+        """
+        if self.cprofFile is None:
+            return fun(*args, **kwargs)
+
+        import cProfile
+        prof = cProfile.Profile()
+        try:
+            return prof.runcall(fun, *args, **kwargs)
+        finally:
+            prof.dump_stats(self.cprofFile)
+
+
+    def report(self):
+        """Profiling report (ends the current stage).
+
+        Returns
+        -------
+
+        report : dict
+            Command line, total wall time, peak RSS and the list of stages.
+        """
+        self.end()
+        return {"argv" : sys.argv,
+                "wall" : time.time() - self.__start,
+                "peakRSS" : _peakRSS(),
+                "cprofile" : self.cprofFile,
+                "stages" : self.stages}
+
+
+    def write(self):
+        """Write the report (as JSON) to the output file (if any).
+        """
+        if self.outFile is None:
+            return
+        with open(self.outFile, 'w') as fid:
+            json.dump(self.report(), fid, indent=2)
+
+
+def _cpuTime():
+    """User + system time of this process and its terminated children."""
+    t = os.times()
+    return t[0] + t[1] + t[2] + t[3]
+
+
+def _peakRSS():
+    """Peak RSS (in bytes) of this process or any of its children."""
+    rss = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+              resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    if sys.platform == "darwin":
+        return rss
+    return rss*1024
+
+
+def _ioBytes():
+    """Bytes read from/written to storage (None if not available)."""
+    try:
+        with open("/proc/self/io") as fid:
+            io = dict([l.split(':') for l in fid if ':' in l])
+        return int(io["read_bytes"]), int(io["write_bytes"])
+    except (IOError, KeyError, ValueError):
+        return None
@@ -0,0 +1,129 @@
+"""pbmstats.py
+
+Running (voxel-wise) statistics of image collections.
+"""
+
+
+__license__ = "Apache License, Version 2.0"
+__author__  = "Roland Kwitt, Kitware Inc., 2013"
+__email__   = "E-Mail: roland.kwitt@kitware.com"
+__status__  = "Development"
+
+
+import numpy as np
+
+
+class runstats:
+    """Running mean and variance (Welford's algorithm).
+
+    Observations (e.g., images) are added one at a time with update; the
+    accumulators are float64. Two accumulators (e.g., of different worker
+    processes) can be combined with merge (Chan et al.'s parallel update).
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.avg = None
+        self.M2 = None
+
+
+    def update(self, x):
+        """Add an observation.
+
+        Parameters
+        ----------
+
+        x : numpy array
+            Observation; all observations must have the same shape.
+        """
+        x = np.array(x, dtype=np.float64)
+        if self.avg is None:
+            self.avg = np.zeros(x.shape)
+            self.M2 = np.zeros(x.shape)
+        elif x.shape != self.avg.shape:
+            raise Exception('shape mismatch: %s != %s!' %
+                            (str(x.shape), str(self.avg.shape)))
+        self.count += 1
+        delta = x - self.avg
+        self.avg += delta / self.count
+        # M2 += delta * (x - avg), with the updated avg
+        x -= self.avg
+        x *= delta
+        self.M2 += x
+
+
+    def merge(self, other):
+        """Merge another accumulator into this one.
+
+        Returns
+        -------
+
+        self : runstats
+            The merged accumulator.
+        """
+        if other.count == 0:
+            return self
+        if self.count == 0:
+            self.count = other.count
+            self.avg = other.avg.copy()
+            self.M2 = other.M2.copy()
+            return self
+        if other.avg.shape != self.avg.shape:
+            raise Exception('shape mismatch: %s != %s!' %
+                            (str(other.avg.shape), str(self.avg.shape)))
+
+        n = self.count + other.count
+        delta = other.avg - self.avg
+        self.M2 += other.M2 + delta**2 * (float(self.count)*other.count/n)
+        self.avg += delta * (float(other.count)/n)
+        self.count = n
+        return self
+
+
+    def mean(self):
+        """Mean of all observations."""
+        return self.avg
+
+
+    def variance(self, ddof=0):
+        """Variance of all observations.
+
+        Parameters
+        ----------
+
+        ddof : int (default : 0)
+            Delta degrees of freedom, i.e., the divisor is count - ddof
+            (use ddof=1 for the unbiased sample variance).
+        """
+        if self.count - ddof <= 0:
+            raise Exception('not enough observations!')
+        return self.M2 / (self.count - ddof)
+
+
+    def std(self, ddof=0):
+        """Standard deviation of all observations (see variance)."""
+        return np.sqrt(self.variance(ddof))
+
+
+def mergeAll(statsList):
+    """Merge a list of accumulators (pairwise, in a tree reduction).
+
+    The accumulators in the list are not modified.
+
+    Returns
+    -------
+
+    stats : runstats
+        Accumulator over all observations (an empty one if the list is
+        empty).
+    """
+    statsList = list(statsList)
+    if not len(statsList):
+        return runstats()
+    while len(statsList) > 1:
+        merged = [runstats().merge(a).merge(b)
+                  for a, b in zip(statsList[0::2], statsList[1::2])]
+        if len(statsList) % 2:
+            merged.append(statsList[-1])
+        statsList = merged
+    return statsList[0]
@@ -8,12 +8,14 @@ __email__   = "E-Mail: roland.kwitt@kitware.com"
 __status__  = "Development"
 
 
+import os
 import numpy as np
 import SimpleITK as sitk
 from scipy.spatial.distance import cdist
+from core import pbmio
 
 
-def imResize(im, alpha=None):
+def imResize(im, alpha=None, interp=None):
     """Image scaling.
 
     Parameters
@@ -25,6 +27,10 @@ def imResize(im, alpha=None):
     alpha : float
         Scaling factor to use.
 
+    interp : SimpleITK interpolator (default : None)
+        Interpolator to use, e.g., sitk.sitkNearestNeighbor for label
+        images (ResampleImageFilter's default if None).
+
     Returns
     -------
 
@@ -34,24 +40,287 @@ def imResize(im, alpha=None):
     if alpha is None:
         return im
 
-    # input size and spacing
-    imSize = list(im.GetSize())
-    imSpac = list(im.GetSpacing())
-
-    # compute output size and spacing
-    outSize = np.asarray(imSize)*alpha
-    outSpac = np.asarray(imSpac)*np.asarray(imSize)/outSize
-
-    sitkArgSize = map(int, list(outSize))
-    sitkArgSpac = map(float, list(outSpac))
+    sitkArgSize, sitkArgSpac = _resizeGeometry(im.GetSize(),
+                                               im.GetSpacing(), alpha)
 
     resampler = sitk.ResampleImageFilter()
     resampler.SetSize(sitkArgSize)
     resampler.SetOutputSpacing(sitkArgSpac)
+    resampler.SetOutputOrigin(im.GetOrigin())
+    resampler.SetOutputDirection(im.GetDirection())
+    if not interp is None:
+        resampler.SetInterpolator(interp)
     return resampler.Execute(im)
 
 
-def groupDiff(X, labels, K=3):
+def _resizeGeometry(imSize, imSpac, alpha):
+    """Output size and spacing of imResize."""
+    outSize = np.asarray(imSize)*alpha
+    outSpac = np.asarray(imSpac)*np.asarray(imSize)/outSize
+    return [int(x) for x in outSize], [float(x) for x in outSpac]
+
+
+def imGeometry(imFile, alpha=None):
+    """Image geometry (without reading the image data).
+
+    Parameters
+    ----------
+
+    imFile : string
+        Image file.
+
+    alpha : float (default : None)
+        Scaling factor (see imResize).
+
+    Returns
+    -------
+
+    geometry : dict
+        Size, spacing, origin and direction of the (scaled) image.
+    """
+    reader = sitk.ImageFileReader()
+    reader.SetFileName(imFile)
+    reader.ReadImageInformation()
+
+    imSize, imSpac = list(reader.GetSize()), list(reader.GetSpacing())
+    if not alpha is None:
+        imSize, imSpac = _resizeGeometry(imSize, imSpac, alpha)
+    return {"size" : imSize,
+            "spacing" : imSpac,
+            "origin" : list(reader.GetOrigin()),
+            "direction" : list(reader.GetDirection())}
+
+
+def imLoad(imFile, alpha=None, selector=None, interp=None):
+    """Read, rescale and (optionally) slice an image.
+
+    Parameters
+    ----------
+
+    imFile : string
+        Image filename.
+
+    alpha : float (default : None)
+        Scaling factor (see imResize).
+
+    selector : list (default : None)
+        Slice selector (see imSlice). If None, the whole image is returned.
+
+    interp : SimpleITK interpolator (default : None)
+        Interpolator used for rescaling (see imResize).
+
+    Returns
+    -------
+
+    data : numpy array
+        Image (or slice) data.
+    """
+
+    im = imResize(sitk.ReadImage(imFile), alpha, interp)
+    if selector is None:
+        return sitk.GetArrayFromImage(im)
+    return imSlice(im, selector)
+
+
+def imPyramid(im, scales, selector=None, interp=None):
+    """Multi-resolution image pyramid.
+
+    The first level is the input image rescaled by scales[0] (i.e., the same
+    as imResize). Each following level is computed from the previous one,
+    after Gaussian smoothing (unless an interpolator, e.g., for label
+    images, is given).
+
+    Parameters
+    ----------
+
+    im : SimpleITK image
+        Input image.
+
+    scales : list of float
+        Scaling factors (relative to the input image) in decreasing order.
+        None is equivalent to 1.0.
+
+    selector : list (default : None)
+        Slice selector (see imSlice) w.r.t. the first level. The slice index
+        is scaled accordingly for the other levels.
+
+    interp : SimpleITK interpolator (default : None)
+        Interpolator used for rescaling (see imResize).
+
+    Returns
+    -------
+
+    levels : list of numpy arrays
+        Image (or slice) data of each pyramid level.
+    """
+
+    scales = [1.0 if x is None else float(x) for x in scales]
+    if sorted(scales, reverse=True) != scales:
+        raise Exception('pyramid scales must be in decreasing order!')
+
+    levels = []
+    cur = imResize(im, scales[0], interp)
+    for i, alpha in enumerate(scales):
+        if i > 0:
+            rel = alpha/scales[i-1]
+            if interp is None:
+                sigma = 0.5*max(cur.GetSpacing())/rel
+                cur = sitk.SmoothingRecursiveGaussian(cur, sigma)
+            cur = imResize(cur, rel, interp)
+        if selector is None:
+            levels.append(sitk.GetArrayFromImage(cur))
+        else:
+            sel = [int(round(x*alpha/scales[0])) for x in selector]
+            levels.append(imSlice(cur, sel))
+    return levels
+
+
+def maskIndex(mask):
+    """Flat indices of the non-zero mask elements.
+
+    Parameters
+    ----------
+
+    mask : numpy array
+        Mask (e.g., brain mask or thresholded vessel density atlas).
+
+    Returns
+    -------
+
+    idx : numpy array
+        Indices into the raveled data of all non-zero mask elements.
+    """
+
+    return np.flatnonzero(np.asarray(mask).ravel())
+
+
+def scatter(X, idx, N):
+    """Scatter masked data back to full size.
+
+    Inverse of gathering rows with a mask index, i.e., X = Y[idx,:].
+
+    Parameters
+    ----------
+
+    X : numpy array, shape (n, ...)
+        Masked data, one row per masked element.
+
+    idx : numpy array, shape (n,)
+        Mask index (see maskIndex).
+
+    N : int
+        Number of elements of the full (unmasked) data.
+
+    Returns
+    -------
+
+    Y : numpy array, shape (N, ...)
+        Full data (zero outside the mask).
+    """
+
+    X = np.asarray(X)
+    Y = np.zeros((N,) + X.shape[1:], dtype=X.dtype)
+    Y[idx] = X
+    return Y
+
+
+def loadMatrix(fileName):
+    """Load a (square) matrix from disk.
+
+    Parameters
+    ----------
+
+    fileName : string
+        Name of the matrix file. Files with extension .npy are loaded with
+        numpy's load, everything else is considered to be an ASCII file (e.g.,
+        as written by MATLAB's save -ASCII).
+
+    Returns
+    -------
+
+    M : numpy array, shape (L, L)
+        Matrix data.
+    """
+
+    if os.path.splitext(fileName)[1] == ".npy":
+        M = np.load(fileName)
+    else:
+        M = np.loadtxt(fileName)
+    M = np.atleast_2d(np.asarray(M, dtype=np.float64))
+    if M.shape[0] != M.shape[1]:
+        raise Exception('matrix in %s is not square!' % fileName)
+    return M
+
+
+def normalizeKernel(K):
+    """Kernel matrix normalization.
+
+    Computes K(i,j)/sqrt(K(i,i)*K(j,j)), i.e., the normalized kernel has a
+    unit diagonal (same as normalizekm in the graph kernel MATLAB code).
+
+    Parameters
+    ----------
+
+    K : numpy array, shape (L, L)
+        Input kernel matrix.
+
+    Returns
+    -------
+
+    K : numpy array, shape (L, L)
+        Normalized kernel matrix.
+    """
+
+    d = np.sqrt(np.diag(K))
+    d[d == 0] = 1
+    return K / np.outer(d, d)
+
+
+def kernelToDistance(K):
+    """Convert a normalized kernel matrix to a distance matrix.
+
+    Vectorized version of matlab/kerneltodistance.m, i.e., we compute
+    sqrt(max(2-2*K(i,j),0)) for all entries.
+
+    Parameters
+    ----------
+
+    K : numpy array, shape (L, L)
+        Normalized kernel matrix.
+
+    Returns
+    -------
+
+    D : numpy array, shape (L, L)
+        Distance matrix.
+    """
+
+    D = 2.0 - 2.0*np.asarray(K, dtype=np.float64)
+    np.maximum(D, 0, out=D)
+    return np.sqrt(D, out=D)
+
+
+def distMatrix(X):
+    """Euclidean distances between all observations.
+
+    Parameters
+    ----------
+
+    X : numpy matrix, shape (N, D)
+        Input data matrix. Observations are columns.
+
+    Returns
+    -------
+
+    dist : numpy array, shape (D, D)
+        Distance matrix (can be used as 'dist' argument of groupDiff).
+    """
+
+    Y = np.asarray(X, dtype=np.float32).T
+    return cdist(Y, Y)
+
+
+def groupDiff(X, labels, K=3, dist=None):
     """Groupwise differences based on nearest neighbor distance.
 
     Take a matrix with observations as columns and a binary group labeling (one
@@ -73,6 +342,11 @@ def groupDiff(X, labels, K=3):
         Number of nearest neighbors (in Euclidean sense) to consider for
         building the matrix of observation differences.
 
+    dist : numpy array, shape (D, D) (default : None)
+        Precomputed distance matrix between all observations (e.g., obtained
+        from a graph kernel via kernelToDistance). If given, neighbors are
+        selected from this matrix and no Euclidean distances are computed.
+
     Returns
     -------
 
@@ -84,28 +358,261 @@ def groupDiff(X, labels, K=3):
         K neighbors.
     """
 
-    u = np.unique(np.asarray(labels))
+    S, Z = groupNeighbors(X, labels, K, dist)
+
+    # make sure we have a signed data type
+    X0 = np.asarray(X[:,S], dtype=np.float32)
+
+    # build difference images
+    D = np.zeros((X.shape[0],S.shape[0]*K))
+    for i in range(S.shape[0]):
+        for idx, j in enumerate(Z[i,:]):
+            D[:,i*K+idx] = X0[:,i]-np.asarray(X[:,j], dtype=np.float32).ravel()
+    return D
+
+
+def groupNeighbors(X, labels, K=3, dist=None):
+    """Nearest neighbors (in group B) for all observations of group A.
+
+    Same neighbor search as in groupDiff, but only the column indices of the
+    observations that are subtracted from each other are returned.
+
+    Parameters
+    ----------
+
+    X : numpy matrix, shape (N, D)
+        Input data matrix. Observations are columns.
+
+    labels : list
+        List of D numeric (binary) labels - one for each observation.
+
+    K : int (default : 3)
+        Number of nearest neighbors.
+
+    dist : numpy array, shape (D, D) (default : None)
+        Precomputed distance matrix (see groupDiff).
+
+    Returns
+    -------
+
+    S : numpy array, shape (n1,)
+        Column indices of the observations in group 1.
+
+    Z : numpy array, shape (n1, K)
+        Z[i,:] holds the column indices of the K closest neighbors (in
+        group 2) of observation S[i], sorted by distance.
+    """
+
+    labels = np.asarray(labels)
+    u = np.unique(labels)
     if len(u) != 2:
         raise Exception('only binary grouping supported!')
 
     p0 = np.where(labels == u[0])[0] # group 0
     p1 = np.where(labels == u[1])[0] # group 1
 
-    # make sure we have a signed data type
-    S = np.asarray(X[:,p0], dtype=np.float32)
-    Z = np.asarray(X[:,p1], dtype=np.float32)
-
     # pairwise distances
-    pwd = np.argsort(cdist(np.asmatrix(S).T,
-                           np.asmatrix(Z).T), axis=1)
+    if dist is None:
+        # make sure we have a signed data type
+        S = np.asarray(X[:,p0], dtype=np.float32)
+        Z = np.asarray(X[:,p1], dtype=np.float32)
+        pwd = np.argsort(cdist(np.asmatrix(S).T,
+                               np.asmatrix(Z).T), axis=1)
+    else:
+        if np.asarray(dist).shape != (len(labels), len(labels)):
+            raise Exception('distance matrix does not match data!')
+        pwd = np.argsort(np.asarray(dist)[np.ix_(p0, p1)], axis=1)
+    return p0, p1[pwd[:,0:K]]
+
+
+def groupPairs(labels):
+    """All ordered pairs of (distinct) groups.
 
-    # build difference images
-    D = np.zeros((X.shape[0],pwd.shape[0]*K))
-    for i in range(pwd.shape[0]):
-        #print i, p1[pwd[i,0:K]]
-        for idx, j in enumerate(pwd[i,0:K]):
-            D[:,i*K+idx] = (S[:,i]-Z[:,j]).ravel()
-    return D
+    Parameters
+    ----------
+
+    labels : list
+        List of numeric labels - one for each observation.
+
+    Returns
+    -------
+
+    pairs : list of tuples
+        (a, b) label pairs with a != b, i.e., both directions for each two
+        groups.
+    """
+
+    u = np.unique(np.asarray(labels)).tolist()
+    return [(a, b) for a in u for b in u if a != b]
+
+
+def pairNeighbors(dist, labels, a, b, K=3):
+    """Nearest neighbors (in group b) for all observations of group a.
+
+    Unlike groupNeighbors, any number of groups is supported and neighbors
+    are always selected from a precomputed (subject x subject) distance
+    matrix, so that the distances are computed only once for all pairs.
+
+    Parameters
+    ----------
+
+    dist : numpy array, shape (D, D)
+        Distance matrix between all observations (e.g., from distMatrix).
+
+    labels : list
+        List of D numeric labels - one for each observation.
+
+    a : int
+        Label of the group whose observations are subtracted from.
+
+    b : int
+        Label of the group in which the neighbors are searched.
+
+    K : int (default : 3)
+        Number of nearest neighbors.
+
+    Returns
+    -------
+
+    S : numpy array, shape (na,)
+        Column indices of the observations in group a.
+
+    Z : numpy array, shape (na, K)
+        Z[i,:] holds the column indices of the K closest neighbors (in
+        group b) of observation S[i], sorted by distance.
+    """
+
+    labels = np.asarray(labels)
+    if np.asarray(dist).shape != (len(labels), len(labels)):
+        raise Exception('distance matrix does not match data!')
+
+    pa = np.where(labels == a)[0]
+    pb = np.where(labels == b)[0]
+    if K > len(pb):
+        raise Exception('group %s has less than %d observations!' % (b, K))
+    pwd = np.argsort(np.asarray(dist)[np.ix_(pa, pb)], axis=1)
+    return pa, pb[pwd[:,0:K]]
+
+
+def groupDiffBatches(X, S, Z, batchSize=256):
+    """Generate batches of difference images.
+
+    Instead of building the full difference matrix (see groupDiff), the
+    differences are computed on the fly and returned in batches. The order
+    of the differences is the same as in groupDiff.
+
+    Parameters
+    ----------
+
+    X : numpy matrix, shape (N, D)
+        Input data matrix. Observations are columns.
+
+    S, Z : numpy arrays
+        Output of groupNeighbors.
+
+    batchSize : int (default : 256)
+        Number of difference images per batch.
+
+    Returns
+    -------
+
+    batches : generator
+        Yields numpy arrays of shape (B, N), B <= batchSize, i.e., one
+        difference image per row.
+    """
+
+    src = np.repeat(S, Z.shape[1])
+    dst = Z.ravel()
+    for beg in range(0, len(src), batchSize):
+        end = min(beg+batchSize, len(src))
+        yield (np.asarray(X[:,src[beg:end]], dtype=np.float32) -
+               np.asarray(X[:,dst[beg:end]], dtype=np.float32)).T
+
+
+def fileDiffBatches(diffFile, batchSize=256, idx=None):
+    """Generate batches of difference images from disk.
+
+    Parameters
+    ----------
+
+    diffFile : string
+        Difference image file, as written by pbm.py (-d), see core.pbmio.
+
+    batchSize : int (default : 256)
+        Number of difference images per batch.
+
+    idx : numpy array (default : None)
+        Mask index (see maskIndex). If given, only the masked elements of
+        the difference images are returned.
+
+    Returns
+    -------
+
+    batches : generator
+        Yields numpy arrays of shape (B, N), B <= batchSize, i.e., one
+        difference image per row.
+    """
+
+    D, _ = pbmio.readArray(diffFile)
+    D = D.reshape((D.shape[0], -1))
+    for beg in range(0, D.shape[0], batchSize):
+        if idx is None:
+            yield np.array(D[beg:beg+batchSize])
+        else:
+            yield np.array(D[beg:beg+batchSize][:,idx])
+
+
+def parseSlabs(spec):
+    """Parse a slab specification.
+
+    Parameters
+    ----------
+
+    spec : string
+        Comma-separated list of slices (e.g., '10') and slabs (e.g.,
+        '20-24', inclusive), e.g., '10,20-24,30'.
+
+    Returns
+    -------
+
+    slabs : list of tuples
+        (begin, end) index pairs (end exclusive), one per slice/slab.
+    """
+
+    slabs = []
+    for item in spec.split(','):
+        lim = [int(x) for x in item.split('-')]
+        if len(lim) == 1:
+            lim = [lim[0], lim[0]]
+        if len(lim) != 2 or lim[1] < lim[0]:
+            raise Exception('Invalid slab specification!')
+        slabs.append((lim[0], lim[1]+1))
+    return slabs
+
+
+def slabView(V, slab):
+    """Data matrix of a slab (without copying).
+
+    Parameters
+    ----------
+
+    V : numpy array, shape (S, Z, Y, X)
+        Stack of S (C-contiguous) volumes.
+
+    slab : tuple
+        (begin, end) index pair along the Z axis (see parseSlabs).
+
+    Returns
+    -------
+
+    X : numpy array, shape (S, (end-begin)*Y*X)
+        View into V with one (flattened) slab per row.
+    """
+
+    beg, end = slab
+    if beg < 0 or end > V.shape[1]:
+        raise Exception('slab (%d,%d) is outside the volume!' % slab)
+    return V[:,beg:end].reshape((V.shape[0], -1))
 
 
 def imSlice(im, selector):
@@ -123,7 +630,8 @@ def imSlice(im, selector):
     selector : list
         Slice image along the dimension of the non-zero entry and extract
         the slice at that position. E.g., [0 0 10] extracts the 10th slice
-        along the 3rd dimension.
+        along the 3rd dimension. An all-zero selector, i.e., [0 0 0],
+        extracts the first slice along the 3rd dimension.
 
     Returns
     -------
@@ -139,6 +647,8 @@ def imSlice(im, selector):
     p = np.where(np.asarray(selector)>0)[0]
     if len(p) > 1:
         raise Exception('wrong selector format!')
+    # slice 0 has no non-zero entry (see selector)
+    p = int(p[0]) if len(p) else 2
 
     index = [0, 0, selector[p]]
     imSize[p] = 0
@@ -11,10 +11,7 @@ __status__  = "Development"
 
 
 from termcolor import colored
-import SimpleITK as sitk
-import numpy as np
 import subprocess
-import itertools
 import json
 import sys
 import os
@@ -29,7 +26,7 @@ class regtools:
 
 
     def warnMsg(self, msgText):
-        self._msg(msgText, "warn")
+        self.__msg(msgText, "warn")
 
 
     def infoMsg(self, msgText):
@@ -45,7 +42,7 @@ class regtools:
             "warn" : colored(levelText + msgText, 'blue'),
             "fail" : colored(levelText + msgText, 'red')
         }[level]
-        print message
+        print(message)
 
 
     def __init__(self, configFile):
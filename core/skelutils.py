@@ -0,0 +1,421 @@
+"""skelutils.py
+
+Tracing of skeletons on a CVT tesselation (see skeltrace.py).
+"""
+
+
+__license__ = "Apache License, Version 2.0"
+__author__  = "Roland Kwitt, Kitware Inc., 2013"
+__email__   = "E-Mail: roland.kwitt@kitware.com"
+__status__  = "Development"
+
+
+import os
+import itertools
+import numpy as np
+import scipy.sparse as sp
+import multiprocessing as mp
+import multiprocessing.sharedctypes
+import SimpleITK as sitk
+import cv2 as cv
+from core import dmaputils
+
+
+def contourPoints(cntLst):
+    """Stack the points of a list of contours.
+
+    Parameters
+    ----------
+
+    cntLst : list of numpy arrays, shape (N_i, 1, 2)
+        Contours (as returned by OpenCV's findContours), points are (x,y).
+
+    Returns
+    -------
+
+    pts : numpy array, shape (N, 2)
+        All contour points (x,y), N = sum of N_i.
+
+    cntIds : numpy array, shape (N,)
+        Index of the contour of each point.
+    """
+    if not len(cntLst):
+        return np.zeros((0, 2), dtype=np.intp), np.zeros(0, dtype=np.intp)
+    pts = np.concatenate([np.reshape(c, (-1, 2)) for c in cntLst])
+    cntIds = np.repeat(np.arange(len(cntLst)), [len(c) for c in cntLst])
+    return pts.astype(np.intp), cntIds
+
+
+def cellTransitions(cellMat, cntLst):
+    """Cell-to-cell transitions along contours.
+
+    Consecutive points of a contour that lie in different cells of the
+    tesselation are a transition from the cell of the first point to the
+    cell of the second point.
+
+    Parameters
+    ----------
+
+    cellMat : numpy array, shape (H, W)
+        Tesselation, i.e., cell identifier of each pixel.
+
+    cntLst : list of numpy arrays
+        Contours, see contourPoints.
+
+    Returns
+    -------
+
+    cBeg : numpy array, shape (T,)
+        Cell identifiers where the T transitions start.
+
+    cEnd : numpy array, shape (T,)
+        Cell identifiers where the T transitions end.
+    """
+    pts, cntIds = contourPoints(cntLst)
+    # coordinate switch (contour x,y = image column,row)
+    cells = cellMat[pts[:,1], pts[:,0]].astype(np.intp)
+    sel = (cntIds[1:] == cntIds[:-1]) & (cells[1:] != cells[:-1])
+    return cells[:-1][sel], cells[1:][sel]
+
+
+def adjacencyMatrix(cBeg, cEnd, numCell, base=1):
+    """Adjacency matrix (transition counts) of a tesselation.
+
+    Cell identifiers are 1-based (by default), i.e., transitions from cell i
+    to cell j are counted in A[i-1,j-1].
+
+    Parameters
+    ----------
+
+    cBeg, cEnd : numpy arrays, shape (T,)
+        Transitions, see cellTransitions.
+
+    numCell : int
+        Number of cells.
+
+    base : int (default : 1)
+        Identifier of the first cell (use 0 for compact cell indices, see
+        cellIndex).
+
+    Returns
+    -------
+
+    A : numpy array, shape (numCell, numCell)
+        Adjacency matrix.
+    """
+    A = np.zeros((numCell, numCell))
+    np.add.at(A, (cBeg-base, cEnd-base), 1)
+    return A
+
+
+def adjacencySparse(cBeg, cEnd, numCell, base=1):
+    """Sparse (CSR) version of adjacencyMatrix.
+
+    Returns
+    -------
+
+    A : scipy.sparse.csr_matrix, shape (numCell, numCell)
+        Adjacency matrix (same entries as adjacencyMatrix).
+    """
+    # same index semantics as adjacencyMatrix (cell id 0 -> last row/column)
+    rows, cols = cBeg-base, cEnd-base
+    rows = np.where(rows < 0, rows + numCell, rows)
+    cols = np.where(cols < 0, cols + numCell, cols)
+    A = sp.coo_matrix((np.ones(len(rows)), (rows, cols)),
+                      shape=(numCell, numCell))
+    return A.tocsr()
+
+
+def isSparseFile(adjFile):
+    """Check if an adjacency matrix file is in sparse (.npz) format."""
+    return os.path.splitext(adjFile)[1].lower() == '.npz'
+
+
+def writeGraph(adjFile, A):
+    """Write an adjacency matrix.
+
+    Parameters
+    ----------
+
+    adjFile : string
+        Output filename. If the extension is .npz, the matrix is written in
+        compressed sparse format (see scipy.sparse.save_npz), otherwise as
+        ASCII matrix (e.g., for readgraphs.m).
+
+    A : numpy array or scipy.sparse matrix
+        Adjacency matrix.
+    """
+    if isSparseFile(adjFile):
+        sp.save_npz(adjFile, sp.csr_matrix(A))
+    else:
+        if sp.issparse(A):
+            A = A.toarray()
+        np.savetxt(adjFile, A, delimiter=' ', fmt='%d')
+
+
+def readGraph(adjFile):
+    """Read an adjacency matrix (sparse or ASCII, see writeGraph).
+
+    Returns
+    -------
+
+    A : scipy.sparse.csr_matrix
+        Adjacency matrix.
+    """
+    if isSparseFile(adjFile):
+        return sp.load_npz(adjFile).tocsr()
+    return sp.csr_matrix(np.atleast_2d(np.loadtxt(adjFile)))
+
+
+def readGraphs(listFile, binary=True):
+    """Read the graphs of a cohort (Python version of readgraphs.m).
+
+    Parameters
+    ----------
+
+    listFile : string
+        File with one adjacency matrix filename per line (sparse or ASCII
+        format, see writeGraph).
+
+    binary : boolean (default : True)
+        Set all non-zero entries (i.e., transition counts) to 1.
+
+    Returns
+    -------
+
+    adjMats : list of scipy.sparse.csr_matrix
+        Adjacency matrix of each graph.
+
+    adjLists : list of lists
+        adjLists[i][j] is the array of (0-based) nodes that are connected to
+        node j in graph i.
+    """
+    with open(listFile) as fid:
+        adjFiles = [l.strip() for l in fid if l.strip()]
+
+    adjMats, adjLists = [], []
+    for adjFile in adjFiles:
+        A = readGraph(adjFile)
+        A.eliminate_zeros()
+        A.sort_indices()
+        if binary:
+            A.data[:] = 1
+        adjMats.append(A)
+        adjLists.append(np.split(A.indices, A.indptr[1:-1]))
+    return adjMats, adjLists
+
+
+def cellIndex(cellMat):
+    """Map the cell identifiers of a tesselation to 0,...,C-1.
+
+    Returns
+    -------
+
+    cellIds : numpy array, shape (C,)
+        Sorted cell identifiers.
+
+    labels : numpy array (int32), same shape as cellMat
+        Cell index (i.e., position in cellIds) of each pixel.
+    """
+    cellIds = np.unique(cellMat)
+    labels = np.searchsorted(cellIds, cellMat).astype(np.int32)
+    return cellIds, labels
+
+
+def traceSkeleton(skelMat, cellMat):
+    """Cell-to-cell transitions of a (2D or 3D) skeleton.
+
+    2D skeletons are traced along their contours (see cellTransitions), 3D
+    skeletons along neighboring voxels (see neighborTransitions).
+    """
+    if skelMat.shape != cellMat.shape:
+        raise Exception('skeleton and tesselation differ in size!')
+    if skelMat.ndim == 3:
+        return neighborTransitions(skelMat, cellMat)
+    cntLst = cv.findContours(skelMat, cv.RETR_TREE, cv.CHAIN_APPROX_NONE)[-2]
+    return cellTransitions(cellMat, cntLst)
+
+
+def traceCohort(imgFiles, cellMat, nJobs=1):
+    """Trace the skeletons of a list of images on one tesselation.
+
+    The tesselation is indexed once (see cellIndex) and shared with the
+    worker processes (without copying).
+
+    Parameters
+    ----------
+
+    imgFiles : list
+        Binary (2D or 3D) images, same size as the tesselation.
+
+    cellMat : numpy array
+        Tesselation, i.e., cell identifier of each pixel.
+
+    nJobs : int (default : 1)
+        Number of worker processes.
+
+    Returns
+    -------
+
+    adjMats : list of scipy.sparse.csr_matrix, shape (C, C)
+        Adjacency matrix of each image; row/column i corresponds to the
+        cell cellIds[i].
+
+    cellIds : numpy array, shape (C,)
+        Cell identifiers.
+    """
+    cellIds, labels = cellIndex(cellMat)
+    buf = mp.sharedctypes.RawArray('i', labels.size)
+    np.frombuffer(buf, dtype=np.int32)[:] = labels.ravel()
+    data = {"labels" : buf, "shape" : labels.shape, "C" : len(cellIds)}
+    del labels
+
+    if nJobs > 1:
+        pool = mp.Pool(nJobs, _initShared, (data,))
+        adjMats = pool.map(_traceJob, imgFiles)
+        pool.close()
+        pool.join()
+    else:
+        _initShared(data)
+        adjMats = [_traceJob(f) for f in imgFiles]
+        _shared.clear()
+    return adjMats, cellIds
+
+
+def writeCohort(cohortFile, imgFiles, adjMats, cellIds):
+    """Write the graphs of a cohort to one (compressed) .npz file.
+
+    Parameters
+    ----------
+
+    cohortFile : string
+        Output filename (.npz).
+
+    imgFiles : list
+        Image of each graph.
+
+    adjMats : list of scipy.sparse matrices
+        Adjacency matrix of each graph (see traceCohort).
+
+    cellIds : numpy array, shape (C,)
+        Cell identifiers.
+    """
+    coo = [sp.coo_matrix(A) for A in adjMats]
+    cat = lambda key: np.concatenate([getattr(A, key) for A in coo] +
+                                     [np.zeros(0, dtype=np.int32)])
+    np.savez_compressed(cohortFile,
+                        cellIds=cellIds,
+                        imgFiles=np.array(imgFiles),
+                        nnz=np.array([A.nnz for A in coo], dtype=np.int64),
+                        row=cat("row").astype(np.int32),
+                        col=cat("col").astype(np.int32),
+                        data=cat("data"))
+
+
+def readCohort(cohortFile, binary=True):
+    """Read the graphs of a cohort (see writeCohort).
+
+    Returns
+    -------
+
+    adjMats, adjLists : lists
+        Adjacency matrices and neighbor lists, see readGraphs.
+
+    imgFiles : list
+        Image of each graph.
+
+    cellIds : numpy array, shape (C,)
+        Cell identifiers (of the rows/columns of the adjacency matrices).
+    """
+    dat = np.load(cohortFile)
+    cellIds = dat["cellIds"]
+    C = len(cellIds)
+    end = np.cumsum(dat["nnz"])
+    beg = end - dat["nnz"]
+    row, col, val = dat["row"], dat["col"], dat["data"]
+
+    adjMats, adjLists = [], []
+    for b, e in zip(beg, end):
+        A = sp.coo_matrix((val[b:e], (row[b:e], col[b:e])),
+                          shape=(C, C)).tocsr()
+        A.eliminate_zeros()
+        A.sort_indices()
+        if binary:
+            A.data[:] = 1
+        adjMats.append(A)
+        adjLists.append(np.split(A.indices, A.indptr[1:-1]))
+    return adjMats, adjLists, [str(f) for f in dat["imgFiles"]], cellIds
+
+
+def neighborTransitions(skelMat, cellMat):
+    """Cell-to-cell transitions between neighboring skeleton voxels.
+
+    Two skeleton voxels are neighbors if they are adjacent in the full
+    (i.e., 8 in 2D, 26 in 3D) neighborhood. Each pair of neighbors that lie
+    in different cells is a transition in both directions. Instead of
+    looping over the voxels, the skeleton coordinates are shifted by each
+    (forward) neighbor offset at once.
+
+    Parameters
+    ----------
+
+    skelMat : numpy array, shape (Z, Y, X) or (Y, X)
+        Skeleton (non-zero = skeleton).
+
+    cellMat : numpy array, same shape as skelMat
+        Tesselation, i.e., cell identifier of each voxel.
+
+    Returns
+    -------
+
+    cBeg : numpy array, shape (T,)
+        Cell identifiers where the T transitions start.
+
+    cEnd : numpy array, shape (T,)
+        Cell identifiers where the T transitions end.
+    """
+    if skelMat.shape != cellMat.shape:
+        raise Exception('skeleton and tesselation differ in size!')
+
+    pts = np.nonzero(skelMat)
+    cells = cellMat[pts].astype(np.intp)
+
+    # each neighbor pair once, i.e., offsets with first non-zero entry > 0
+    offsets = [d for d in itertools.product((-1, 0, 1), repeat=skelMat.ndim)
+               if any(d) and d[np.flatnonzero(d)[0]] > 0]
+
+    cBeg, cEnd = [], []
+    for d in offsets:
+        nbr = [p + o for p, o in zip(pts, d)]
+        sel = np.ones(len(cells), dtype=bool)
+        for q, n in zip(nbr, skelMat.shape):
+            sel &= (q >= 0) & (q < n)
+        nbr = tuple([q[sel] for q in nbr])
+        src = cells[sel]
+        dst = cellMat[nbr].astype(np.intp)
+        tra = (skelMat[nbr] != 0) & (src != dst)
+        cBeg.append(src[tra])
+        cEnd.append(dst[tra])
+
+    cBeg = np.concatenate(cBeg + [np.zeros(0, dtype=np.intp)])
+    cEnd = np.concatenate(cEnd + [np.zeros(0, dtype=np.intp)])
+    return np.concatenate((cBeg, cEnd)), np.concatenate((cEnd, cBeg))
+
+
+# data shared with the worker processes (see _initShared)
+_shared = dict()
+
+
+def _initShared(data):
+    """Make the (indexed) tesselation available to the worker processes."""
+    _shared.update(data)
+    _shared["cells"] = np.frombuffer(data["labels"], dtype=np.int32).reshape(
+        data["shape"])
+
+
+def _traceJob(imgFile):
+    """Trace the skeleton of one image (see traceCohort)."""
+    skelMat = sitk.GetArrayFromImage(dmaputils.skeleton(
+        sitk.ReadImage(imgFile)))
+    cBeg, cEnd = traceSkeleton(skelMat, _shared["cells"])
+    return adjacencySparse(cBeg, cEnd, _shared["C"], base=0)
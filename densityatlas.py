@@ -0,0 +1,141 @@
+"""densityatlas.py
+"""
+
+
+__license__ = "Apache License, Version 2.0"
+__author__  = "Roland Kwitt, Kitware Inc., 2013"
+__email__   = "E-Mail: roland.kwitt@kitware.com"
+__status__  = "Development"
+
+
+from optparse import OptionParser
+import multiprocessing as mp
+import sys
+
+# numpy, SimpleITK and the core modules using them are imported in main() after
+# argument parsing, i.e., 'densityatlas.py -h' does not pay for them
+
+
+def usage():
+    """Print usage information"""
+    print("""
+Build a vessel density atlas from a list of binary (vessel) images in one
+pass, i.e., the fused equivalent of running bwdist.py on all images and
+imgavg.py on the results. Each image is skeletonized, distance transformed
+and inverted (in a pool of worker processes) and the density map is added to
+a running mean/variance accumulator right away, i.e., no intermediate density
+images are written (unless -d is given).
+
+    USAGE:
+        {0} [OPTIONS]
+        {0} -h
+
+    OPTIONS (Overview):
+
+        -l FILE
+        -o FILE
+        -v FILE
+        -j NUM
+        -b NAME
+        -s
+        -d
+
+    OPTIONS (Detailed):
+
+        -l FILE
+
+        FILE is the list of binary input images (one per line).
+
+        -o FILE
+
+        FILE is the output (mean) density atlas.
+
+        -v FILE (optional)
+
+        FILE is the output variance image (voxel-wise variance of the
+        density maps).
+
+        -j NUM (default: 1)
+
+        NUM is the number of worker processes.
+
+        -b NAME (default: danielsson)
+
+        NAME is the distance map backend (see bwdist.py -b).
+
+        -s
+
+        If -s is specified, use the squared Euclidean distance.
+
+        -d
+
+        If -d is specified, the density map of each image is written as well
+        (next to the image, as <image>-Den.tiff, same as bwdist.py -l).
+
+AUTHOR: Roland Kwitt, Kitware Inc., 2013
+        roland.kwitt@kitware.com
+""".format(sys.argv[0]))
+
+
+def main(argv=None):
+    if argv is None:
+        argv=sys.argv
+
+    parser = OptionParser(add_help_option=False)
+    parser.add_option("-l", dest="inList")
+    parser.add_option("-o", dest="outImg")
+    parser.add_option("-v", dest="varImg")
+    parser.add_option("-j", dest="numJobs", type="int", default=1)
+    parser.add_option("-b", dest="backend", default="danielsson")
+    parser.add_option("-s", dest="square", action="store_true", default=False)
+    parser.add_option("-d", dest="writeDen", action="store_true",
+                      default=False)
+    parser.add_option("-h", dest="doHelp", action="store_true", default=False)
+    options, _ = parser.parse_args(argv[1:])
+
+    if options.doHelp:
+        usage()
+        sys.exit(-1)
+
+    from core import dmaputils
+    from core import pbmstats
+    from core import imstream
+
+    if options.inList is None or options.outImg is None:
+        usage()
+        sys.exit(-1)
+
+    with open(options.inList) as fid:
+        binFiles = [l.strip() for l in fid if l.strip()]
+
+    tasks = []
+    for f in binFiles:
+        denFile = None
+        if options.writeDen:
+            denFile = dmaputils.denFileName(f)
+        tasks.append((f, denFile, options.square, options.backend))
+
+    if options.numJobs > 1:
+        pool = mp.Pool(options.numJobs)
+        res = pool.imap(dmaputils.densityArray, tasks)
+    else:
+        res = (dmaputils.densityArray(t) for t in tasks)
+
+    stats = pbmstats.runstats()
+    for f, dat in zip(binFiles, res):
+        stats.update(dat)
+        print("added %s" % f)
+    if options.numJobs > 1:
+        pool.close()
+        pool.join()
+
+    # output geometry = geometry of the first image
+    refImg = imstream.imInfo(binFiles[0])
+
+    imstream.writeImage(stats.mean(), refImg, options.outImg)
+    if not options.varImg is None:
+        imstream.writeImage(stats.variance(), refImg, options.varImg)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
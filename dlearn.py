@@ -0,0 +1,149 @@
+"""dlearn.py
+"""
+
+
+__license__ = "Apache License, Version 2.0"
+__author__  = "Roland Kwitt, Kitware Inc., 2013"
+__email__   = "E-Mail: roland.kwitt@kitware.com"
+__status__  = "Development"
+
+
+from optparse import OptionParser
+import sys
+import os
+
+
+def usage():
+    """Print usage information"""
+    print("""
+Dictionary learning using K-SVD (with Batch-OMP sparse coding). This is the
+Python counterpart of matlab/dlearn.m and does not require MATLAB or the KSVD
+MATLAB toolbox. The data file is typically the difference image data written
+by pbm.py (-d).
+
+    USAGE:
+        {0} [OPTIONS]
+        {0} -h
+
+    OPTIONS (Overview):
+
+        -i FILE
+        -s NUM NUM
+        -T NUM
+        -D NUM
+        -o DIR
+        -N NUM
+        -n NUM
+        -j NUM
+        -e
+
+    OPTIONS (Detailed):
+
+        -i FILE
+
+        FILE contains all data values (as float32), or is an array file
+        written by pbm.py (.npy + JSON sidecar, one signal per item).
+
+        -s NUM NUM
+
+        Specifies how to reshape the data vector (same as the 'shape'
+        argument of dlearn.m), i.e., for a raw file with V signals of N
+        values each, use -s V N. Not required for array files.
+
+        -T NUM (default: 2)
+
+        NUM is the sparsity, i.e., number of non-zero coefficients per signal.
+
+        -D NUM (default: 5)
+
+        NUM is the dictionary size (i.e., number of atoms).
+
+        -o DIR
+
+        Write the atoms (sorted by dominance) to DIR as atom-0001.bin,
+        atom-0002.bin, ... (as float32), together with a file 'list' that
+        contains the filenames of all written atoms.
+
+        -N NUM (default: D)
+
+        Write only the NUM most dominant atoms to disk.
+
+        -n NUM (default: 50)
+
+        NUM is the number of K-SVD iterations.
+
+        -j NUM (default: 1)
+
+        NUM is the number of threads used to update the atoms.
+
+        -e
+
+        Use the exact (SVD-based) atom update instead of the approximate one.
+
+AUTHOR: Roland Kwitt, Kitware Inc., 2013
+        roland.kwitt@kitware.com
+""".format(sys.argv[0]))
+
+
+def main(argv=None):
+    if argv is None:
+        argv=sys.argv
+
+    parser = OptionParser(add_help_option=False)
+    parser.add_option("-i", dest="dataFile")
+    parser.add_option("-s", dest="shape", type="int", nargs=2)
+    parser.add_option("-T", dest="sparsity", type="int", default=2)
+    parser.add_option("-D", dest="dictSiz", type="int", default=5)
+    parser.add_option("-o", dest="outDir")
+    parser.add_option("-N", dest="numAtoms", type="int")
+    parser.add_option("-n", dest="numIter", type="int", default=50)
+    parser.add_option("-j", dest="numJobs", type="int", default=1)
+    parser.add_option("-e", dest="exact", action="store_true", default=False)
+    parser.add_option("-h", dest="doHelp", action="store_true", default=False)
+    options, _ = parser.parse_args(argv[1:])
+
+    if options.doHelp:
+        usage()
+        sys.exit(-1)
+
+    if options.dataFile is None or options.outDir is None:
+        usage()
+        sys.exit(-1)
+
+    # imported after argument parsing (fast -h, see pypbm.py)
+    import numpy as np
+    from core import pbmlearn
+    from core import ksvd
+    from core import pbmio
+
+    if pbmio.isArrayFile(options.dataFile):
+        data, _ = pbmio.readArray(options.dataFile)
+        X = data.reshape((data.shape[0], -1)).T
+    elif options.shape is None:
+        usage()
+        sys.exit(-1)
+    else:
+        # same as reshape(dat, shape)' in MATLAB, i.e., signals are columns
+        nCols, nRows = options.shape
+        X = np.fromfile(options.dataFile,
+                        dtype=np.float32).reshape((nRows, nCols))
+
+    Dict, Gamma = ksvd.ksvd(X,
+                            options.dictSiz,
+                            options.sparsity,
+                            options.numIter,
+                            nJobs=options.numJobs,
+                            exact=options.exact)
+
+    # sort by dominant atoms
+    rank, energy = pbmlearn.rankAtoms(Gamma)
+    for i in rank:
+        print("atom %d : %.4f" % (i, energy[i]))
+
+    if not os.path.exists(options.outDir):
+        os.makedirs(options.outDir)
+    ksvd.writeAtoms(Dict[:,rank], options.outDir, options.numAtoms)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
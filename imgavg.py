@@ -8,16 +8,27 @@ __status__  = "Development"
 
 
 from optparse import OptionParser
-import SimpleITK as sitk
-import numpy as np
+import multiprocessing as mp
 import sys
-import os
+
+# SimpleITK/numpy (incl. core.pbmstats and core.imstream) are imported where
+# needed, i.e., not for 'imgavg.py -h'
 
 
 def usage():
     """Print usage information"""
     print("""
-Take a file with a list of images and output the mean image.
+Take a file with a list of images and output the mean image. Optionally, the
+(voxel-wise) variance and standard deviation images and the mean image of
+each group are computed in the same pass over the images. Images are read in
+-j worker processes; each worker accumulates (float64) partial statistics
+that are merged at the end. The outputs have the geometry of the first image.
+
+With -m, the images are processed in slabs (along the last axis), i.e., only
+a few slabs of the images and the statistics are in memory at any time and
+the outputs (MetaImage files) are written slab by slab. This is meant for
+volumes that do not fit into memory; inputs should be uncompressed MetaImage
+(or NRRD) files, so that only the slab is read from disk.
 
     USAGE:
         {0} [OPTIONS]
@@ -27,22 +38,197 @@ Take a file with a list of images and output the mean image.
 
         -l FILE
         -o FILE
+        -v FILE
+        -s FILE
+        -g PATTERN
+        -j NUM
+        -m MB
 
     OPTIONS (Detailed):
 
         -l FILE
 
-        FILE is the list of input images (absolute paths).
+        FILE is the list of input images (absolute paths), one per line.
+        Optionally, each line contains a group label (separated by
+        whitespace) after the image filename, e.g.,
+
+        /tmp/variant-A/Image-0001-Den.tiff A
 
         -o FILE
 
         FILE is the generated output image.
 
+        -v FILE (optional)
+
+        FILE is the output variance image.
+
+        -s FILE (optional)
+
+        FILE is the output standard deviation image.
+
+        -g PATTERN (optional)
+
+        Write the mean image of each group to PATTERN, where %s in PATTERN
+        is replaced by the group label, e.g., /tmp/mean-%s.tiff. Images
+        without a group label are only used for the overall statistics.
+
+        -j NUM (default: 1)
+
+        NUM is the number of worker processes.
+
+        -m MB (optional)
+
+        Process the images in slabs, using about MB megabytes of memory for
+        the slabs (shared by all workers). All outputs must be MetaImage
+        (.mha or .mhd) files.
+
 AUTHOR: Roland Kwitt, Kitware Inc., 2013
         roland.kwitt@kitware.com
 """.format(sys.argv[0]))
 
 
+def readList(inList):
+    """Read an image list (with optional group labels).
+
+    Returns
+    -------
+
+    entries : list of tuples
+        (image filename, group label or None) pairs.
+    """
+    entries = []
+    with open(inList) as fid:
+        for l in fid:
+            fields = l.split()
+            if not len(fields):
+                continue
+            group = None
+            if len(fields) > 1:
+                group = fields[1]
+            entries.append((fields[0], group))
+    return entries
+
+
+def partialStats(entries):
+    """Per-group statistics (see core.pbmstats) of a list of images.
+
+    Returns
+    -------
+
+    stats : dict
+        stats[group] is the runstats accumulator of group.
+    """
+    import SimpleITK as sitk
+    from core import pbmstats
+
+    stats = dict()
+    for imgFile, group in entries:
+        dat = sitk.GetArrayFromImage(sitk.ReadImage(imgFile))
+        stats.setdefault(group, pbmstats.runstats()).update(dat)
+    return stats
+
+
+def slabStats(task):
+    """Per-group statistics of one slab of a list of images.
+
+    Parameters
+    ----------
+
+    task : tuple
+        (entries, slab) pair, see readList and core.imstream.readSlab.
+
+    Returns
+    -------
+
+    stats : dict
+        stats[group] is the runstats accumulator of group (for the slab).
+    """
+    from core import pbmstats
+    from core import imstream
+
+    entries, slab = task
+    stats = dict()
+    for imgFile, group in entries:
+        dat = imstream.readSlab(imgFile, slab)
+        stats.setdefault(group, pbmstats.runstats()).update(dat)
+    return stats
+
+
+def slabAverage(entries, groups, outFiles, grpFiles, budget, numJobs):
+    """Slab-wise (streamed) version of the statistics (see usage, -m).
+
+    Parameters
+    ----------
+
+    entries : list of tuples
+        See readList.
+
+    groups : list
+        Group labels.
+
+    outFiles : dict
+        Output filenames, outFiles[name] for name in 'mean', 'var' and 'std'
+        (None for no output).
+
+    grpFiles : dict
+        grpFiles[group] is the output filename of the group mean (groups
+        without entry are not written).
+
+    budget : int
+        Memory budget (in bytes) for the slabs of all workers.
+
+    numJobs : int
+        Number of worker processes (each processes one slab).
+    """
+    from core import pbmstats
+    from core import imstream
+
+    refImg = imstream.imInfo(entries[0][0])
+    imgSize = list(refImg.GetSize())
+
+    newWriter = lambda f: imstream.metaImageWriter(
+        f, imgSize, refImg.GetSpacing(), refImg.GetOrigin(),
+        refImg.GetDirection())
+    writers = dict([(name, newWriter(f)) for name, f in outFiles.items()
+                    if not f is None])
+    grpWriters = dict([(g, newWriter(f)) for g, f in grpFiles.items()])
+
+    # float64 voxel, per slab: mean/M2 of each group and of all images, the
+    # input slab (+ temporary) and the output slab (+ temporary)
+    bytesPerVoxel = 8*(2*len(groups) + 2 + 4)
+    depth = imstream.slabSize(imgSize, budget // numJobs, bytesPerVoxel)
+    tasks = [(entries, slab) for slab in imstream.slabRanges(imgSize[-1],
+                                                             depth)]
+
+    if numJobs > 1:
+        pool = mp.Pool(numJobs)
+
+    # one round of slabs per worker, written in order before the next round
+    for i in range(0, len(tasks), numJobs):
+        if numJobs > 1:
+            res = pool.map(slabStats, tasks[i:i+numJobs])
+        else:
+            res = [slabStats(tasks[i])]
+        for grpStats in res:
+            stats = pbmstats.mergeAll([grpStats[g] for g in groups])
+            if 'mean' in writers:
+                writers['mean'].write(stats.mean())
+            if 'var' in writers:
+                writers['var'].write(stats.variance())
+            if 'std' in writers:
+                writers['std'].write(stats.std())
+            for g in grpWriters:
+                grpWriters[g].write(grpStats[g].mean())
+        print("processed slab %d of %d" % (min(i+numJobs, len(tasks)),
+                                           len(tasks)))
+
+    if numJobs > 1:
+        pool.close()
+        pool.join()
+    for w in list(writers.values()) + list(grpWriters.values()):
+        w.close()
+
+
 def main(argv=None):
     if argv is None:
         argv=sys.argv
@@ -50,8 +236,13 @@ def main(argv=None):
     parser = OptionParser(add_help_option=False)
     parser.add_option("-l", dest="inList")
     parser.add_option("-o", dest="outImg")
+    parser.add_option("-v", dest="varImg")
+    parser.add_option("-s", dest="stdImg")
+    parser.add_option("-g", dest="grpImg")
+    parser.add_option("-j", dest="numJobs", type="int", default=1)
+    parser.add_option("-m", dest="memBudget", type="float")
     parser.add_option("-h", dest="doHelp", action="store_true", default=False)
-    options, _ = parser.parse_args()
+    options, _ = parser.parse_args(argv[1:])
 
     if options.doHelp:
         usage()
@@ -59,22 +250,59 @@ def main(argv=None):
 
     inList = options.inList
     outImg = options.outImg
+    numJobs = options.numJobs
 
-    with open(inList) as fid:
-        lines = fid.readlines()
+    if inList is None or outImg is None:
+        usage()
+        sys.exit(-1)
+
+    from core import pbmstats
+    from core import imstream
+
+    entries = readList(inList)
+    groups = sorted(set([e[1] for e in entries]), key=str)
+
+    # per-group outputs (for labeled images only)
+    grpFiles = dict()
+    if not options.grpImg is None:
+        grpFiles = dict([(g, options.grpImg % g) for g in groups
+                         if not g is None])
+        if not len(grpFiles):
+            raise Exception('-g requires group labels in the list file!')
+
+    if not options.memBudget is None:
+        outFiles = {'mean' : outImg,
+                    'var' : options.varImg,
+                    'std' : options.stdImg}
+        slabAverage(entries, groups, outFiles, grpFiles,
+                    int(options.memBudget*1024**2), numJobs)
+        return
+
+    # one chunk of images per worker, partial statistics are merged
+    chunks = [entries[i::numJobs] for i in range(numJobs)]
+    if numJobs > 1:
+        pool = mp.Pool(numJobs)
+        res = pool.map(partialStats, chunks)
+        pool.close()
+        pool.join()
+    else:
+        res = [partialStats(c) for c in chunks]
+
+    grpStats = dict([(g, pbmstats.mergeAll([r[g] for r in res if g in r]))
+                     for g in groups])
+    stats = pbmstats.mergeAll([grpStats[g] for g in groups])
 
-    avg = None
-    for l in lines:
-        img = sitk.ReadImage(l.rstrip())
-        dat = sitk.GetArrayFromImage(img).astype('float32')
-        if avg is None:
-            avg = dat
-        avg += dat
+    # output geometry = geometry of the first image
+    refImg = imstream.imInfo(entries[0][0])
 
-    avg = avg * 1.0/len(lines)
-    atl = sitk.GetImageFromArray(avg)
-    sitk.WriteImage(atl, outImg)
+    imstream.writeImage(stats.mean(), refImg, outImg)
+    if not options.varImg is None:
+        imstream.writeImage(stats.variance(), refImg, options.varImg)
+    if not options.stdImg is None:
+        imstream.writeImage(stats.std(), refImg, options.stdImg)
+    for g in grpFiles:
+        imstream.writeImage(grpStats[g].mean(), refImg, grpFiles[g])
 
 
 if __name__ == "__main__":
-    sys.exit(main())
\ No newline at end of file
+    sys.exit(main())
@@ -100,8 +100,10 @@ AUTHOR: Roland Kwitt, Kitware Inc., 2013
 """.format(sys.argv[0]))
 
 
+def main(argv=None):
+    if argv is None:
+        argv=sys.argv
 
-if __name__ == "__main__":
     parser = OptionParser(add_help_option=False)
     parser.add_option("-l", dest="vFiles")
     parser.add_option("-c", dest="config")
@@ -109,7 +111,7 @@ if __name__ == "__main__":
     parser.add_option("-i", dest="tFiles", action="store", nargs=4)
     parser.add_option("-h", dest="doHelp", action="store_true", default=False)
     parser.add_option("-x", dest="recomp", action="store_true", default=False)
-    options, args = parser.parse_args()
+    options, args = parser.parse_args(argv[1:])
 
     if options.doHelp:
         usage()
@@ -129,10 +131,14 @@ if __name__ == "__main__":
     vList0 = [c.strip() for c in vList0]
 
     T0ListFile, T1ListFile, FDListFile, IDListFile = options.tFiles
-    T0 = pickle.load(open(T0ListFile))
-    T1 = pickle.load(open(T1ListFile))
-    FD = pickle.load(open(FDListFile))
-    ID = pickle.load(open(IDListFile))
+    with open(T0ListFile, "rb") as fid:
+        T0 = pickle.load(fid)
+    with open(T1ListFile, "rb") as fid:
+        T1 = pickle.load(fid)
+    with open(FDListFile, "rb") as fid:
+        FD = pickle.load(fid)
+    with open(IDListFile, "rb") as fid:
+        ID = pickle.load(fid)
 
     vList1 = helper.treeApplyTfm(vList0, T0, "RigidMRAToMRI",  options.recomp)
     vList2 = helper.treeApplyTfm(vList1, T1, "AffineMRIToRef", options.recomp)
@@ -141,3 +147,7 @@ if __name__ == "__main__":
     helper.createTreeImage(vList3,
                            [options.refImg]*len(vList3),
                            options.recomp)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -11,15 +11,12 @@ __status__  = "Development"
 import os
 import sys
 import json
-import numpy as np
-import SimpleITK as sitk
-from scipy.spatial.distance import cdist
-from sklearn.decomposition import DictionaryLearning
-from sklearn.decomposition import MiniBatchDictionaryLearning
-from sklearn.decomposition import sparse_encode
 from optparse import OptionParser
-from core import pbmutils
 from core import regtools
+from core import pbmprof
+
+# numpy, SimpleITK, sklearn and the core modules using them are imported in
+# run(), i.e., after argument parsing, and 'pbm.py -h' does not pay for them
 
 
 def usage():
@@ -30,6 +27,8 @@ code. We learn a sparse dictionary for difference volumes (images), built by
 subtracting an image of population A from its K closest neighbors (in the
 Euclidean sense) in population B. The dictionary elements can then be visualized
 and hopefully highlight characteristic differences between populations A and B.
+Alternatively, the neighbors can be selected from a precomputed kernel (e.g.,
+a graph kernel on the spatial-graph representations) or distance matrix.
 
     USAGE:
         {0} [OPTIONS]
@@ -37,15 +36,33 @@ and hopefully highlight characteristic differences between populations A and B.
 
     OPTIONS (Overview):
 
-        -k NUM
-        -D NUM
+        -k NUM[,NUM,...]
+        -D NUM[,NUM,...]
+        -o DIR
+        -g
         -r NUM
+        -R NUM
         -s NUM
-        -r NUM
+        -S LIST
+        -m FILE
+        -P NUM
+        -z DIR
+        -Z NUM
         -c FILE
+        -K FILE
+        -M FILE
+        -p NUM
+        -b NUM
+        -C FILE
+        -j NUM
         -d FILE
         -a FILE
         -x FILE
+        -A FILE
+        -n NUM
+        -N FILE
+        --profile FILE
+        --cprofile FILE
 
     OPTIONS (Detailed):
 
@@ -69,38 +86,217 @@ and hopefully highlight characteristic differences between populations A and B.
         NUM is an integer value that specifies the size of the learned
         dictionary.
 
+        Parameter sweep: If -k and/or -D are given a comma-separated list
+        of values (e.g., -k 3,5,7 -D 5,10), the distances and the difference
+        images are computed only once (for the largest number of neighbors)
+        and dictionaries for all (K, D) combinations are learned in -j worker
+        processes. Requires -o.
+
+        -o DIR (optional)
+
+        DIR is the output directory of a parameter sweep. The atoms of each
+        (K, D) combination are written to atoms-K<K>-D<D>.npy (same format
+        as -a) and DIR/sweep.json indexes all the results.
+
+        -g (optional)
+
+        Multi-group mode: any number of groups is supported. The distances
+        between all images are computed once (or taken from -K/-M) and, for
+        each ordered pair of groups (A, B), i.e., both directions, the K
+        nearest neighbors in B are subtracted from each image of A and a
+        dictionary is learned. Dictionaries of different pairs are learned
+        in -j worker processes. The atoms of each pair are written to
+        DIR/atoms-<A>-<B>.npy (same format as -a, incl. the neighbor
+        indices) and DIR/pairs.json indexes all the results. Requires -o.
+
         -r NUM (optional)
 
         NUM is a float value that specifies the resizing factor of the input
         images. Resampling is a good way to achieve lower computation times
         in the dictionary learning stage.
 
+        -R NUM (optional)
+
+        NUM is a float value that specifies a (smaller) resizing factor of
+        the input images for the nearest neighbor search. An image pyramid
+        is built (and cached, see -z) for each image; the neighbors are
+        searched at the coarse level while the difference images are still
+        computed at the resolution given by -r. Ignored with -K/-M.
+
         -s NUM (optional)
 
         First, this flag indicates that we only want to run on image slices.
         NUM specifies exactly the slice (in the AP direction) to use. CAUTION:
         Make sure that the slice is within the image!.
 
+        -K FILE (optional)
+
+        FILE contains a LxL kernel matrix (L is the number of images, ordered
+        as in the JSON file given by -i), either as ASCII (e.g., MATLAB's
+        save -ASCII) or as .npy file. The kernel is normalized and converted
+        to distances which are then used to select the nearest neighbors,
+        i.e., no Euclidean distances between images are computed.
+
+        -M FILE (optional)
+
+        Same as -K, but FILE contains a LxL distance matrix which is used as
+        is to select the nearest neighbors.
+
+        -p NUM (optional)
+
+        If -p is given, dictionary learning runs out-of-core: the difference
+        images are never held in memory as a whole, but generated in batches
+        (or read from the file given by -d) and fed to the learner for NUM
+        passes over the data.
+
+        -b NUM (default: 256)
+
+        NUM is the number of difference images per batch (only used with -p).
+
+        -C FILE (optional)
+
+        FILE is a checkpoint file that is written after each pass (only used
+        with -p). If FILE exists, learning resumes from the checkpoint.
+
+        -j NUM (default: 1)
+
+        NUM is the number of worker processes used to compute the sparse
+        codes (only used with -A), to learn the dictionaries of a
+        parameter sweep or of the slabs (-S), or to run the permutations
+        (-n).
+
+        -S LIST (optional)
+
+        Slab mode: LIST is a comma-separated list of slices and slabs (in
+        the AP direction, inclusive ranges), e.g., 10,20-24,30. Each volume
+        is loaded only once and neighbor search + dictionary learning run
+        independently for each slab (in -j worker processes). The per-slab
+        atoms are assembled into atom volumes (zero outside the slabs) and
+        written to -a. Only -r, -m, -z, -k, -D and -j are used in this mode.
+
+        -m FILE (optional)
+
+        FILE is a mask image (e.g., a brain mask or a thresholded vessel
+        density atlas) in the space of the input images. Only the voxels
+        within the mask (non-zero) are used for distance computation,
+        differencing and dictionary learning. Output data (-x, -d, -a, -A)
+        is scattered back to full image size (zero outside the mask).
+
+        -P NUM (optional)
+
+        If -P is given, the images are projected onto their NUM leading
+        principal components (randomized PCA) first. Nearest neighbors are
+        then searched, and the dictionary is learned, in that reduced space.
+        The atoms (and difference images) are mapped back to voxel space for
+        output. The explained variance is reported, so NUM can be chosen to
+        trade accuracy for speed.
+
+        -z DIR (optional)
+
+        DIR is a cache directory for the preprocessed (resized/sliced) image
+        data. Entries are keyed on the source file (path, modification time,
+        size), the resizing factor and the slice, so that repeated runs with
+        different -k or -D skip reading and resampling the images.
+
+        -Z NUM (optional)
+
+        NUM is the max. size of the cache (in MB). Least recently used
+        entries are evicted first.
+
         -d FILE (optional)
 
-        If -x is specified, FILE specifies the output file to which the
-        difference image data is written (as float32).
+        If -d is specified, FILE specifies the output file to which the
+        difference image data is written (see OUTPUT FORMAT).
 
         -a FILE (optional)
 
         If -a is given, FILE specifies the output dictionary file that will be
-        written upon completion of the dictionary learning stage (as float32).
+        written upon completion of the dictionary learning stage (see OUTPUT
+        FORMAT).
+        If -A is given as well, the atoms are sorted by dominance.
 
         -x FILE (optional)
 
         If -x is given, FILE specifies the output file to which the raw image
-        data is written (as float32).
+        data is written (see OUTPUT FORMAT).
+
+        -A FILE (optional)
+
+        If -A is given, the sparse codes of all difference images are computed
+        and the atoms are ranked by dominance (i.e., by the norm of their
+        coefficients). FILE specifies the output file (numpy .npz format)
+        to which atoms, ranking and the (sparse) codes are written, see
+        core.pbmlearn.writeBundle.
+
+        -n NUM (optional)
+
+        If -n is given, run a label permutation test with NUM permutations
+        (in -j worker processes). For the true and the permuted group labels,
+        the difference images are encoded w.r.t. the learned atoms and the
+        coefficient energy of each atom is used as test statistic, i.e., the
+        p-value of each atom refers to the atoms written by -a (same order).
+        The distance matrix is computed once and shared by all permutations.
+        The permutations are seeded, i.e., the same input gives the same
+        p-values.
+
+        -N FILE (optional)
+
+        FILE specifies the output file (numpy .npz format) for the results
+        of the permutation test, i.e., 'observed' statistics, 'null'
+        distributions (NUM x D) and 'pvalues'.
+
+        --profile FILE (optional)
+
+        Profile the pipeline stages (loading, distances/neighbors, difference
+        images, learning, sparse coding, output, ...). For each stage, the
+        wall time, CPU time (incl. worker processes), peak RSS and bytes
+        read from/written to disk (Linux only) are recorded and written to
+        FILE (as JSON) when PBM is done, see core.pbmprof.
+
+        --cprofile FILE (optional)
+
+        Run the dictionary learning under cProfile and write the statistics
+        to FILE (e.g., for python -m pstats FILE).
+
+    OUTPUT FORMAT:
+
+        Image (-x), difference image (-d) and atom (-a) files are written as
+        numpy .npy files (float32, one image/atom per row, in image shape)
+        plus a JSON sidecar file with the same name (extension .json) that
+        contains the shape, image geometry, group labels (-x), neighbor
+        indices (-d) and atom ranking (-a, if -A is given). Use
+        core.pbmio.readArray to memory-map such a file, or bintovolume.py to
+        convert a single image/atom into an image file.
 
 AUTHOR: Roland Kwitt, Kitware Inc., 2013
         roland.kwitt@kitware.com
 """.format(sys.argv[0]))
 
 
+def loadLevels(imFile, cache, scales, imSlice=None):
+    """Load (cached) pyramid levels of an image (see pbmutils.imPyramid).
+    """
+    import SimpleITK as sitk
+    from core import pbmutils
+
+    keyPar = [dict(scale=scales[0], slice=imSlice)]
+    for x in scales[1:]:
+        keyPar.append(dict(scale=scales[0], slice=imSlice, level=x))
+
+    levels = [None]
+    if not cache is None:
+        levels = [cache.get(cache.key(imFile, **p)) for p in keyPar]
+    if any([x is None for x in levels]):
+        selector = None
+        if not imSlice is None:
+            selector = [0, 0, imSlice]
+        levels = pbmutils.imPyramid(sitk.ReadImage(imFile), scales, selector)
+        if not cache is None:
+            levels = [cache.put(cache.key(imFile, **p), x)
+                      for p, x in zip(keyPar, levels)]
+    return levels
+
+
 def main(argv=None):
     if argv is None:
         argv=sys.argv
@@ -111,28 +307,97 @@ def main(argv=None):
     parser.add_option("-a", dest="outAtomFile")
     parser.add_option("-d", dest="outDiffFile")
     parser.add_option("-x", dest="outImagFile")
+    parser.add_option("-K", dest="kernFile")
+    parser.add_option("-M", dest="distFile")
     parser.add_option("-s", dest="imSlice", type="int")
+    parser.add_option("-S", dest="slabSpec")
     parser.add_option("-r", dest="imScale", type="float")
-    parser.add_option("-D", dest="dictSiz", type="int", default=5)
-    parser.add_option("-k", dest="nearest", type="int", default=5)
+    parser.add_option("-R", dest="coarScal", type="float")
+    parser.add_option("-m", dest="maskFile")
+    parser.add_option("-P", dest="numComp", type="int")
+    parser.add_option("-z", dest="cacheDir")
+    parser.add_option("-Z", dest="cacheSiz", type="float")
+    parser.add_option("-D", dest="dictSiz", default="5")
+    parser.add_option("-k", dest="nearest", default="5")
+    parser.add_option("-o", dest="outSwpDir")
+    parser.add_option("-g", dest="multiGrp", action="store_true",
+                      default=False)
+    parser.add_option("-p", dest="nPasses", type="int")
+    parser.add_option("-b", dest="batchSiz", type="int", default=256)
+    parser.add_option("-C", dest="chkFile")
+    parser.add_option("-A", dest="outBndlFile")
+    parser.add_option("-n", dest="numPerm", type="int")
+    parser.add_option("-N", dest="outPermFile")
+    parser.add_option("-j", dest="numJobs", type="int", default=1)
+    parser.add_option("--profile", dest="profFile")
+    parser.add_option("--cprofile", dest="cprofFile")
     parser.add_option("-h", dest="doHelp", action="store_true", default=False)
-    options, _ = parser.parse_args()
+    options, _ = parser.parse_args(argv[1:])
 
     if options.doHelp:
         usage()
         sys.exit(-1)
 
+    # the report is written when the run ends (also on errors), i.e., also
+    # when pbm.py is run as one of several commands of 'pypbm.py batch'
+    prof = pbmprof.profiler(options.profFile, options.cprofFile)
+    try:
+        run(options, prof)
+    finally:
+        prof.end()
+        prof.write()
+
+
+def run(options, prof):
+    """Run PBM with the parsed command line options (see main).
+    """
+    import numpy as np
+    import SimpleITK as sitk
+    from sklearn.decomposition import MiniBatchDictionaryLearning
+    from core import pbmutils
+    from core import pbmlearn
+    from core import imcache
+    from core import pbmio
+
     imgJSON = options.imgJSON
     cfgJSON = options.cfgJSON
 
     outAtomFile = options.outAtomFile
     outImagFile = options.outImagFile
     outDiffFile = options.outDiffFile
+    outBndlFile = options.outBndlFile
+
+    kernFile = options.kernFile
+    distFile = options.distFile
 
     imSlice = options.imSlice
-    dictSiz = options.dictSiz
+    slabSpec = options.slabSpec
+    maskFile = options.maskFile
+    numComp = options.numComp
+    cacheDir = options.cacheDir
+    cacheSiz = options.cacheSiz
     imScale = options.imScale
-    nearest = options.nearest
+    coarScal = options.coarScal
+    outSwpDir = options.outSwpDir
+    multiGrp = options.multiGrp
+
+    # lists of dictionary sizes/neighbors trigger a parameter sweep
+    dictLst = [int(x) for x in options.dictSiz.split(',')]
+    nearLst = [int(x) for x in options.nearest.split(',')]
+    dictSiz = dictLst[0]
+    nearest = nearLst[0]
+    doSweep = len(dictLst) > 1 or len(nearLst) > 1
+    if doSweep and outSwpDir is None:
+        raise Exception('parameter sweep requires an output directory (-o)!')
+    if multiGrp and (doSweep or outSwpDir is None):
+        raise Exception('multi-group mode requires -o (and no sweep)!')
+
+    nPasses = options.nPasses
+    batchSiz = options.batchSiz
+    chkFile = options.chkFile
+    numJobs = options.numJobs
+    numPerm = options.numPerm
+    outPermFile = options.outPermFile
 
     imData = json.load(open(imgJSON))
     helper = regtools.regtools(cfgJSON)
@@ -143,50 +408,299 @@ def main(argv=None):
 
     # generate numeric labels for each image
     for entry in imData["Data"]: groupSet.add(entry["Group"])
-    for cnt, group in enumerate(groupSet): groupMap[group] = cnt
+    for cnt, group in enumerate(sorted(groupSet)): groupMap[group] = cnt
     for entry in imData["Data"]: groupLab.append(groupMap[entry["Group"]])
 
+    imSelector = None
+    if not imSlice is None:
+        imSelector = [0, 0, imSlice]
+
     imgFiles = []
     [imgFiles.append(str(e["Source"])) for e in imData["Data"]]
 
+    cache = None
+    if not cacheDir is None:
+        cacheMax = None
+        if not cacheSiz is None:
+            cacheMax = int(cacheSiz*1024**2)
+        cache = imcache.imcache(cacheDir, cacheMax)
+
+    # slab mode: load each volume once and learn per slab
+    if not slabSpec is None:
+        slabs = pbmutils.parseSlabs(slabSpec)
+        # check the slabs before loading anything
+        geometry = pbmutils.imGeometry(imgFiles[0], imScale)
+        if len(geometry["size"]) != 3:
+            raise Exception('slab mode (-S) requires 3D images!')
+        imDepth = geometry["size"][-1]
+        for slab in slabs:
+            if slab[1] > imDepth:
+                raise Exception('slab (%d,%d) is outside the volume (%d '
+                                'slices)!' % (slab[0], slab[1], imDepth))
+
+        prof.begin("load")
+        V = None
+        for i, imFile in enumerate(imgFiles):
+            loadFun = lambda: pbmutils.imLoad(imFile, imScale)
+            if cache is None:
+                dat = loadFun()
+            else:
+                dat = cache.load(imFile, loadFun, scale=imScale, slice=None)
+            if V is None:
+                V = np.empty((len(imgFiles),) + dat.shape, dtype=np.float32)
+            V[i] = dat
+            helper.infoMsg("Done with image %d!" % i)
+
+        mask = None
+        if not maskFile is None:
+            mask = pbmutils.imLoad(maskFile, imScale, None,
+                                   sitk.sitkNearestNeighbor)
+
+        prof.begin("learning")
+        atoms = pbmlearn.slabLearn(V, slabs, groupLab, nearest, dictSiz, mask,
+                                   numJobs)
+        helper.infoMsg("Done with %d slabs!" % len(slabs))
+
+        prof.begin("output")
+        if not outAtomFile is None:
+            pbmio.writeArray(outAtomFile, atoms, "atoms",
+                             geometry=geometry,
+                             scale=imScale, slabs=slabs, K=nearest, D=dictSiz)
+        return
+
+    prof.begin("load")
+
+    # distances from precomputed kernel/distance matrix (if any)
+    distMat = None
+    if not kernFile is None:
+        distMat = pbmutils.kernelToDistance(
+            pbmutils.normalizeKernel(pbmutils.loadMatrix(kernFile)))
+    elif not distFile is None:
+        distMat = pbmutils.loadMatrix(distFile)
+    if not distMat is None:
+        if distMat.shape[0] != len(imgFiles):
+            raise Exception('distance matrix size does not match #images!')
+        helper.infoMsg("Using precomputed distances (%d x %d)" % distMat.shape)
+
+    # load the mask (if any) and gather only the masked voxels
+    maskIdx = None
+    if not maskFile is None:
+        mask = pbmutils.imLoad(maskFile, imScale, imSelector,
+                               sitk.sitkNearestNeighbor)
+        maskIdx = pbmutils.maskIndex(mask)
+        helper.infoMsg("Using %d of %d voxels (mask)" %
+                       (len(maskIdx), mask.size))
+
+    # coarse level for the neighbor search (if requested)
+    coarIdx = None
+    coarList = []
+    if not coarScal is None and distMat is None:
+        if not maskFile is None:
+            coarIdx = pbmutils.maskIndex(pbmutils.imPyramid(
+                sitk.ReadImage(maskFile), [imScale, coarScal], imSelector,
+                sitk.sitkNearestNeighbor)[1])
+
     dataList = []
     for i, imFile in enumerate(imgFiles):
-        im0 = sitk.ReadImage(imFile)
-        im1 = pbmutils.imResize(im0, imScale)
-        imSz = sitk.GetArrayFromImage(im1).shape
-        helper.infoMsg("Image size : (%d,%d,%d)" % imSz)
-        if not imSlice is None:
-            sl0 = pbmutils.imSlice(im1, [0, 0, imSlice])
-            dataList.append(sl0.ravel())
+        if coarScal is None or not distMat is None:
+            loadFun = lambda: pbmutils.imLoad(imFile, imScale, imSelector)
+            if cache is None:
+                dat = loadFun()
+            else:
+                dat = cache.load(imFile, loadFun, scale=imScale, slice=imSlice)
+        else:
+            dat, coar = loadLevels(imFile, cache, [imScale, coarScal],
+                                   imSlice)
+            if coarIdx is None:
+                coarList.append(coar.ravel())
+            else:
+                coarList.append(coar.ravel()[coarIdx])
+        helper.infoMsg("Image size : %s" % str(dat.shape))
+        imShape = dat.shape
+        numVox = dat.size
+        if maskIdx is None:
+            dataList.append(dat.ravel())
         else:
-            dataList.append(sitk.GetArrayFromImage(im1).ravel())
+            dataList.append(dat.ravel()[maskIdx])
         helper.infoMsg("Done with image %d!" % i)
 
-    # write raw image data
-    if not outImagFile is None:
-        tfid = open(outImgFile, 'w')
-        np.reshape(np.asmatrix(dataList).T,-1).astype('float32').tofile(tfid)
-        tfid.close()
+    # map data back to full image size (for output)
+    toFull = lambda M: M
+    if not maskIdx is None:
+        toFull = lambda M: pbmutils.scatter(M, maskIdx, numVox)
 
-    # build difference images
-    diffIm = pbmutils.groupDiff(np.asmatrix(dataList).T, groupLab, nearest)
-    helper.infoMsg("Difference image matrix (%d x %d)" % diffIm.shape)
+    # information about the output data (for the sidecar files)
+    outMeta = dict(geometry=pbmutils.imGeometry(imgFiles[0], imScale),
+                   scale=imScale, slice=imSlice, mask=maskFile)
 
-    # write raw difference data
-    if not outDiffFile is None:
-        outFid = open(outDiffFile, 'w')
-        np.reshape(diffIm, -1).ravel().astype('float32').tofile(outFid)
-        outFid.close()
-
-    # create the dictionary learner and run (alpha=1)
-    lrnObj = MiniBatchDictionaryLearning(dictSiz, 1, verbose=True)
-    lrnRes = lrnObj.fit(np.asmatrix(diffIm).T).components_
+    # write raw image data
+    if not outImagFile is None:
+        prof.begin("output")
+        pbmio.writeArray(outImagFile, toFull(np.asmatrix(dataList).T).T,
+                         "images", imShape, files=imgFiles,
+                         groups=[e["Group"] for e in imData["Data"]],
+                         **outMeta)
+
+    X = np.asmatrix(dataList).T
+
+    # distances at the coarse level
+    if len(coarList):
+        prof.begin("distances")
+        distMat = pbmutils.distMatrix(np.asmatrix(coarList).T)
+        helper.infoMsg("Coarse level distances (%d voxels)" % len(coarList[0]))
+        del coarList
+
+    # project onto the leading principal components (if requested)
+    if not numComp is None:
+        prof.begin("pca")
+        X, basis, expVar = pbmlearn.pcaReduce(X, numComp)
+        helper.infoMsg("PCA with %d components, explained variance %.2f%%" %
+                       (basis.shape[1], 100*expVar))
+        toVox = toFull
+        toFull = lambda M: toVox(np.dot(basis, M))
+
+    if multiGrp:
+        # one distance matrix for all pairs of groups
+        if distMat is None:
+            prof.begin("distances")
+            distMat = pbmutils.distMatrix(X)
+        groupNam = dict([(v, k) for k, v in groupMap.items()])
+
+        if not os.path.exists(outSwpDir):
+            os.makedirs(outSwpDir)
+
+        prof.begin("learning")
+        pairRes, pairNbr = pbmlearn.pairLearn(X, groupLab, nearest, dictSiz,
+                                              distMat, None, numJobs)
+        prof.begin("output")
+        pairIdx = []
+        for (a, b) in sorted(pairRes.keys()):
+            S, Z = pairNbr[(a, b)]
+            atomFile = "atoms-%s-%s.npy" % (groupNam[a], groupNam[b])
+            pbmio.writeArray(os.path.join(outSwpDir, atomFile),
+                             toFull(pairRes[(a, b)].T).T, "atoms", imShape,
+                             groups=[groupNam[a], groupNam[b]], K=nearest,
+                             D=dictSiz, neighbors=np.vstack(
+                                 (np.repeat(S, Z.shape[1]), Z.ravel())).T,
+                             **outMeta)
+            pairIdx.append({"From" : groupNam[a], "To" : groupNam[b],
+                            "Atoms" : atomFile})
+            helper.infoMsg("Done with %s -> %s!" % (groupNam[a], groupNam[b]))
+        json.dump({"Pairs" : pairIdx},
+                  open(os.path.join(outSwpDir, "pairs.json"), 'w'),
+                  indent=2)
+        return
+
+    if doSweep:
+        # build difference images once (for the largest neighborhood)
+        prof.begin("groupDiff")
+        diffIm = pbmutils.groupDiff(X, groupLab, max(nearLst), distMat)
+        helper.infoMsg("Difference image matrix (%d x %d)" % diffIm.shape)
+
+        if not os.path.exists(outSwpDir):
+            os.makedirs(outSwpDir)
+
+        prof.begin("learning")
+        swpRes = pbmlearn.sweepLearn(diffIm, max(nearLst), nearLst, dictLst,
+                                     numJobs)
+        prof.begin("output")
+        swpIdx = []
+        for (k, d) in sorted(swpRes.keys()):
+            atomFile = "atoms-K%03d-D%03d.npy" % (k, d)
+            pbmio.writeArray(os.path.join(outSwpDir, atomFile),
+                             toFull(swpRes[(k,d)].T).T, "atoms", imShape,
+                             K=k, D=d, **outMeta)
+            swpIdx.append({"K" : k, "D" : d, "Atoms" : atomFile})
+            helper.infoMsg("Done with K=%d, D=%d!" % (k, d))
+        json.dump({"Sweep" : swpIdx},
+                  open(os.path.join(outSwpDir, "sweep.json"), 'w'),
+                  indent=2)
+        return
+
+    # create the dictionary learner (alpha=1, seeded, i.e., repeatable)
+    lrnObj = MiniBatchDictionaryLearning(dictSiz, alpha=1, verbose=True,
+                                         random_state=0)
+
+    # neighbors, i.e., difference image i is image src[i] - image dst[i]
+    prof.begin("neighbors")
+    S, Z = pbmutils.groupNeighbors(X, groupLab, nearest, distMat)
+    outMeta["neighbors"] = np.vstack((np.repeat(S, Z.shape[1]), Z.ravel())).T
+
+    if nPasses is None:
+        # build difference images
+        prof.begin("groupDiff")
+        diffIm = np.vstack(list(pbmutils.groupDiffBatches(X, S, Z))).T
+        helper.infoMsg("Difference image matrix (%d x %d)" % diffIm.shape)
+
+        # write raw difference data
+        if not outDiffFile is None:
+            prof.begin("output")
+            pbmio.writeArray(outDiffFile, toFull(diffIm).T, "differences",
+                             imShape, **outMeta)
+
+        # run dictionary learning
+        prof.begin("learning")
+        lrnRes = prof.call(lrnObj.fit, np.asarray(diffIm).T).components_
+        batchFun = lambda: (np.asarray(diffIm[:,beg:beg+batchSiz]).T
+                            for beg in range(0, diffIm.shape[1], batchSiz))
+    else:
+        # difference images are only computed batch-wise
+        diffShp = (X.shape[0], Z.size)
+        helper.infoMsg("Difference image matrix (%d x %d)" % diffShp)
+        batchFun = lambda: pbmutils.groupDiffBatches(X, S, Z, batchSiz)
+
+        # write raw difference data (batch by batch) and stream from disk
+        if not outDiffFile is None:
+            prof.begin("groupDiff")
+            diffMap = pbmio.createArray(outDiffFile, diffShp[1], imShape,
+                                        "differences", **outMeta)
+            diffMap = diffMap.reshape((diffShp[1], -1))
+            beg = 0
+            for batch in batchFun():
+                diffMap[beg:beg+batch.shape[0]] = toFull(batch.T).T
+                beg += batch.shape[0]
+            diffMap.flush()
+            del diffMap
+            if numComp is None:
+                batchFun = lambda: pbmutils.fileDiffBatches(outDiffFile,
+                                                            batchSiz,
+                                                            maskIdx)
+
+        # run out-of-core dictionary learning
+        prof.begin("learning")
+        lrnObj = prof.call(pbmlearn.streamLearn, lrnObj, batchFun, nPasses,
+                           chkFile, helper.infoMsg)
+        lrnRes = lrnObj.components_
+
+    # compute sparse codes, rank atoms (by dominance) and write the bundle
+    rank = None
+    if not outBndlFile is None:
+        prof.begin("sparseCodes")
+        Gamma = pbmlearn.sparseCodes(batchFun(), lrnRes, 1, numJobs)
+        rank, energy = pbmlearn.rankAtoms(Gamma)
+        helper.infoMsg("Atom ranking : %s" % str(rank.tolist()))
+        pbmlearn.writeBundle(outBndlFile, toFull(lrnRes.T).T, Gamma, rank,
+                             energy)
+        lrnRes = lrnRes[rank,:]
 
     # write dictionary atoms
     if not outAtomFile is None:
-        outFid = open(outAtomFile, 'w')
-        np.reshape(lrnRes.T, -1).ravel().astype('float32').tofile(outFid)
-        outFid.close()
+        prof.begin("output")
+        del outMeta["neighbors"]
+        pbmio.writeArray(outAtomFile, toFull(lrnRes.T).T, "atoms", imShape,
+                         rank=rank, K=nearest, D=dictSiz, **outMeta)
+
+    # label permutation test (w.r.t. the learned atoms, same order as -a)
+    if not numPerm is None:
+        prof.begin("permutations")
+        obs, null, pval = pbmlearn.permTest(X, groupLab, nearest, lrnRes,
+                                            numPerm, distMat, numJobs,
+                                            batchSiz=batchSiz)
+        for k in range(len(obs)):
+            helper.infoMsg("Atom %d : energy=%.4f, p=%.4f" %
+                           (k, obs[k], pval[k]))
+        if not outPermFile is None:
+            np.savez(outPermFile, observed=obs, null=null, pvalues=pval)
 
 
 if __name__ == "__main__":
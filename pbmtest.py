@@ -9,12 +9,12 @@ __status__  = "Development"
 
 
 from optparse import OptionParser
-from core import pbmutils
-import SimpleITK as sitk
-import numpy as np
 import sys
 import os
 
+# numpy, SimpleITK and the core modules using them are imported in main() after
+# argument parsing, i.e., 'pbmtest.py -h' does not pay for them
+
 
 def usage():
     """Print usage information"""
@@ -48,7 +48,8 @@ are considered large vectors.
 
         -o FILE
 
-        FILE is the filename for writing the difference matrix (as float32).
+        FILE is the filename for writing the difference images (as .npy file
+        plus JSON sidecar, see core/pbmio.py).
 
         -N NUM (default: 3)
 
@@ -69,12 +70,17 @@ def main(argv=None):
     parser.add_option("-l", dest="labelList")
     parser.add_option("-o", dest="outDiffFile")
     parser.add_option("-h", dest="doHelp", action="store_true", default=False)
-    options, _ = parser.parse_args()
+    options, _ = parser.parse_args(argv[1:])
 
     if options.doHelp:
         usage()
         sys.exit(-1)
 
+    from core import pbmutils
+    from core import pbmio
+    import SimpleITK as sitk
+    import numpy as np
+
     filesList = options.filesList
     labelList = options.labelList
     nNeighbor = options.nNeighbor
@@ -98,11 +104,10 @@ def main(argv=None):
 
     # build difference image matrix (using Euclidean distance as similarity)
     diffImg = pbmutils.groupDiff(np.asmatrix(dataLst).T, numLab, nNeighbor)
-    print "Difference image matrix (%d x %d)" % diffImg.shape
+    print("Difference image matrix (%d x %d)" % diffImg.shape)
 
-    outFid = open(outDiffFile, 'w')
-    np.reshape(diffImg, -1).ravel().astype('float32').tofile(outFid)
-    outFid.close()
+    pbmio.writeArray(outDiffFile, np.asarray(diffImg).T, "differences",
+                     x.shape, geometry=pbmutils.imGeometry(files[0].rstrip()))
 
 
 if __name__ == "__main__":
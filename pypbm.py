@@ -0,0 +1,161 @@
+"""pypbm.py
+"""
+
+
+__license__ = "Apache License, Version 2.0"
+__author__  = "Roland Kwitt, Kitware Inc., 2013"
+__email__   = "E-Mail: roland.kwitt@kitware.com"
+__status__  = "Development"
+
+
+import sys
+import shlex
+import importlib
+import traceback
+
+
+# subcommand -> (module, description); modules are only imported when used
+COMMANDS = {
+    "pbm"           : ("pbm", "pattern based morphometry"),
+    "pbmtest"       : ("pbmtest", "PBM test on 2D images"),
+    "dlearn"        : ("dlearn", "K-SVD dictionary learning"),
+    "bwdist"        : ("bwdist", "inverted distance transform of a skeleton"),
+    "densityatlas"  : ("densityatlas", "vessel density atlas (fused bwdist)"),
+    "imgavg"        : ("imgavg", "mean image of a list of images"),
+    "skeltrace"     : ("skeltrace", "trace a skeleton on a CVT tesselation"),
+    "bintovolume"   : ("bintovolume", "convert binary data into an image"),
+    "collage"       : ("collage", "collage of 2D images"),
+    "controlpoints" : ("controlpoints", "random control points (ImageMagick)"),
+    "chstr"         : ("chstr", "replace a string in a pickled list"),
+    "regMRAToMRI"   : ("regMRAToMRI", "rigid MRA to MRI registration"),
+    "regMRIToRef"   : ("regMRIToRef", "MRI to reference registration (ANTS)"),
+    "mapMRAToRef"   : ("mapMRAToRef", "map MRA vessels to reference space")}
+
+
+def usage():
+    """Print usage information"""
+    print("""
+Single entry point for all pypbm command-line tools. Each subcommand runs the
+main() of the corresponding script (e.g., 'pypbm.py pbm ...' is the same as
+'pbm.py ...'), but only the modules of that subcommand are imported. In batch
+mode, many invocations run in a single process, i.e., the interpreter start-up
+and the imports are paid only once.
+
+    USAGE:
+        {0} COMMAND [OPTIONS]
+        {0} batch FILE
+        {0} -h
+
+    COMMANDS:
+
+{1}
+
+    BATCH MODE:
+
+        FILE (or - for stdin) contains one invocation per line, e.g.,
+
+        controlpoints -W 256 -H 256 -r 5 -n 10 -o Image-0001.cp
+        controlpoints -W 256 -H 256 -r 5 -n 10 -o Image-0002.cp
+
+        Empty lines and lines starting with # are skipped. All invocations
+        are run (even if some of them fail); the exit status is non-zero if
+        any invocation failed.
+
+AUTHOR: Roland Kwitt, Kitware Inc., 2013
+        roland.kwitt@kitware.com
+""".format(sys.argv[0], "\n".join(["        %-14s %s" % (c, COMMANDS[c][1])
+                                   for c in sorted(COMMANDS)])))
+
+
+def run(command, args):
+    """Run a subcommand in this process.
+
+    Parameters
+    ----------
+
+    command : string
+        Subcommand (see COMMANDS).
+
+    args : list
+        Command-line arguments of the subcommand.
+
+    Returns
+    -------
+
+    status : int
+        Exit status (0 on success).
+    """
+    if not command in COMMANDS:
+        sys.stderr.write("unknown command: %s\n" % command)
+        return 1
+
+    argv = [command] + list(args)
+    savArgv = sys.argv
+    sys.argv = argv
+    try:
+        module = importlib.import_module(COMMANDS[command][0])
+        status = module.main(argv)
+    except SystemExit as e:
+        status = e.code
+    finally:
+        sys.argv = savArgv
+
+    if status is None:
+        return 0
+    if not isinstance(status, int):
+        sys.stderr.write("%s\n" % status)
+        return 1
+    return status
+
+
+def runBatch(batchFile):
+    """Run all invocations in a batch file (see usage).
+
+    Returns
+    -------
+
+    status : int
+        Number of failed invocations.
+    """
+    if batchFile == "-":
+        lines = sys.stdin.readlines()
+    else:
+        with open(batchFile) as fid:
+            lines = fid.readlines()
+
+    failed = 0
+    for cnt, line in enumerate(lines):
+        if not line.strip() or line.lstrip().startswith("#"):
+            continue
+        args = shlex.split(line)
+        try:
+            status = run(args[0], args[1:])
+        except Exception:
+            traceback.print_exc()
+            status = 1
+        if status != 0:
+            sys.stderr.write("line %d failed (status %s): %s" %
+                             (cnt+1, status, line))
+            failed += 1
+    return failed
+
+
+def main(argv=None):
+    if argv is None:
+        argv=sys.argv
+
+    if len(argv) < 2 or argv[1] in ("-h", "--help"):
+        usage()
+        return -1
+
+    if argv[1] == "batch":
+        if len(argv) != 3:
+            usage()
+            return -1
+        return min(runBatch(argv[2]), 1)
+
+    return run(argv[1], argv[2:])
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -83,14 +83,17 @@ AUTHOR: Roland Kwitt, Kitware Inc., 2013
 """.format(sys.argv[0]))
 
 
-if __name__ == "__main__":
+def main(argv=None):
+    if argv is None:
+        argv=sys.argv
+
     parser = OptionParser(add_help_option=False)
     parser.add_option("-d", dest="dFiles", action="store", nargs=2)
     parser.add_option("-l", dest="lFiles", action="store", nargs=2)
     parser.add_option("-h", dest="doHelp", action="store_true", default=False)
     parser.add_option("-x", dest="recomp", action="store_true", default=False)
     parser.add_option("-c", dest="config")
-    options, args = parser.parse_args()
+    options, args = parser.parse_args(argv[1:])
 
     if options.doHelp:
         usage()
@@ -118,5 +121,11 @@ if __name__ == "__main__":
                                          "RigidMRAToMRI",
                                          options.recomp)
     # dump the list files to HDD
-    pickle.dump(iFileList, open(iListFile, "w"))
-    pickle.dump(xFileList, open(xListFile, "w"))
\ No newline at end of file
+    with open(iListFile, "wb") as fid:
+        pickle.dump(iFileList, fid)
+    with open(xListFile, "wb") as fid:
+        pickle.dump(xFileList, fid)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -11,15 +11,19 @@ __status__  = "Development"
 import os
 import sys
 import time
-import Queue
 import pickle
 import signal
 import subprocess
-import numpy as np
 from core import regtools
 import multiprocessing as mp
 from optparse import OptionParser
-from itertools import izip_longest
+
+try:
+    import queue
+    from itertools import zip_longest
+except ImportError:
+    import Queue as queue
+    from itertools import izip_longest as zip_longest
 
 
 def usage():
@@ -115,13 +119,14 @@ class ANTSWorker(mp.Process):
         while not self.kill:
             try:
                 job = self.wrkQ.get_nowait()
-            except Queue.Empty:
+            except queue.Empty:
                 break
 
             movLst = self.opts["movLst"]
             refImg = self.opts["refImg"]
             recomp = self.opts["recomp"]
             jobIdx = self.opts["jobIdx"]
+            helper = self.opts["helper"]
 
             lists = helper.antsReg(movLst, refImg, recomp)
             self.resQ.put((jobIdx, lists))
@@ -146,10 +151,10 @@ def grouper(iterable, n, fillvalue=None):
     Returns
     -------
 
-    chunks : see izip_longest documentation
+    chunks : see zip_longest documentation
     """
     args = [iter(iterable)] * n
-    return izip_longest(fillvalue=fillvalue, *args)
+    return zip_longest(fillvalue=fillvalue, *args)
 
 
 def computeChunkSize(movLst, useFrac=0.5):
@@ -171,10 +176,13 @@ def computeChunkSize(movLst, useFrac=0.5):
         Size of the largest chunk (sublist) to process
     """
     nProc = mp.cpu_count() * useFrac
-    return np.floor(len(movLst) / nProc).astype(int)
+    return int(len(movLst) // nProc)
 
 
-if __name__ == "__main__":
+def main(argv=None):
+    if argv is None:
+        argv=sys.argv
+
     parser = OptionParser(add_help_option=False)
     parser.add_option("-l", dest="lFiles")
     parser.add_option("-c", dest="config")
@@ -183,7 +191,7 @@ if __name__ == "__main__":
     parser.add_option("-x", dest="recomp", action="store_true", default=False)
     parser.add_option("-f", dest="cpuUse", type="float", default=0.5)
     parser.add_option("-d", dest="dFiles", action="store", nargs=4)
-    options, args = parser.parse_args()
+    options, args = parser.parse_args(argv[1:])
 
     if options.doHelp:
         usage()
@@ -214,7 +222,8 @@ if __name__ == "__main__":
         opt = dict(movLst=[mList[j] for j in idx],
                    jobIdx=cnt,
                    refImg=options.refImg,
-                   recomp=options.recomp)
+                   recomp=options.recomp,
+                   helper=helper)
         worker = ANTSWorker(wrkQ, resQ, opt)
         worker.start()
 
@@ -241,7 +250,15 @@ if __name__ == "__main__":
 
     #Write output lists to HDD
     affTfmListFile, fwdDefListFile, invDefListFile, imgDefListFile = options.dFiles
-    pickle.dump(affTfmList, open(affTfmListFile, "w"))
-    pickle.dump(fwdDefList, open(fwdDefListFile, "w"))
-    pickle.dump(invDefList, open(invDefListFile, "w"))
-    pickle.dump(imgDefList, open(imgDefListFile, "w"))
+    with open(affTfmListFile, "wb") as fid:
+        pickle.dump(affTfmList, fid)
+    with open(fwdDefListFile, "wb") as fid:
+        pickle.dump(fwdDefList, fid)
+    with open(invDefListFile, "wb") as fid:
+        pickle.dump(invDefList, fid)
+    with open(imgDefListFile, "wb") as fid:
+        pickle.dump(imgDefList, fid)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
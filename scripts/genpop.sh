@@ -4,8 +4,8 @@
 # Modify to match your system configuration
 ################################################################################
 CONVERT="/usr/local/bin/convert"
-PYTHON="/opt/local/bin/python2"
-SCRIPT="/Users/rkwitt/Remote/pypbm/controlpoints.py"
+PYTHON="/opt/local/bin/python3"
+SCRIPT="/Users/rkwitt/Remote/pypbm/pypbm.py"
 
 usage="$(basename "$0") [-t FILE] [-g FILE] [-n NUM]
 
@@ -42,13 +42,17 @@ while getopts ':hs:t:g:n:' option; do
 done
 shift $((OPTIND - 1))
 
+# compute all control points in one process (batch mode)
 for i in `seq 1 ${NIND}`; do
   NUM=`printf "%.4d" $i`
-  CMD="${PYTHON} \
-       ${SCRIPT} -W 256 -H 256 -r 5 -n 10 -o Image-${NUM}.cp"
-  echo $CMD
-  $CMD
+  echo "controlpoints -W 256 -H 256 -r 5 -n 10 -o Image-${NUM}.cp"
+done > controlpoints.batch
+CMD="${PYTHON} ${SCRIPT} batch controlpoints.batch"
+echo $CMD
+$CMD || exit 1
 
+for i in `seq 1 ${NIND}`; do
+  NUM=`printf "%.4d" $i`
   CMD="${CONVERT} \
        -alpha set \
        -virtual-pixel white \
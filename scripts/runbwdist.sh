@@ -3,16 +3,19 @@
 ################################################################################
 # Modify the following lines to match your system configuration
 ################################################################################
-SCRIPT='/Users/rkwitt/Remote/pypbm/utils/dmap.py'
+SCRIPT='/Users/rkwitt/Remote/pypbm/bwdist.py'
 PYTHON='/opt/local/bin/python2'
+NJOBS=4
 
-usage="$(basename "$0") [-l FILE] [-h]
+usage="$(basename "$0") [-l FILE] [-b DIR] [-h]
 
 Runs bwdist.py on a all images in a list.
 
 where:
   -h  shows this help
   -l  specify the image list
+  -b  specify the base directory of the images (relative names in the list
+      are prefixed with DIR; DIR can also be given as last argument)
 
 Example:
 
@@ -30,15 +33,22 @@ Example:
   /tmp/img1-Den.tiff
   /tmp/img2-Den.tiff
 
+  The same is produced with a list of relative names (img1.png, img2.png)
+  and
+
+  $ ./runbwdist.sh -l list.txt -b /tmp
+
 Author: Roland Kwitt, Kitware Inc, 2013"
 
-while getopts ':hl:' option; do
+while getopts ':hl:b:' option; do
   case "$option" in
     h) echo "$usage"
        exit
        ;;
     l) LIST=$OPTARG
        ;;
+    b) BASE=$OPTARG
+       ;;
     :) printf "missing argument for -%s\n" "$OPTARG" >&2
        echo "$usage" >&2
        exit 1
@@ -50,12 +60,25 @@ while getopts ':hl:' option; do
   esac
 done
 shift $((OPTIND - 1))
+BASE=${BASE:-$1}
 
 
+# relative names are resolved against the base directory (if given)
+FULL_LIST=`mktemp`
 for f in `cat ${LIST}`; do
-    BASE=`basename $f .png`
-    DIRN=$2
-    CMD="${PYTHON} ${SCRIPT} ${DIRN}/$f ${DIRN}/${BASE}-Den.tiff 0"
-    echo $CMD
-    $CMD
+    case "$f" in
+      /*) echo "$f" >> ${FULL_LIST} ;;
+      *)  if [ -n "${BASE}" ]; then
+              echo "${BASE}/$f" >> ${FULL_LIST}
+          else
+              echo "$f" >> ${FULL_LIST}
+          fi ;;
+    esac
 done
+
+# all images are processed in one process (NJOBS workers), up-to-date
+# outputs are skipped
+CMD="${PYTHON} ${SCRIPT} -l ${FULL_LIST} -j ${NJOBS}"
+echo $CMD
+$CMD
+rm -f ${FULL_LIST}
@@ -5,8 +5,9 @@
 ################################################################################
 SCRIPT='/Users/rkwitt/Remote/pypbm/skeltrace.py'
 PYTHON='/opt/local/bin/python2'
+NJOBS=4
 
-usage="$(basename "$0") [-l FILE] [-h]
+usage="$(basename "$0") [-l FILE] [-c FILE] [-b DIR] [-a] [-h]
 
 Runs skeltrace.py on a all images in a list (for a given image tessellation)
 
@@ -15,6 +16,8 @@ where:
   -l  specify the image list
   -c  specify the image tessellation
   -b  specify the base directory image the images
+  -a  also write the adjacency matrix of each image (ASCII, e.g., for
+      readgraphs.m)
 
 Example:
 
@@ -28,14 +31,21 @@ Example:
   $ ./runskeltrace.sh -l list.txt -c atlas.png -b /tmp/
 
   runs skeleton tracing on images /tmp/img0.png and /tmp/img1.png using
-  the tessellation image atlas.png and produces
+  the tessellation image atlas.png (loaded once) and produces the cohort
+  file (adjacency matrices of all images)
 
+  /tmp/atlas-cohort.npz
+
+  With -a, the adjacency matrix of each image is also written (in ASCII
+  format) to
+
+  /tmp/img0-atlas.mat
   /tmp/img1-atlas.mat
-  /tmp/img2-atlas.mat
 
 Author: Roland Kwitt, Kitware Inc, 2013"
 
-while getopts ':hl:c:b:' option; do
+ASCII=0
+while getopts ':hl:c:b:a' option; do
   case "$option" in
     h) echo "$usage"
        exit
@@ -46,6 +56,8 @@ while getopts ':hl:c:b:' option; do
        ;;
     b) BASE=$OPTARG
        ;;
+    a) ASCII=1
+       ;;
     :) printf "missing argument for -%s\n" "$OPTARG" >&2
        echo "$usage" >&2
        exit 1
@@ -58,13 +70,30 @@ while getopts ':hl:c:b:' option; do
 done
 shift $((OPTIND - 1))
 
+# all images are traced in one process (NJOBS workers)
+NOPREFIX_CIMG=`basename ${CIMG} .png`
+FULL_LIST=`mktemp`
 for f in `cat ${LIST}`; do
-    NOPREFIX_FIMG=`basename $f .png`
-    NOPREFIX_CIMG=`basename ${CIMG} .png`
-    CMD="${PYTHON} ${SCRIPT} \
-      -i ${BASE}/$f \
-      -c ${CIMG} \
-      -o \${BASE}/${NOPREFIX_FIMG}-${PREF}.mat"
-    echo $CMD
-    #$CMD
+    echo "${BASE}/$f" >> ${FULL_LIST}
 done
+CMD="${PYTHON} ${SCRIPT} \
+  -l ${FULL_LIST} \
+  -c ${CIMG} \
+  -j ${NJOBS} \
+  -o ${BASE}/${NOPREFIX_CIMG}-cohort.npz"
+echo $CMD
+$CMD
+rm -f ${FULL_LIST}
+
+# per-image adjacency matrices (ASCII), one call per image
+if [ ${ASCII} -eq 1 ]; then
+  for f in `cat ${LIST}`; do
+      NOPREFIX_FIMG=`basename $f .png`
+      CMD="${PYTHON} ${SCRIPT} \
+        -i ${BASE}/$f \
+        -c ${CIMG} \
+        -o ${BASE}/${NOPREFIX_FIMG}-${NOPREFIX_CIMG}.mat"
+      echo $CMD
+      $CMD
+  done
+fi
@@ -9,11 +9,11 @@ __status__  = "Development"
 
 
 from optparse import OptionParser
-import SimpleITK as sitk
-import numpy as np
-import cv2 as cv
 import sys
 
+# numpy, SimpleITK, OpenCV and the core modules using them are imported in
+# main() after argument parsing, i.e., 'skeltrace.py -h' does not pay for them
+
 
 def usage():
     """Shows usage information."""
@@ -23,6 +23,17 @@ and trace the skeleton of the object on the CVT tesellation to create an
 adjacency matrix. The adjacency matrix is of size CxC, where C is the number
 of CVT cells.
 
+3D images (e.g., binary vessel volumes) are supported as well. In that case,
+the skeleton is computed with scikit-image and a transition between two cells
+is counted for each pair of 26-connected skeleton voxels that lie in
+different cells (in both directions, i.e., the matrix is symmetric).
+
+With -l, all images of a list are traced on the same tesselation, which is
+loaded and indexed only once and shared with -j worker processes. The cell
+identifiers are mapped to 0,...,C-1 (in sorted order) and all adjacency
+matrices are written (sparse) to one cohort file, together with the image
+filenames and the cell identifiers (see core.skelutils.readCohort).
+
     USAGE:
         {0} [OPTIONS]
         {0} -h
@@ -30,23 +41,31 @@ of CVT cells.
     OPTIONS (Overview):
 
         -i FILE
+        -l FILE
         -c FILE
         -o FILE
+        -j NUM
         -v
 
     OPTIONS (Detailed):
 
         -i FILE
 
-        Name of the binary input image file. The foreground object is supposed
-        to only contain '1' pixel values - background is '0'. The image will
-        be input to ITK's BinaryThinningImageFilter to obtain the skeleton of
-        the object.
+        Name of the binary (2D or 3D) input image file. The foreground object
+        is supposed to only contain '1' pixel values - background is '0'. 2D
+        images will be input to ITK's BinaryThinningImageFilter to obtain the
+        skeleton of the object, 3D images to scikit-image's skeletonize.
+
+        -l FILE
+
+        FILE is a list of binary input images (one per line), see -i. In
+        this case, FILE of -o is the cohort output file (.npz).
 
         -c FILE
 
         Name of the input image file that contains the space partitioning.
-        Cells are marked with a unique discrete identifier.
+        Cells are marked with a unique discrete identifier. The image has to
+        be of the same size as the binary image.
 
         -o FILE
 
@@ -57,10 +76,19 @@ of CVT cells.
         1 0 0 1 1 0 ...
         ...
 
+        unless FILE has the extension .npz. In that case, the matrix is
+        written in compressed sparse format (scipy.sparse.save_npz), which
+        is much smaller and faster for large tesselations. Both formats can
+        be loaded with core.skelutils.readGraphs.
+
+        -j NUM (default: 1)
+
+        NUM is the number of worker processes (only with -l).
+
         -v
 
         If this flag is set, the contour elements are shown in an image to
-        check the result of the contour finding process.
+        check the result of the contour finding process (2D only).
 
 
 AUTHOR: Roland Kwitt, Kitware Inc., 2013
@@ -74,59 +102,66 @@ def main(argv=None):
 
     parser = OptionParser(add_help_option=False)
     parser.add_option("-i", dest="imgFile")
+    parser.add_option("-l", dest="imgList")
+    parser.add_option("-j", dest="numJobs", type="int", default=1)
     parser.add_option("-c", dest="cvtFile")
     parser.add_option("-o", dest="adjFile")
     parser.add_option("-h", dest="showHelp", action="store_true", default=False)
     parser.add_option("-v", dest="showVerb", action="store_true", default=False)
-    options, _ = parser.parse_args()
+    options, _ = parser.parse_args(argv[1:])
 
     if options.showHelp:
         usage()
         sys.exit(-1)
 
-    objImg = sitk.ReadImage(options.imgFile)
+    from core import skelutils
+    from core import dmaputils
+    import SimpleITK as sitk
+    import numpy as np
+    import cv2 as cv
+
     cvtImg = sitk.ReadImage(options.cvtFile)
+    cellMat = sitk.GetArrayFromImage(cvtImg)
 
-    thinFilter = sitk.BinaryThinningImageFilter()
-    thinnedImg = thinFilter.Execute(objImg)
+    if not options.imgList is None:
+        if not skelutils.isSparseFile(options.adjFile):
+            raise Exception('cohort output (-l) requires a .npz file (-o)!')
+        with open(options.imgList) as fid:
+            imgFiles = [l.strip() for l in fid if l.strip()]
+        adjMats, cellIds = skelutils.traceCohort(imgFiles, cellMat,
+                                                 options.numJobs)
+        if options.showVerb:
+            print("%d CVT cells, %d images" % (len(cellIds), len(imgFiles)))
+        skelutils.writeCohort(options.adjFile, imgFiles, adjMats, cellIds)
+        return
 
+    objImg = sitk.ReadImage(options.imgFile)
+    thinnedImg = dmaputils.skeleton(objImg)
     imgMat = sitk.GetArrayFromImage(thinnedImg)
-    cntLst, _ = cv.findContours(imgMat, cv.RETR_TREE, cv.CHAIN_APPROX_NONE)
 
-    cellMat = sitk.GetArrayFromImage(cvtImg)
     cellIds = np.unique(cellMat)
     numCell = len(cellIds)
 
     if options.showVerb:
-        print "%d CVT cells" % numCell
-
-    adjMat = np.zeros((numCell, numCell))
-    cntMat = np.zeros(imgMat.shape, np.uint8)
-
-    for cnt  in cntLst:
-        for i in range(1, len(cnt)):
-            (iBeg, jBeg) = cnt[i-1][0]
-            (iEnd, jEnd) = cnt[i][0]
-
-            # coordinate switch (skeleton x,y = iamge y,x)
-            cBeg = cellMat[jBeg][iBeg]
-            cEnd = cellMat[jEnd][iEnd]
-            if cBeg != cEnd:
-                adjMat[cBeg-1][cEnd-1] += 1
-
-            if options.showVerb:
-                cv.line(cntMat,
-                        (iBeg, jBeg),
-                        (iEnd, jEnd),
-                        [255],1,cv.CV_AA)
-
-    if options.showVerb:
+        print("%d CVT cells" % numCell)
+
+    cBeg, cEnd = skelutils.traceSkeleton(imgMat, cellMat)
+    if skelutils.isSparseFile(options.adjFile):
+        adjMat = skelutils.adjacencySparse(cBeg, cEnd, numCell)
+    else:
+        adjMat = skelutils.adjacencyMatrix(cBeg, cEnd, numCell)
+
+    if options.showVerb and imgMat.ndim == 2:
+        cntLst = cv.findContours(imgMat, cv.RETR_TREE,
+                                 cv.CHAIN_APPROX_NONE)[-2]
+        cntMat = np.zeros(imgMat.shape, np.uint8)
+        cv.polylines(cntMat, cntLst, False, 255, 1, cv.LINE_AA)
         cv.imshow("Debug", cntMat)
-        print "press any key to continue ..."
-        raw_input()
+        print("press any key to continue ...")
+        cv.waitKey(0)
         cv.destroyAllWindows()
 
-    np.savetxt(options.adjFile, adjMat, delimiter=' ', fmt='%d')
+    skelutils.writeGraph(options.adjFile, adjMat)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,95 @@
+"""test_imcache.py
+
+Tests for core.imcache (image cache).
+"""
+
+
+__license__ = "Apache License, Version 2.0"
+__author__  = "Roland Kwitt, Kitware Inc., 2013"
+__email__   = "E-Mail: roland.kwitt@kitware.com"
+__status__  = "Development"
+
+
+import os
+import numpy as np
+from core import imcache
+
+
+class loader:
+    """Counts the calls of the load function."""
+
+    def __init__(self, value):
+        self.value = value
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return np.full((2, 3), self.value)
+
+
+def makeCache(tmpdir):
+    srcFile = os.path.join(str(tmpdir), "img.raw")
+    with open(srcFile, 'wb') as fid:
+        fid.write(b"0123")
+    cache = imcache.imcache(os.path.join(str(tmpdir), "cache"))
+    return cache, srcFile
+
+
+def testHit(tmpdir):
+    """Unchanged sources (and parameters) are loaded only once."""
+    cache, srcFile = makeCache(tmpdir)
+    fun = loader(1)
+    a = cache.load(srcFile, fun, scale=0.5)
+    b = cache.load(srcFile, fun, scale=0.5)
+    assert fun.calls == 1
+    assert isinstance(b, np.memmap)
+    assert np.array_equal(a, b)
+
+    cache.load(srcFile, fun, scale=0.25)
+    assert fun.calls == 2
+
+
+def testMTime(tmpdir):
+    """A modified mtime invalidates the cached data."""
+    cache, srcFile = makeCache(tmpdir)
+    cache.load(srcFile, loader(1), scale=0.5)
+    st = os.stat(srcFile)
+    os.utime(srcFile, (st.st_atime, st.st_mtime + 10))
+
+    fun = loader(2)
+    data = cache.load(srcFile, fun, scale=0.5)
+    assert fun.calls == 1
+    assert np.all(data == 2)
+
+
+def testSize(tmpdir):
+    """A modified size invalidates the cached data (same mtime)."""
+    cache, srcFile = makeCache(tmpdir)
+    key = cache.key(srcFile, scale=0.5)
+    cache.load(srcFile, loader(1), scale=0.5)
+    st = os.stat(srcFile)
+    with open(srcFile, 'ab') as fid:
+        fid.write(b"45")
+    os.utime(srcFile, (st.st_atime, st.st_mtime))
+
+    assert cache.key(srcFile, scale=0.5) != key
+    fun = loader(2)
+    data = cache.load(srcFile, fun, scale=0.5)
+    assert fun.calls == 1
+    assert np.all(data == 2)
+
+
+def testEvict(tmpdir):
+    """The least recently used entries are evicted first."""
+    cache, srcFile = makeCache(tmpdir)
+    keys = [cache.key(srcFile, slice=i) for i in range(3)]
+    for i, key in enumerate(keys):
+        cache.put(key, np.zeros((2, 3)))
+        os.utime(os.path.join(cache.cacheDir, key + ".npy"), (i+1, i+1))
+
+    entrySize = os.path.getsize(os.path.join(cache.cacheDir, keys[0]+".npy"))
+    cache.maxSize = 2*entrySize
+    cache.evict()
+    assert cache.get(keys[0]) is None
+    assert not cache.get(keys[1]) is None
+    assert not cache.get(keys[2]) is None
@@ -0,0 +1,71 @@
+"""test_imstream.py
+
+Tests for core.imstream (slab-wise image reading and writing).
+"""
+
+
+__license__ = "Apache License, Version 2.0"
+__author__  = "Roland Kwitt, Kitware Inc., 2013"
+__email__   = "E-Mail: roland.kwitt@kitware.com"
+__status__  = "Development"
+
+
+import os
+import pytest
+import numpy as np
+import SimpleITK as sitk
+from core import imstream
+
+
+def makeImage(tmpdir):
+    data = np.random.RandomState(0).rand(7, 5, 4).astype(np.float32)
+    img = sitk.GetImageFromArray(data)
+    img.SetSpacing((0.5, 1.0, 2.0))
+    img.SetOrigin((1.0, -2.0, 3.0))
+    img.SetDirection((0, 1, 0, 1, 0, 0, 0, 0, 1))
+    refFile = os.path.join(str(tmpdir), "ref.mha")
+    imstream.writeImage(data, img, refFile)
+    return data, refFile
+
+
+@pytest.mark.parametrize("ext", [".mha", ".mhd"])
+def testSlabWriter(tmpdir, ext):
+    """Slab-wise output equals a one-shot write (data and geometry)."""
+    data, refFile = makeImage(tmpdir)
+    ref = imstream.imInfo(refFile)
+    imgSize = list(ref.GetSize())
+
+    outFile = os.path.join(str(tmpdir), "slabs" + ext)
+    writer = imstream.metaImageWriter(outFile, imgSize, ref.GetSpacing(),
+                                      ref.GetOrigin(), ref.GetDirection())
+    for beg, end in imstream.slabRanges(imgSize[-1], 3):
+        writer.write(imstream.readSlab(refFile, (beg, end)))
+    writer.close()
+
+    a, b = sitk.ReadImage(refFile), sitk.ReadImage(outFile)
+    assert np.array_equal(sitk.GetArrayFromImage(b), data)
+    assert np.array_equal(sitk.GetArrayFromImage(a),
+                          sitk.GetArrayFromImage(b))
+    assert a.GetSize() == b.GetSize()
+    assert np.allclose(a.GetSpacing(), b.GetSpacing())
+    assert np.allclose(a.GetOrigin(), b.GetOrigin())
+    assert np.allclose(a.GetDirection(), b.GetDirection())
+
+
+def testIncomplete(tmpdir):
+    """Missing and extra slices are errors."""
+    outFile = os.path.join(str(tmpdir), "out.mha")
+    writer = imstream.metaImageWriter(outFile, [4, 5, 3])
+    writer.write(np.zeros((2, 5, 4)))
+    with pytest.raises(Exception):
+        writer.write(np.zeros((2, 5, 4)))
+    with pytest.raises(Exception):
+        writer.close()
+
+
+def testSlabs():
+    """Slabs cover the volume, slab sizes respect the memory budget."""
+    assert imstream.slabRanges(7, 3) == [(0, 3), (3, 6), (6, 7)]
+    assert imstream.slabSize([4, 5, 7], 4*5*4*3, 4) == 3
+    assert imstream.slabSize([4, 5, 7], 1, 4) == 1
+    assert imstream.slabSize([4, 5, 7], 10**9, 4) == 7
@@ -0,0 +1,64 @@
+"""test_ksvd.py
+
+Tests for core.ksvd (Batch-OMP and K-SVD).
+"""
+
+
+__license__ = "Apache License, Version 2.0"
+__author__  = "Roland Kwitt, Kitware Inc., 2013"
+__email__   = "E-Mail: roland.kwitt@kitware.com"
+__status__  = "Development"
+
+
+import numpy as np
+from sklearn.linear_model import orthogonal_mp_gram
+from core import ksvd
+
+
+def makeDict(rng, N, D):
+    Dict = rng.randn(N, D)
+    return Dict / np.sqrt(np.sum(Dict**2, axis=0))
+
+
+def testOMP():
+    """Batch-OMP matches sklearn's OMP (Gram matrix version)."""
+    rng = np.random.RandomState(0)
+    Dict = makeDict(rng, 30, 12)
+    X = rng.randn(30, 20)
+    G, DtX = np.dot(Dict.T, Dict), np.dot(Dict.T, X)
+    for T in (1, 3, 5):
+        Gamma = ksvd.omp(G, DtX, T)
+        ref = orthogonal_mp_gram(G, DtX, n_nonzero_coefs=T)
+        assert Gamma.shape == (12, 20)
+        assert np.all(np.diff(Gamma.indptr) <= T)
+        assert np.allclose(Gamma.toarray(), ref)
+
+
+def testOMPExact():
+    """Signals with T atoms are recovered exactly."""
+    rng = np.random.RandomState(1)
+    Dict = makeDict(rng, 40, 10)
+    Gamma = np.zeros((10, 5))
+    for m in range(5):
+        Gamma[rng.permutation(10)[0:2], m] = 1 + rng.rand(2)
+    X = np.dot(Dict, Gamma)
+    res = ksvd.omp(np.dot(Dict.T, Dict), np.dot(Dict.T, X), 2)
+    assert np.allclose(res.toarray(), Gamma)
+
+
+def testKSVD():
+    """K-SVD reduces the reconstruction error of the initial dictionary."""
+    rng = np.random.RandomState(2)
+    X = np.dot(makeDict(rng, 20, 6), rng.randn(6, 100) *
+               (rng.rand(6, 100) < 0.3))
+    rmse = lambda Dict, Gamma: np.sqrt(np.mean((X - Gamma.T.dot(Dict.T).T)**2))
+
+    dictInit = makeDict(rng, 20, 6)
+    errInit = rmse(dictInit, ksvd.omp(np.dot(dictInit.T, dictInit),
+                                      np.dot(dictInit.T, X), 2))
+    for nJobs in (1, 2):
+        Dict, Gamma = ksvd.ksvd(X, 6, 2, nIter=10, dictInit=dictInit,
+                                nJobs=nJobs)
+        assert Dict.shape == (20, 6) and Gamma.shape == (6, 100)
+        assert np.allclose(np.sum(Dict**2, axis=0), 1)
+        assert rmse(Dict, Gamma) < errInit
@@ -0,0 +1,72 @@
+"""test_pbmio.py
+
+Tests for core.pbmio (array files).
+"""
+
+
+__license__ = "Apache License, Version 2.0"
+__author__  = "Roland Kwitt, Kitware Inc., 2013"
+__email__   = "E-Mail: roland.kwitt@kitware.com"
+__status__  = "Development"
+
+
+import os
+import json
+import numpy as np
+from core import pbmio
+
+
+def testRoundTrip(tmpdir):
+    """writeArray/readArray/readItem return the data and the sidecar."""
+    data = np.random.RandomState(0).randn(3, 4*5).astype(np.float32)
+    fileName = os.path.join(str(tmpdir), "atoms")
+    pbmio.writeArray(fileName, data, "atoms", (4, 5), K=3,
+                     groups=np.array([0, 1, 1]))
+
+    npyFile, jsonFile = pbmio.arrayFiles(fileName)
+    assert npyFile == fileName + ".npy"
+    assert pbmio.isArrayFile(fileName) and pbmio.isArrayFile(npyFile)
+
+    X, meta = pbmio.readArray(npyFile)
+    assert isinstance(X, np.memmap)
+    assert X.shape == (3, 4, 5) and X.dtype == np.float32
+    assert np.array_equal(X.reshape(data.shape), data)
+
+    with open(jsonFile) as fid:
+        assert json.load(fid) == meta
+    assert meta["layout"] == "item-major"
+    assert meta["items"] == "atoms"
+    assert meta["count"] == 3
+    assert meta["itemShape"] == [4, 5]
+    assert meta["dtype"] == "float32"
+    assert meta["K"] == 3 and meta["groups"] == [0, 1, 1]
+
+    item, itemMeta = pbmio.readItem(jsonFile, 1)
+    assert not isinstance(item, np.memmap)
+    assert np.array_equal(item, data[1].reshape(4, 5))
+    assert itemMeta == meta
+
+
+def testCreateArray(tmpdir):
+    """Items written through the memory map of createArray are read back."""
+    fileName = os.path.join(str(tmpdir), "images.npy")
+    out = pbmio.createArray(fileName, 4, (2, 3), "images")
+    for i in range(4):
+        out[i] = i
+    out.flush()
+    del out
+
+    X, meta = pbmio.readArray(fileName, 'r+')
+    assert meta["count"] == 4 and meta["items"] == "images"
+    assert np.array_equal(X[:,0,0], np.arange(4))
+    X[2] = -1
+    X.flush()
+    del X
+    assert np.all(pbmio.readItem(fileName, 2)[0] == -1)
+
+
+def testNoSidecar(tmpdir):
+    """Plain .npy files are not array files."""
+    fileName = os.path.join(str(tmpdir), "plain.npy")
+    np.save(fileName, np.zeros(3))
+    assert not pbmio.isArrayFile(fileName)
@@ -0,0 +1,91 @@
+"""test_pbmlearn.py
+
+Tests for core.pbmlearn (out-of-core learning, permutation test).
+"""
+
+
+__license__ = "Apache License, Version 2.0"
+__author__  = "Roland Kwitt, Kitware Inc., 2013"
+__email__   = "E-Mail: roland.kwitt@kitware.com"
+__status__  = "Development"
+
+
+import os
+import numpy as np
+from sklearn.decomposition import MiniBatchDictionaryLearning
+from core import pbmlearn
+from core import pbmutils
+
+
+def makeData(seed=0):
+    """Two groups of 6 observations (columns) with a group difference."""
+    rng = np.random.RandomState(seed)
+    X = rng.randn(40, 12)
+    X[0:10,6:] += 2.0
+    return np.asmatrix(X), [0]*6 + [1]*6
+
+
+def makeLearner():
+    return MiniBatchDictionaryLearning(3, alpha=1, batch_size=8,
+                                       random_state=0)
+
+
+class batches:
+    """Batches of a data matrix (counts the passes)."""
+
+    def __init__(self, X, batchSiz=8):
+        self.X = X
+        self.batchSiz = batchSiz
+        self.passes = 0
+
+    def __call__(self):
+        self.passes += 1
+        return (self.X[beg:beg+self.batchSiz]
+                for beg in range(0, self.X.shape[0], self.batchSiz))
+
+
+def testStreamLearn(tmpdir):
+    """Resuming from a checkpoint gives the same atoms as one run."""
+    X = np.random.RandomState(0).randn(24, 10)
+    ref = pbmlearn.streamLearn(makeLearner(), batches(X), 4).components_
+
+    chkFile = os.path.join(str(tmpdir), "learner.chk")
+    pbmlearn.streamLearn(makeLearner(), batches(X), 2, chkFile)
+    assert os.path.exists(chkFile)
+
+    batchFun = batches(X)
+    lrnObj = pbmlearn.streamLearn(makeLearner(), batchFun, 4, chkFile)
+    assert batchFun.passes == 2
+    assert np.allclose(lrnObj.components_, ref)
+
+    # nothing left to do
+    batchFun = batches(X)
+    lrnObj = pbmlearn.streamLearn(makeLearner(), batchFun, 4, chkFile)
+    assert batchFun.passes == 0
+    assert np.allclose(lrnObj.components_, ref)
+
+
+def testPermTest():
+    """Same seed, same null distribution and p-values (any nJobs)."""
+    X, labels = makeData()
+    atoms = np.random.RandomState(1).randn(3, X.shape[0])
+
+    obs, null, pval = pbmlearn.permTest(X, labels, 2, atoms, 10, batchSiz=4)
+    assert obs.shape == (3,) and null.shape == (10, 3) and pval.shape == (3,)
+    assert np.all(pval > 0) and np.all(pval <= 1)
+
+    # observed statistic, i.e., coefficient energy w.r.t. the given atoms
+    S, Z = pbmutils.groupNeighbors(X, labels, 2)
+    _, energy = pbmlearn.rankAtoms(pbmlearn.sparseCodes(
+        pbmutils.groupDiffBatches(X, S, Z, 4), atoms))
+    assert np.allclose(obs, energy)
+
+    for nJobs in (1, 2):
+        res = pbmlearn.permTest(X, labels, 2, atoms, 10, nJobs=nJobs,
+                                batchSiz=4)
+        for a, b in zip(res, (obs, null, pval)):
+            assert np.array_equal(a, b)
+
+    _, other, _ = pbmlearn.permTest(X, labels, 2, atoms, 10, batchSiz=4,
+                                    seed=1)
+    assert not np.array_equal(other, null)
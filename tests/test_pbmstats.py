@@ -0,0 +1,58 @@
+"""test_pbmstats.py
+
+Tests for core.pbmstats (running mean and variance).
+"""
+
+
+__license__ = "Apache License, Version 2.0"
+__author__  = "Roland Kwitt, Kitware Inc., 2013"
+__email__   = "E-Mail: roland.kwitt@kitware.com"
+__status__  = "Development"
+
+
+import numpy as np
+from core import pbmstats
+
+
+def accumulate(X):
+    stats = pbmstats.runstats()
+    for x in X:
+        stats.update(x)
+    return stats
+
+
+def testUpdate():
+    """Welford's update matches numpy's mean/variance."""
+    X = 1e3 + np.random.RandomState(0).randn(25, 4, 3)
+    stats = accumulate(X)
+    assert stats.count == 25
+    assert np.allclose(stats.mean(), X.mean(axis=0))
+    assert np.allclose(stats.variance(), X.var(axis=0))
+    assert np.allclose(stats.variance(1), X.var(axis=0, ddof=1))
+    assert np.allclose(stats.std(1), X.std(axis=0, ddof=1))
+
+
+def testMerge():
+    """Chan's merge of partial accumulators matches numpy."""
+    X = np.random.RandomState(1).randn(17, 5)
+    parts = [accumulate(X[beg:end])
+             for beg, end in [(0, 1), (1, 7), (7, 7), (7, 17)]]
+    stats = pbmstats.runstats()
+    for part in parts:
+        stats.merge(part)
+    assert stats.count == 17
+    assert np.allclose(stats.mean(), X.mean(axis=0))
+    assert np.allclose(stats.variance(), X.var(axis=0))
+
+
+def testMergeAll():
+    """The tree reduction matches numpy and keeps its inputs."""
+    X = np.random.RandomState(2).randn(11, 6)
+    parts = [accumulate(X[i:i+2]) for i in range(0, 11, 2)]
+    counts = [p.count for p in parts]
+    stats = pbmstats.mergeAll(parts)
+    assert [p.count for p in parts] == counts
+    assert stats.count == 11
+    assert np.allclose(stats.mean(), X.mean(axis=0))
+    assert np.allclose(stats.variance(), X.var(axis=0))
+    assert pbmstats.mergeAll([]).count == 0